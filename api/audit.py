@@ -0,0 +1,279 @@
+"""
+Write-behind audit log for authentication events.
+
+Request threads only append to a bounded in-process ring buffer; a background
+thread writes the buffer out with bulk_create whenever it reaches
+AUDIT_FLUSH_SIZE events or AUDIT_FLUSH_INTERVAL seconds have passed, so an
+auth request never waits on an audit INSERT. Whatever is still buffered is
+flushed when the process exits.
+
+When the buffer is full the oldest events are overwritten and counted as
+dropped, as are events from a batch that could not be written back. A batch
+the database rejects is retried one event at a time so only the events it
+cannot store are dropped. Audit records are best-effort by design: losing some under overload is preferable
+to slowing or failing logins.
+"""
+import atexit
+import ipaddress
+import logging
+import os
+import threading
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DataError, IntegrityError, close_old_connections
+from django.utils import timezone
+
+from .models import AuthEvent
+
+logger = logging.getLogger(__name__)
+
+
+# Errors from an event the database will never accept, as opposed to the
+# database being unavailable
+INVALID_EVENT_ERRORS = (DataError, IntegrityError, ValidationError, ValueError)
+
+
+def parse_ip(value):
+    try:
+        return ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+
+
+def parse_networks(proxies):
+    """AUDIT_TRUSTED_PROXIES as networks; invalid entries are logged and left out"""
+    networks = []
+    for proxy in proxies:
+        try:
+            networks.append(ipaddress.ip_network(proxy.strip(), strict=False))
+        except ValueError:
+            logger.error('Ignoring invalid AUDIT_TRUSTED_PROXIES entry %r', proxy)
+    return networks
+
+
+TRUSTED_PROXIES = parse_networks(settings.AUDIT_TRUSTED_PROXIES)
+
+
+def client_ip(request, proxies=None):
+    """
+    The client address, honouring X-Forwarded-For only behind a trusted proxy.
+
+    Proxies append to X-Forwarded-For, so only its right-hand end is written
+    by them; the client is the right-most hop that is not one of our proxies.
+    Anything that is not a valid IP address is ignored.
+    """
+    proxies = TRUSTED_PROXIES if proxies is None else proxies
+    client = parse_ip(request.META.get('REMOTE_ADDR', ''))
+    if settings.AUDIT_TRUST_X_FORWARDED_FOR:
+        hops = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')
+        while hops:
+            hop = parse_ip(hops.pop())
+            if hop is None:
+                # Not written by a proxy we trust; the hops to its left are not either
+                break
+            client = hop
+            if not any(hop in network for network in proxies):
+                break
+    return str(client) if client is not None else None
+
+
+class AuditBuffer:
+    """Bounded ring buffer of pending AuthEvents with a background flusher"""
+
+    def __init__(self, capacity=None, flush_size=None, flush_interval=None):
+        self.capacity = capacity or settings.AUDIT_BUFFER_SIZE
+        self.flush_size = flush_size or settings.AUDIT_FLUSH_SIZE
+        self.flush_interval = flush_interval or settings.AUDIT_FLUSH_INTERVAL
+        self.events = deque(maxlen=self.capacity)
+        self.recorded = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.flush_failures = 0
+        self._lock = threading.Lock()
+        # Serializes flushes between the flusher thread and explicit flush() calls
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def stats(self):
+        return {
+            'buffered': len(self.events),
+            'recorded': self.recorded,
+            'flushed': self.flushed,
+            'dropped': self.dropped,
+            'flush_failures': self.flush_failures,
+        }
+
+    def append(self, event):
+        with self._lock:
+            if len(self.events) == self.capacity:
+                # deque(maxlen=...) discards the oldest entry on append
+                self.dropped += 1
+            self.events.append(event)
+            self.recorded += 1
+            pending = len(self.events)
+        self._ensure_thread()
+        if pending >= self.flush_size:
+            self._wake.set()
+
+    def _ensure_thread(self):
+        # A forked worker inherits the buffer but not the thread
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='audit-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def _take(self):
+        with self._lock:
+            batch = list(self.events)
+            self.events.clear()
+        return batch
+
+    def flush(self):
+        """Write all buffered events now; returns the number written"""
+        with self._flush_lock:
+            written = 0
+            while True:
+                batch = self._take()
+                if not batch:
+                    return written
+                try:
+                    AuthEvent.objects.bulk_create(batch, batch_size=self.flush_size)
+                except INVALID_EVENT_ERRORS:
+                    logger.warning('Audit batch of %d events rejected; writing them one at a time', len(batch))
+                    count, ok = self._write_each(batch)
+                    written += count
+                    if not ok:
+                        return written
+                    continue
+                except Exception:
+                    logger.exception('Failed to write %d audit events', len(batch))
+                    self.flush_failures += 1
+                    self._requeue(batch)
+                    return written
+                written += len(batch)
+                with self._lock:
+                    self.flushed += len(batch)
+
+    def _write_each(self, batch):
+        """
+        Write a rejected batch event by event, dropping the events the database
+        refuses. Returns (events written, False if the rest had to be requeued).
+        """
+        written = 0
+        for index, event in enumerate(batch):
+            try:
+                AuthEvent.objects.bulk_create([event])
+            except INVALID_EVENT_ERRORS:
+                logger.exception('Dropping audit event the database rejected')
+                with self._lock:
+                    self.dropped += 1
+                continue
+            except Exception:
+                logger.exception('Failed to write %d audit events', len(batch) - index)
+                self.flush_failures += 1
+                self._requeue(batch[index:])
+                return written, False
+            written += 1
+            with self._lock:
+                self.flushed += 1
+        return written, True
+
+    def _requeue(self, batch):
+        """Put a failed batch back in front of newer events, dropping what does not fit"""
+        with self._lock:
+            room = self.capacity - len(self.events)
+            keep = batch[len(batch) - room:] if room < len(batch) else batch
+            self.dropped += len(batch) - len(keep)
+            self.events.extendleft(reversed(keep))
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = AuditBuffer()
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def record(event, request, user=None, email=''):
+    """
+    Queue an audit event for the current request; never touches the database
+    and never raises, so auditing cannot fail the auth request it records
+    """
+    try:
+        now = timezone.now()
+        get_buffer().append(AuthEvent(
+            event=event,
+            user_id=user.pk if user is not None else None,
+            email=(email or (user.email if user is not None else ''))[:254],
+            ip=client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', '')[:255],
+            created_at=now,
+            day=now.date(),
+        ))
+    except Exception:
+        logger.exception('Failed to record %s audit event', event)
+
+
+def flush():
+    """Write this process's buffered events now (e.g. at shutdown or in tests)"""
+    return get_buffer().flush()
+
+
+def query(user_id=None, ip=None, since=None, until=None, event=None, limit=100):
+    """
+    Audit events newest first, filtered by user, IP and time range. Each
+    filter combination is served by one of the (user, created_at),
+    (ip, created_at) or (created_at) indexes.
+    """
+    events = AuthEvent.objects.all()
+    if user_id is not None:
+        events = events.filter(user_id=user_id)
+    if ip:
+        events = events.filter(ip=ip)
+    if since is not None:
+        events = events.filter(created_at__gte=since)
+    if until is not None:
+        events = events.filter(created_at__lt=until)
+    if event:
+        events = events.filter(event=event)
+    return events.order_by('-created_at')[:limit]
+
+
+def prune(retention_days=None, today=None):
+    """
+    Drop audit events older than the retention period one whole day
+    (partition) at a time, so no single DELETE holds locks for long.
+    Returns the number of events removed.
+    """
+    retention_days = settings.AUDIT_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = (today or timezone.now().date()) - timedelta(days=retention_days)
+    removed = 0
+    days = AuthEvent.objects.filter(day__lt=cutoff).values_list('day', flat=True).distinct().order_by('day')
+    for day in list(days):
+        count, _ = AuthEvent.objects.filter(day=day).delete()
+        removed += count
+    return removed
@@ -0,0 +1,312 @@
+"""
+PM daily briefing materializer.
+
+Each user's briefing is a JSON document folded from their ChangeEvents. A
+background consumer (manage.py materialize_briefings) applies new events in id
+order and stores the result, so serving a briefing is a single read of the
+Briefing row. The consumer's cursor records how far it has caught up, which
+covers every briefing including those of users with no new events. A read
+falls back to folding the user's pending events itself once both the stored
+document and the cursor are older than BRIEFING_MAX_STALENESS, which bounds
+staleness even when the consumer lags behind.
+
+Ids are assigned at insert but become visible at commit, so a lower id can
+appear after a higher one. The consumer never moves past a missing id until
+it has been missing for BRIEFING_GAP_TIMEOUT (its transaction rolled back),
+and the read path only folds events older than that, so neither skips an
+event that commits late.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Subquery
+from django.utils import timezone
+
+from . import pubsub
+from .models import Briefing, ChangeEvent, MaterializerCursor
+
+logger = logging.getLogger(__name__)
+
+CURSOR_NAME = 'briefings'
+MAX_WRITE_ATTEMPTS = 5
+
+
+def empty_document():
+    return {'alerts': [], 'alert_counts': {}, 'sentiment': {}}
+
+
+def sentiment_label(average):
+    if average > 0.1:
+        return 'Positive'
+    if average < -0.1:
+        return 'Negative'
+    return 'Neutral'
+
+
+def apply_event(document, event):
+    """
+    Fold one event into a briefing document in place and return the delta:
+    the part of the document that changed. An event with an invalid payload
+    is logged and skipped: it must not stop the consumer.
+    """
+    if event.kind not in dict(ChangeEvent.KIND_CHOICES):
+        return {}
+    try:
+        payload = ChangeEvent.clean_payload(event.kind, event.payload or {})
+    except ValueError as e:
+        logger.warning('Skipping change event %s with an invalid payload: %s', event.id, e)
+        return {}
+
+    if event.kind == ChangeEvent.KIND_ALERT:
+        alert = {
+            'id': event.id,
+            'type': payload['type'],
+            'severity': payload['severity'],
+            'source': event.source,
+            'message': payload['message'],
+            'time': event.created_at.isoformat(),
+        }
+        alerts = document['alerts']
+        alerts.insert(0, alert)
+        del alerts[settings.BRIEFING_MAX_ALERTS:]
+        counts = document['alert_counts']
+        counts[alert['severity']] = counts.get(alert['severity'], 0) + 1
+        return {'alert': alert, 'alert_counts': counts}
+
+    if event.kind == ChangeEvent.KIND_SENTIMENT:
+        topic = payload['topic']
+        mentions = payload['mentions']
+        score = payload['score']
+        entry = document['sentiment'].setdefault(topic, {'mentions': 0, 'score_sum': 0.0})
+        entry['mentions'] += mentions
+        entry['score_sum'] += score * mentions
+        entry['average'] = round(entry['score_sum'] / entry['mentions'], 4) if entry['mentions'] else 0.0
+        entry['sentiment'] = sentiment_label(entry['average'])
+        return {'sentiment': {topic: entry}}
+
+    return {}
+
+
+def fold(briefing, events):
+    """Apply events newer than the briefing's last event; return the deltas"""
+    deltas = []
+    for event in events:
+        if event.id <= briefing.last_event_id:
+            continue
+        deltas.append(apply_event(briefing.document, event))
+        briefing.last_event_id = event.id
+    return deltas
+
+
+def assemble(user_id):
+    """Build a briefing document from scratch by folding every event of the user"""
+    briefing = Briefing(user_id=user_id, document=empty_document())
+    fold(briefing, ChangeEvent.objects.filter(user_id=user_id).order_by('id').iterator())
+    return briefing.document
+
+
+def publish_changes(changes):
+    """Push briefing deltas ({user_id: [delta, ...]}) to streaming subscribers"""
+    pubsub.publish_many([
+        {'topic': 'briefing', 'user_id': user_id, 'data': {'changes': deltas}}
+        for user_id, deltas in changes.items() if deltas
+    ])
+
+
+def _store(briefing, refreshed_at):
+    """
+    Write a briefing if nobody else has written it since it was read.
+    Returns False on a lost race.
+    """
+    if briefing.pk is None:
+        briefing.refreshed_at = refreshed_at
+        try:
+            with transaction.atomic():
+                briefing.save()
+            return True
+        except IntegrityError:
+            return False
+    updated = Briefing.objects.filter(pk=briefing.pk, version=briefing.version).update(
+        document=briefing.document,
+        last_event_id=briefing.last_event_id,
+        version=briefing.version + 1,
+        refreshed_at=refreshed_at
+    )
+    if updated:
+        briefing.version += 1
+        briefing.refreshed_at = refreshed_at
+    return bool(updated)
+
+
+def _store_many(briefings, refreshed_at):
+    """
+    Compare-and-set write of many existing briefings in one transaction.
+    Returns the briefings that lost a race and need to be folded again.
+    """
+    document_field = Briefing._meta.get_field('document')
+    # Adapted like the ORM does, so the column holds one datetime format
+    # whichever path wrote it
+    refreshed_value = Briefing._meta.get_field('refreshed_at').get_db_prep_value(refreshed_at, connection)
+    table = connection.ops.quote_name(Briefing._meta.db_table)
+    sql = (
+        f'UPDATE {table} SET document = %s, last_event_id = %s, version = version + 1, '
+        f'refreshed_at = %s WHERE id = %s AND version = %s'
+    )
+    lost = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for briefing in briefings:
+            cursor.execute(sql, (
+                document_field.get_db_prep_save(briefing.document, connection),
+                briefing.last_event_id,
+                refreshed_value,
+                briefing.pk,
+                briefing.version,
+            ))
+            # No row matched: someone wrote the briefing since it was read
+            if cursor.rowcount == 1:
+                briefing.version += 1
+                briefing.refreshed_at = refreshed_at
+            else:
+                lost.append(briefing)
+    return lost
+
+
+def _reload(user_id):
+    try:
+        return Briefing.objects.get(user_id=user_id)
+    except Briefing.DoesNotExist:
+        return Briefing(user_id=user_id, document=empty_document())
+
+
+def _fold_and_store(briefing, events, refreshed_at):
+    """Fold and store, retrying on lost races; returns (briefing, deltas written)"""
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        deltas = fold(briefing, events)
+        if _store(briefing, refreshed_at):
+            return briefing, deltas
+        briefing = _reload(briefing.user_id)
+    return briefing, []
+
+
+def _contiguous(events, position):
+    """The leading events that follow position with no id missing in between"""
+    for index, event in enumerate(events):
+        if event.id != position + index + 1:
+            return events[:index]
+    return events
+
+
+def materialize_batch(batch_size=5000):
+    """
+    Consume the next batch of change events and update the affected briefings.
+    Returns the number of events consumed.
+    """
+    now = timezone.now()
+    cursor, _ = MaterializerCursor.objects.get_or_create(name=CURSOR_NAME)
+    events = list(ChangeEvent.objects.filter(id__gt=cursor.position).order_by('id')[:batch_size])
+    # Any event created before this has committed, so once nothing is left
+    # to consume every briefing is current up to here
+    committed_before = now - timedelta(seconds=settings.BRIEFING_GAP_TIMEOUT)
+    if not events:
+        MaterializerCursor.objects.filter(pk=cursor.pk).update(caught_up_at=committed_before)
+        return 0
+
+    ready = _contiguous(events, cursor.position)
+    if not ready:
+        # The next id is missing: its transaction is still open, or it rolled
+        # back. Wait for it rather than consume past it and lose it
+        if cursor.gap_seen_at is None:
+            MaterializerCursor.objects.filter(pk=cursor.pk).update(gap_seen_at=now)
+            return 0
+        if (now - cursor.gap_seen_at).total_seconds() < settings.BRIEFING_GAP_TIMEOUT:
+            return 0
+        logger.warning(
+            'Skipping change event ids %s-%s, missing for over %ss',
+            cursor.position + 1, events[0].id - 1, settings.BRIEFING_GAP_TIMEOUT
+        )
+        ready = _contiguous(events, events[0].id - 1)
+    drained = len(ready) == len(events) < batch_size
+    events = ready
+
+    by_user = {}
+    for event in events:
+        by_user.setdefault(event.user_id, []).append(event)
+    # Every event up to the end of the batch is folded in, so that is how fresh
+    # the touched briefings are
+    refreshed_at = events[-1].created_at
+
+    existing = {briefing.user_id: briefing for briefing in Briefing.objects.filter(user_id__in=by_user)}
+    created, updated, changes = [], [], {}
+    for user_id, user_events in by_user.items():
+        briefing = existing.get(user_id)
+        if briefing is None:
+            briefing = Briefing(user_id=user_id, document=empty_document(), refreshed_at=refreshed_at)
+            created.append(briefing)
+        else:
+            updated.append(briefing)
+        changes[user_id] = fold(briefing, user_events)
+
+    if updated:
+        for briefing in _store_many(updated, refreshed_at):
+            _, changes[briefing.user_id] = _fold_and_store(
+                _reload(briefing.user_id), by_user[briefing.user_id], refreshed_at
+            )
+
+    if created:
+        try:
+            with transaction.atomic():
+                Briefing.objects.bulk_create(created, batch_size=1000)
+        except IntegrityError:
+            # A reader created some of these concurrently; fall back to one at a time
+            for briefing in created:
+                _, changes[briefing.user_id] = _fold_and_store(
+                    _reload(briefing.user_id), by_user[briefing.user_id], refreshed_at
+                )
+
+    MaterializerCursor.objects.filter(pk=cursor.pk).update(
+        position=events[-1].id,
+        gap_seen_at=None,
+        caught_up_at=committed_before if drained else min(refreshed_at, committed_before)
+    )
+    publish_changes(changes)
+    return len(events)
+
+
+def catch_up(briefing):
+    """
+    Fold a user's pending events into their briefing on the read path. Events
+    from the last BRIEFING_GAP_TIMEOUT are left to the consumer: one of them
+    could still be overtaken by a lower id that has not committed yet.
+    """
+    horizon = timezone.now() - timedelta(seconds=settings.BRIEFING_GAP_TIMEOUT)
+    pending = list(ChangeEvent.objects.filter(
+        user_id=briefing.user_id,
+        id__gt=briefing.last_event_id,
+        created_at__lt=horizon
+    ).order_by('id'))
+    briefing, deltas = _fold_and_store(briefing, pending, horizon)
+    publish_changes({briefing.user_id: deltas})
+    return briefing
+
+
+def get_briefing(user):
+    """
+    Return the user's briefing. Normally a single indexed read; pending events
+    are folded in first when the stored document is missing or too stale.
+
+    The briefing holds every event the consumer has passed, so it is as fresh
+    as the cursor even when it has not been written for a while.
+    """
+    caught_up_at = MaterializerCursor.objects.filter(name=CURSOR_NAME).values('caught_up_at')
+    try:
+        briefing = Briefing.objects.annotate(caught_up_at=Subquery(caught_up_at)).get(user=user)
+    except Briefing.DoesNotExist:
+        return catch_up(Briefing(user=user, document=empty_document()))
+    if briefing.caught_up_at and briefing.caught_up_at > briefing.refreshed_at:
+        briefing.refreshed_at = briefing.caught_up_at
+    age = (timezone.now() - briefing.refreshed_at).total_seconds()
+    if age > settings.BRIEFING_MAX_STALENESS:
+        briefing = catch_up(briefing)
+    return briefing
@@ -0,0 +1,441 @@
+"""
+Batch content generation for the Content Automation Studio.
+
+A batch is a matrix of personas x channels x products. Every variant renders
+its channel's template (or a custom one) into a prompt and passes it to the
+configured text generator. Templates are compiled once and kept in an LRU
+cache keyed by their source digest; finished outputs are memoized in a second
+LRU keyed by (template, context, generator), so identical variants, within a
+batch or across batches, are generated once.
+
+Variants run on a shared thread pool (generators are expected to be I/O
+bound, e.g. a remote model API) and are yielded as they complete, with a
+bounded number in flight so a large matrix never queues all of its work at
+once.
+
+Templates, built-in or custom, are limited to a small safe subset of the
+template language (if, for, with, comment and text filters), with loops
+nested at most CONTENT_TEMPLATE_MAX_LOOP_DEPTH deep over request lists of at
+most CONTENT_MAX_LIST_ITEMS items, so a request cannot tie up the shared
+pool, and every rendered prompt is capped at CONTENT_MAX_PROMPT_LENGTH.
+
+The generator is pluggable through the CONTENT_GENERATOR setting. The default
+StubGenerator returns the rendered template text, so everything can run and
+be tested locally.
+"""
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.template import Context, Engine, TemplateSyntaxError
+from django.template.base import TextNode, VariableNode
+from django.template.defaulttags import CommentNode, ForNode, IfNode, WithNode
+from django.utils.module_loading import import_string
+
+# Built-in templates, one per channel. They are rendered with persona,
+# product, channel, tone and brief in the context.
+CHANNEL_TEMPLATES = {
+    'email': (
+        "Subject: {{ product.name }} for {{ persona.name }}s\n\n"
+        "Hi there,\n\n"
+        "{% if brief %}{{ brief }}\n\n{% endif %}"
+        "As a {{ persona.name|lower }}{% if persona.goal %} who wants to {{ persona.goal }}{% endif %}, "
+        "you'll love how {{ product.name }} {{ product.benefit|default:'makes your day easier' }}.\n\n"
+        "{% if tone == 'enthusiastic' %}We can't wait for you to try it!{% else %}Try it today.{% endif %}\n"
+    ),
+    'social': (
+        "{% if tone == 'casual' %}Say hi to{% else %}Introducing{% endif %} {{ product.name }}"
+        "{% if product.benefit %}: {{ product.benefit }}{% endif %}. "
+        "Built for {{ persona.name|lower }}s{% if persona.goal %} who want to {{ persona.goal }}{% endif %}. "
+        "{% for tag in product.tags %}#{{ tag }} {% endfor %}\n"
+    ),
+    'blog': (
+        "# {{ product.name }}: built for {{ persona.name }}s\n\n"
+        "{% if brief %}{{ brief }}\n\n{% endif %}"
+        "## Why it matters\n\n"
+        "{{ persona.name }}s{% if persona.pain %} struggle with {{ persona.pain }}{% endif %}. "
+        "{{ product.name }} {{ product.benefit|default:'changes that' }}.\n\n"
+        "## What's new\n\n"
+        "{% for feature in product.features %}- {{ feature }}\n{% empty %}- {{ product.name }}\n{% endfor %}"
+    ),
+    'press_release': (
+        "FOR IMMEDIATE RELEASE\n\n"
+        "{{ product.name }} launches to help {{ persona.name|lower }}s"
+        "{% if persona.goal %} {{ persona.goal }}{% endif %}\n\n"
+        "{% if brief %}{{ brief }}\n\n{% endif %}"
+        "{{ product.name }} {{ product.benefit|default:'is available today' }}.\n"
+    ),
+    'in_app': (
+        "New: {{ product.name }}. {{ product.benefit|default:'Tap to learn more' }}."
+    ),
+}
+
+TONES = ['professional', 'casual', 'technical', 'enthusiastic']
+
+# Plain-text output: templates are rendered with autoescaping off
+_engine = Engine(autoescape=False)
+
+# The template language allowed in templates: no {% debug %}, {% load %},
+# {% include %} and the like, and only filters whose output is bounded by
+# their input
+ALLOWED_NODES = (TextNode, VariableNode, IfNode, ForNode, WithNode, CommentNode)
+ALLOWED_FILTERS = {
+    'capfirst', 'cut', 'default', 'default_if_none', 'first', 'join', 'last', 'length', 'lower',
+    'pluralize', 'slice', 'striptags', 'title', 'truncatechars', 'truncatewords', 'upper', 'wordcount', 'yesno',
+}
+
+
+class LRUCache:
+    """Thread-safe least-recently-used mapping with hit/miss counters"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+templates = LRUCache(settings.CONTENT_TEMPLATE_CACHE_SIZE)
+outputs = LRUCache(settings.CONTENT_MEMO_SIZE)
+
+
+def _filter_expressions(node):
+    """The variable expressions a node evaluates itself, not its children's"""
+    if isinstance(node, VariableNode):
+        yield node.filter_expression
+    elif isinstance(node, ForNode):
+        yield node.sequence
+    elif isinstance(node, WithNode):
+        yield from node.extra_context.values()
+    elif isinstance(node, IfNode):
+        conditions = [condition for condition, _ in node.conditions_nodelists if condition is not None]
+        while conditions:
+            condition = conditions.pop()
+            # Operators (and, not, ==, ...) hold operands; literals a value
+            if condition.value is not None:
+                yield condition.value
+            conditions.extend(
+                operand for operand in (getattr(condition, 'first', None), getattr(condition, 'second', None))
+                if operand is not None
+            )
+
+
+def _counted(render):
+    """Wrap a node's render to stop rendering once the prompt is over the limit"""
+    def render_counted(context):
+        output = render(context)
+        total = context.render_context.get('prompt_length', 0) + len(output)
+        if total > settings.CONTENT_MAX_PROMPT_LENGTH:
+            raise ValueError(f'Rendered prompt is longer than {settings.CONTENT_MAX_PROMPT_LENGTH} characters')
+        context.render_context['prompt_length'] = total
+        return output
+    return render_counted
+
+
+def restrict_template(nodelist, loop_depth=0):
+    """
+    Raise ValueError unless a compiled template keeps to the allowed subset,
+    and make every piece of output it renders count towards
+    CONTENT_MAX_PROMPT_LENGTH, so an oversized prompt is abandoned as soon as
+    it is too long rather than built in full.
+    """
+    for node in nodelist:
+        if not isinstance(node, ALLOWED_NODES):
+            tag = node.token.contents.split()[0] if getattr(node, 'token', None) else type(node).__name__
+            raise ValueError(f"Invalid template: '{tag}' is not allowed")
+        for expression in _filter_expressions(node):
+            for function, _ in expression.filters:
+                name = getattr(function, '_filter_name', function.__name__)
+                if name not in ALLOWED_FILTERS:
+                    raise ValueError(f"Invalid template: filter '{name}' is not allowed")
+        depth = loop_depth + isinstance(node, ForNode)
+        if depth > settings.CONTENT_TEMPLATE_MAX_LOOP_DEPTH:
+            raise ValueError(
+                f'Invalid template: loops nested more than {settings.CONTENT_TEMPLATE_MAX_LOOP_DEPTH} deep'
+            )
+        for attribute in node.child_nodelists:
+            restrict_template(getattr(node, attribute, None) or [], depth)
+        if isinstance(node, (TextNode, VariableNode)):
+            node.render = _counted(node.render)
+
+
+def compile_template(source):
+    """Return (digest, compiled template), compiling only on a cache miss"""
+    digest = hashlib.sha256(source.encode()).hexdigest()
+    template = templates.get(digest)
+    if template is None:
+        if len(source) > settings.CONTENT_TEMPLATE_MAX_LENGTH:
+            raise ValueError(f'Templates are limited to {settings.CONTENT_TEMPLATE_MAX_LENGTH} characters')
+        try:
+            template = _engine.from_string(source)
+        except TemplateSyntaxError as e:
+            raise ValueError(f'Invalid template: {e}')
+        restrict_template(template.nodelist)
+        templates.put(digest, template)
+    return digest, template
+
+
+# Generators
+
+class StubGenerator:
+    """
+    Local stand-in for a text generation model: returns the rendered prompt
+    with whitespace tidied. latency simulates a remote call.
+    """
+
+    name = 'stub'
+
+    def __init__(self, latency=None):
+        self.latency = settings.CONTENT_STUB_LATENCY if latency is None else latency
+
+    def generate(self, prompt, variant):
+        if self.latency:
+            time.sleep(self.latency)
+        return re.sub(r'\n{3,}', '\n\n', prompt).strip()
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_generator():
+    """Return the process-wide generator configured by CONTENT_GENERATOR"""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = import_string(settings.CONTENT_GENERATOR)()
+    return _generator
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(settings.CONTENT_WORKERS, thread_name_prefix='content')
+    return _executor
+
+
+# Batches
+
+def _check_size(value, field):
+    """Bound what templates can loop over and print: list lengths and text lengths"""
+    if isinstance(value, str):
+        if len(value) > settings.CONTENT_MAX_FIELD_LENGTH:
+            raise ValueError(f'{field} is longer than {settings.CONTENT_MAX_FIELD_LENGTH} characters')
+    elif isinstance(value, (list, dict)):
+        if len(value) > settings.CONTENT_MAX_LIST_ITEMS:
+            raise ValueError(f'{field} has more than {settings.CONTENT_MAX_LIST_ITEMS} items')
+        items = value.items() if isinstance(value, dict) else enumerate(value)
+        for key, item in items:
+            _check_size(item, f'{field}.{key}')
+
+
+def _as_entity(value, field):
+    if isinstance(value, str) and value.strip():
+        value = {'name': value.strip()}
+    elif not (isinstance(value, dict) and str(value.get('name', '')).strip()):
+        raise ValueError(f'Each {field} must be a name or an object with a name')
+    _check_size(value, field)
+    return value
+
+
+def parse_batch(data):
+    """
+    Validate a batch request and return the parsed batch for generate_batch().
+
+    data: personas, products (names or objects with a name), channels
+    (built-in channel names), and optionally tone, brief and templates, a
+    {channel: template source} mapping overriding or adding channels.
+    """
+    custom = data.get('templates') or {}
+    if not isinstance(custom, dict) or not all(isinstance(source, str) for source in custom.values()):
+        raise ValueError('templates must map channel names to template source')
+    channels = data.get('channels') or list(CHANNEL_TEMPLATES)
+    if not isinstance(channels, list):
+        raise ValueError('channels must be a list')
+    unknown = [channel for channel in channels if channel not in CHANNEL_TEMPLATES and channel not in custom]
+    if unknown:
+        raise ValueError(f"Unknown channels: {', '.join(map(str, unknown))}")
+
+    personas = data.get('personas')
+    products = data.get('products')
+    if not isinstance(personas, list) or not personas:
+        raise ValueError('personas must be a non-empty list')
+    if not isinstance(products, list) or not products:
+        raise ValueError('products must be a non-empty list')
+    personas = [_as_entity(persona, 'persona') for persona in personas]
+    products = [_as_entity(product, 'product') for product in products]
+
+    variants = len(personas) * len(channels) * len(products)
+    if variants > settings.CONTENT_MAX_VARIANTS:
+        raise ValueError(f'{variants} variants requested; at most {settings.CONTENT_MAX_VARIANTS} per batch')
+
+    tone = data.get('tone') or 'professional'
+    if tone not in TONES:
+        raise ValueError(f"tone must be one of: {', '.join(TONES)}")
+    brief = str(data.get('brief') or '')
+    if len(brief) > settings.CONTENT_MAX_BRIEF_LENGTH:
+        raise ValueError(f'brief is longer than {settings.CONTENT_MAX_BRIEF_LENGTH} characters')
+
+    # Compile up front so template errors are reported before streaming starts
+    sources = {channel: custom.get(channel) or CHANNEL_TEMPLATES[channel] for channel in channels}
+    for source in set(sources.values()):
+        compile_template(source)
+    return {
+        'personas': personas,
+        'channels': channels,
+        'products': products,
+        'sources': sources,
+        'tone': tone,
+        'brief': brief,
+    }
+
+
+def iter_variants(batch):
+    for index, (persona, channel, product) in enumerate(
+        itertools.product(batch['personas'], batch['channels'], batch['products'])
+    ):
+        yield index, {
+            'persona': persona,
+            'channel': channel,
+            'product': product,
+            'tone': batch['tone'],
+            'brief': batch['brief'],
+        }
+
+
+def _render_and_generate(generator, source, context):
+    _, template = compile_template(source)
+    prompt = template.render(Context(context, autoescape=False))
+    return generator.generate(prompt, context)
+
+
+def generate_batch(batch, generator=None, executor=None, window=None):
+    """
+    Generate every variant of a parsed batch, yielding a result dict per
+    variant as soon as it is available. Memoized variants are yielded
+    immediately; the rest in completion order.
+    """
+    generator = generator or get_generator()
+    executor = executor or get_executor()
+    window = window or settings.CONTENT_WORKERS * 4
+    # memo key -> future, and future -> (memo key, variants waiting on it);
+    # identical variants in flight share one future
+    inflight = {}
+    waiting = {}
+
+    def result(index, context, started, cached, content=None, error=None):
+        item = {
+            'index': index,
+            'persona': context['persona']['name'],
+            'channel': context['channel'],
+            'product': context['product']['name'],
+            'content': content,
+            'cached': cached,
+            'ms': round((time.perf_counter() - started) * 1000, 2),
+        }
+        if error is not None:
+            item['error'] = error
+        return item
+
+    def collect(futures):
+        for future in futures:
+            key, variants = waiting.pop(future)
+            del inflight[key]
+            try:
+                content = future.result()
+            except Exception as e:
+                for index, context, started, _ in variants:
+                    yield result(index, context, started, False, error=str(e))
+                continue
+            outputs.put(key, content)
+            for index, context, started, cached in variants:
+                yield result(index, context, started, cached, content)
+
+    for index, context in iter_variants(batch):
+        started = time.perf_counter()
+        source = batch['sources'][context['channel']]
+        digest, _ = compile_template(source)
+        key = (digest, json.dumps(context, sort_keys=True, default=str), generator.name)
+        content = outputs.get(key)
+        if content is not None:
+            yield result(index, context, started, True, content)
+            continue
+        future = inflight.get(key)
+        if future is not None:
+            waiting[future][1].append((index, context, started, True))
+            continue
+        future = executor.submit(_render_and_generate, generator, source, context)
+        inflight[key] = future
+        waiting[future] = (key, [(index, context, started, False)])
+
+        yield from collect([future for future in waiting if future.done()])
+        if len(waiting) >= window:
+            done, _ = wait(list(waiting), return_when=FIRST_COMPLETED)
+            yield from collect(done)
+
+    while waiting:
+        done, _ = wait(list(waiting), return_when=FIRST_COMPLETED)
+        yield from collect(done)
+
+
+def stream_batch(batch, generator=None):
+    """JSON Lines for a batch: one line per variant, then a summary line"""
+    started = time.perf_counter()
+    generated = cached = 0
+    failed = 0
+    for item in generate_batch(batch, generator):
+        if 'error' in item:
+            failed += 1
+        elif item['cached']:
+            cached += 1
+        else:
+            generated += 1
+        yield json.dumps(item) + '\n'
+    yield json.dumps({
+        'done': True,
+        'variants': generated + cached + failed,
+        'generated': generated,
+        'cached': cached,
+        'failed': failed,
+        'seconds': round(time.perf_counter() - started, 3),
+    }) + '\n'
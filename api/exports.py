@@ -0,0 +1,349 @@
+"""
+Streaming dataset exports.
+
+Rows are read with QuerySet.iterator(chunk_size=...) as flat value tuples and
+encoded incrementally as CSV or JSON Lines, optionally gzip-compressed on the
+fly, so an export of any size holds only one database chunk and one output
+buffer in memory.
+
+Very large exports can instead run as ExportJobs: a worker writes the file in
+primary-key ordered batches and checkpoints (last row id, file size) after
+each one. A job whose worker dies is leased again and resumes from its last
+checkpoint; anything written after that checkpoint is truncated away first.
+"""
+import csv
+import json
+import logging
+import os
+import secrets
+import socket
+import time
+import zlib
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ChangeEvent, ExportJob, Idea, WorkflowRun
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# Encoded output is handed to the response (or file) in blocks of about this size
+BUFFER_SIZE = 64 * 1024
+
+
+# Datasets
+# Each dataset maps a user to a queryset and lists the columns to export. The
+# first column must be the primary key: it is the keyset used to resume.
+
+DATASETS = {}
+
+
+class Dataset:
+    def __init__(self, name, queryset, columns):
+        self.name = name
+        self.queryset = queryset
+        # (header, lookup) pairs passed to values_list()
+        self.columns = columns
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def rows(self, user, after_id=0):
+        """Queryset of value tuples in primary key order, after a keyset position"""
+        return (
+            self.queryset(user)
+            .filter(pk__gt=after_id)
+            .order_by('pk')
+            .values_list(*[lookup for _, lookup in self.columns])
+        )
+
+
+def register_dataset(name, queryset, columns):
+    DATASETS[name] = Dataset(name, queryset, columns)
+    return DATASETS[name]
+
+
+def get_dataset(name):
+    try:
+        return DATASETS[name]
+    except KeyError:
+        raise ValueError(f"Unknown dataset '{name}'. Available: {', '.join(sorted(DATASETS))}")
+
+
+register_dataset('ideas', Idea.visible_to, [
+    ('id', 'id'),
+    ('title', 'title'),
+    ('description', 'description'),
+    ('source', 'source'),
+    ('author', 'author'),
+    ('impact', 'impact'),
+    ('effort', 'effort'),
+    ('created_at', 'created_at'),
+])
+
+register_dataset('workflow_runs', lambda user: WorkflowRun.objects.filter(workflow__owner=user), [
+    ('id', 'id'),
+    ('workflow_id', 'workflow_id'),
+    ('workflow', 'workflow__name'),
+    ('attempt', 'attempt'),
+    ('status', 'status'),
+    ('started_at', 'started_at'),
+    ('finished_at', 'finished_at'),
+    ('duration_ms', 'duration_ms'),
+    ('error', 'error'),
+])
+
+register_dataset('events', lambda user: ChangeEvent.objects.filter(user=user), [
+    ('id', 'id'),
+    ('kind', 'kind'),
+    ('source', 'source'),
+    ('payload', 'payload'),
+    ('created_at', 'created_at'),
+])
+
+
+# Encoding
+
+class _LineBuffer:
+    """File-like sink for csv.writer that collects what it writes"""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, value):
+        self.parts.append(value)
+
+    def take(self):
+        data = ''.join(self.parts)
+        self.parts.clear()
+        return data
+
+
+# Types csv.writer already writes correctly (None becomes an empty field)
+_CSV_NATIVE = frozenset([str, int, float, bool, type(None)])
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=DjangoJSONEncoder, separators=(',', ':'))
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(headers, rows, header=True):
+    """Yield CSV-encoded byte blocks for an iterable of value tuples"""
+    sink = _LineBuffer()
+    writer = csv.writer(sink)
+    if header:
+        writer.writerow(headers)
+    size = 0
+    for row in rows:
+        writer.writerow([
+            value if type(value) in _CSV_NATIVE else _csv_value(value) for value in row
+        ])
+        size += 1
+        # Checking the buffered length per row is too costly; rows are small
+        if size == 256:
+            size = 0
+            if sum(map(len, sink.parts)) >= BUFFER_SIZE:
+                yield sink.take().encode()
+    if sink.parts:
+        yield sink.take().encode()
+
+
+def encode_jsonl(headers, rows, header=True):
+    """Yield JSON Lines byte blocks for an iterable of value tuples"""
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    parts = []
+    size = 0
+    for row in rows:
+        line = encoder.encode(dict(zip(headers, row)))
+        parts.append(line)
+        size += len(line) + 1
+        if size >= BUFFER_SIZE:
+            yield ('\n'.join(parts) + '\n').encode()
+            parts.clear()
+            size = 0
+    if parts:
+        yield ('\n'.join(parts) + '\n').encode()
+
+
+ENCODERS = {
+    'csv': encode_csv,
+    'jsonl': encode_jsonl,
+}
+
+
+def gzip_blocks(blocks, level=6):
+    """Compress a stream of byte blocks into a single gzip member, incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(dataset, user, file_format='csv', compress=False, after_id=0, chunk_size=None):
+    """
+    Yield the encoded export of a dataset for a user as byte blocks.
+
+    after_id resumes after a given primary key, e.g. the last id a client
+    received before its download was interrupted.
+    """
+    if file_format not in ENCODERS:
+        raise ValueError(f"Unsupported format '{file_format}'. Use one of: {', '.join(FORMATS)}")
+    rows = dataset.rows(user, after_id).iterator(chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE)
+    blocks = ENCODERS[file_format](dataset.headers, rows, header=not after_id)
+    return gzip_blocks(blocks) if compress else blocks
+
+
+# Export jobs
+
+def export_path(job):
+    return Path(settings.EXPORT_ROOT) / job.file_name
+
+
+def create_job(user, dataset, file_format='csv', compress=False):
+    dataset = get_dataset(dataset)
+    if file_format not in ENCODERS:
+        raise ValueError(f"Unsupported format '{file_format}'. Use one of: {', '.join(FORMATS)}")
+    return ExportJob.objects.create(
+        owner=user, dataset=dataset.name, file_format=file_format, compress=compress
+    )
+
+
+def lease_export_jobs(worker_id, limit, lease_seconds=None):
+    """
+    Lease up to limit export jobs for this worker and return them.
+
+    Running jobs whose lease expired (their worker died) are leased again
+    and resume from their last checkpoint.
+    """
+    now = timezone.now()
+    lease_seconds = lease_seconds or settings.EXPORT_LEASE_SECONDS
+    token = secrets.token_hex(16)
+    available = (
+        Q(status=ExportJob.STATUS_QUEUED) |
+        Q(status=ExportJob.STATUS_RUNNING, lease_expires_at__lt=now)
+    )
+    ids = list(
+        ExportJob.objects.filter(available).order_by('created_at').values_list('id', flat=True)[:limit]
+    )
+    # Re-checking availability inside the UPDATE means two workers that
+    # picked the same candidates cannot both win a job
+    ExportJob.objects.filter(available, id__in=ids).update(
+        status=ExportJob.STATUS_RUNNING,
+        leased_by=worker_id,
+        lease_token=token,
+        lease_expires_at=now + timedelta(seconds=lease_seconds),
+        updated_at=now,
+    )
+    return list(ExportJob.objects.filter(id__in=ids, lease_token=token).order_by('created_at'))
+
+
+class LeaseLost(Exception):
+    """Another worker took over the job (our lease expired)"""
+
+
+def _checkpoint(job, lease_seconds, **fields):
+    now = timezone.now()
+    updated = ExportJob.objects.filter(pk=job.pk, lease_token=job.lease_token).update(
+        lease_expires_at=now + timedelta(seconds=lease_seconds), updated_at=now, **fields
+    )
+    if not updated:
+        raise LeaseLost(f'Lease on export {job.pk} was lost')
+    for name, value in fields.items():
+        setattr(job, name, value)
+
+
+def run_export_job(job, batch_size=None, lease_seconds=None):
+    """
+    Write (or resume writing) a leased job's file. Each batch is appended and
+    flushed to disk before its checkpoint is recorded, so a crash at any point
+    loses at most one batch of work.
+    """
+    batch_size = batch_size or settings.EXPORT_JOB_BATCH_SIZE
+    lease_seconds = lease_seconds or settings.EXPORT_LEASE_SECONDS
+    dataset = get_dataset(job.dataset)
+    encode = ENCODERS[job.file_format]
+    path = export_path(job)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, 'r+b' if path.exists() else 'w+b') as fh:
+        # Drop anything written after the last checkpoint
+        fh.truncate(job.bytes_written)
+        fh.seek(job.bytes_written)
+        while True:
+            rows = list(dataset.rows(job.owner, job.last_row_id)[:batch_size])
+            if not rows:
+                break
+            blocks = encode(dataset.headers, rows, header=job.bytes_written == 0)
+            if job.compress:
+                # One gzip member per batch; concatenated members form a valid
+                # gzip file, and each checkpoint falls on a member boundary
+                blocks = gzip_blocks(blocks)
+            for block in blocks:
+                fh.write(block)
+            fh.flush()
+            os.fsync(fh.fileno())
+            _checkpoint(
+                job, lease_seconds,
+                last_row_id=rows[-1][0],
+                rows_written=job.rows_written + len(rows),
+                bytes_written=fh.tell(),
+            )
+            if len(rows) < batch_size:
+                break
+
+    _checkpoint(job, lease_seconds, status=ExportJob.STATUS_SUCCEEDED, finished_at=timezone.now())
+    return job
+
+
+class ExportWorker:
+    """Leases export jobs and runs them one at a time"""
+
+    def __init__(self, worker_id=None, poll_interval=1.0, batch_size=None):
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.processed = 0
+        self.failed = 0
+        self.stopping = False
+
+    def stop(self):
+        self.stopping = True
+
+    def run(self, once=False):
+        while not self.stopping:
+            jobs = lease_export_jobs(self.worker_id, 1)
+            if not jobs:
+                if once:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            self.execute(jobs[0])
+
+    def execute(self, job):
+        try:
+            run_export_job(job, batch_size=self.batch_size)
+            self.processed += 1
+        except LeaseLost:
+            logger.warning('Export %s was taken over by another worker', job.pk)
+        except Exception as e:
+            logger.exception('Export %s failed', job.pk)
+            self.failed += 1
+            ExportJob.objects.filter(pk=job.pk, lease_token=job.lease_token).update(
+                status=ExportJob.STATUS_FAILED, error=str(e), finished_at=timezone.now()
+            )
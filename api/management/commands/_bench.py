@@ -0,0 +1,21 @@
+"""
+Helpers shared by the bench_* management commands.
+"""
+import os
+import sys
+
+
+def rss_bytes():
+    """Current resident set size of this process, or peak RSS where that is all we can get"""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
@@ -0,0 +1,103 @@
+"""
+Benchmark materialized briefing reads against on-demand assembly.
+
+Generates users and change events inside a transaction that is rolled back,
+so the database is left untouched.
+"""
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api import briefings
+from api.models import Briefing, ChangeEvent, MaterializerCursor
+
+TOPICS = ['Biometric Auth', 'App Performance', 'Customer Support', 'Dark Mode', 'Payments', 'Onboarding']
+SOURCES = ['Jira', 'Slack #engineering', 'Teams', 'Metrics', 'Feedback Hub']
+SEVERITIES = ['High', 'Medium', 'Low']
+
+
+class Command(BaseCommand):
+    help = 'Compare materialized briefing reads with assembling briefings on demand'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--events-per-user', type=int, default=30)
+        parser.add_argument('--samples', type=int, default=1000, help='Users to time reads for')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            self.stdout.write(f'Generating {options["users"]} users...')
+            users = User.objects.bulk_create([
+                User(username=f'bench-briefing-{i}', email=f'bench-briefing-{i}@example.com')
+                for i in range(options['users'])
+            ], batch_size=1000)
+            user_ids = [user.pk for user in users]
+            if user_ids[0] is None:
+                user_ids = list(User.objects.filter(
+                    username__startswith='bench-briefing-'
+                ).values_list('pk', flat=True))
+
+            # Start the consumer after any existing events so only generated ones are timed
+            last_id = ChangeEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            MaterializerCursor.objects.update_or_create(
+                name=briefings.CURSOR_NAME, defaults={'position': last_id}
+            )
+
+            now = timezone.now()
+            events = []
+            for _ in range(options['events_per_user'] * len(user_ids)):
+                if rng.random() < 0.4:
+                    events.append(ChangeEvent(
+                        user_id=rng.choice(user_ids), kind=ChangeEvent.KIND_ALERT,
+                        source=rng.choice(SOURCES), created_at=now,
+                        payload={'type': 'alert', 'severity': rng.choice(SEVERITIES), 'message': 'Velocity dropped'}
+                    ))
+                else:
+                    events.append(ChangeEvent(
+                        user_id=rng.choice(user_ids), kind=ChangeEvent.KIND_SENTIMENT,
+                        source='Feedback Hub', created_at=now,
+                        payload={'topic': rng.choice(TOPICS), 'score': rng.uniform(-1, 1)}
+                    ))
+            ChangeEvent.objects.bulk_create(events, batch_size=2000)
+            self.stdout.write(f'Generated {len(events)} change events')
+
+            started = time.perf_counter()
+            consumed = 0
+            while True:
+                batch = briefings.materialize_batch()
+                if not batch:
+                    break
+                consumed += batch
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'Materialized {consumed} events in {elapsed:.2f}s '
+                              f'({consumed / elapsed:.0f} events/sec)')
+
+            sample = rng.sample(user_ids, min(options['samples'], len(user_ids)))
+            materialized = _time(lambda user_id: Briefing.objects.get(user_id=user_id).document, sample)
+            on_demand = _time(briefings.assemble, sample)
+
+            self.stdout.write(f'{"read path":>14} {"p50":>9} {"p95":>9} {"p99":>9}')
+            for label, timings in (('materialized', materialized), ('on-demand', on_demand)):
+                q = statistics.quantiles(timings, n=100)
+                self.stdout.write(f'{label:>14} {q[49]:>7.3f}ms {q[94]:>7.3f}ms {q[98]:>7.3f}ms')
+            self.stdout.write(
+                f'Serving all {len(user_ids)} users: materialized {sum(materialized) / len(sample) * len(user_ids) / 1000:.1f}s, '
+                f'on-demand {sum(on_demand) / len(sample) * len(user_ids) / 1000:.1f}s'
+            )
+            transaction.set_rollback(True)
+
+
+def _time(func, user_ids):
+    timings = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        func(user_id)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
@@ -0,0 +1,83 @@
+"""
+Benchmark batch content generation over a persona x channel x product matrix.
+
+Uses the StubGenerator with a simulated per-call latency standing in for a
+remote model, and compares sequential generation with the worker pool, then
+a repeat of the same batch served from the output memo.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import content
+
+PERSONAS = [
+    'Software Engineer', 'Product Manager', 'Teacher', 'Nurse', 'Small Business Owner', 'Student',
+    'Designer', 'Freelancer', 'Retiree', 'Parent', 'Marketer', 'Data Scientist',
+]
+PRODUCTS = [
+    'Face ID Login', 'Savings Pods', 'Credit Builder', 'Bill Split', 'Dark Mode', 'Multi-Currency Wallet',
+    'Travel Insurance', 'Business Profiles', 'Early Direct Deposit', 'Cash Card',
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure batch content generation throughput with the worker pool and output memo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--personas', type=int, default=len(PERSONAS))
+        parser.add_argument('--products', type=int, default=len(PRODUCTS))
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='Simulated seconds per generator call')
+        parser.add_argument('--workers', type=int, default=settings.CONTENT_WORKERS)
+
+    def handle(self, *args, **options):
+        batch = content.parse_batch({
+            'personas': [
+                {'name': name, 'goal': 'get more done', 'pain': 'busywork'}
+                for name in (PERSONAS * (options['personas'] // len(PERSONAS) + 1))[:options['personas']]
+            ],
+            'channels': list(content.CHANNEL_TEMPLATES),
+            'products': [
+                {'name': f'{name} {i // len(PRODUCTS) or ""}'.strip(), 'benefit': 'saves you time',
+                 'tags': ['fintech'], 'features': ['Fast', 'Secure']}
+                for i, name in enumerate((PRODUCTS * (options['products'] // len(PRODUCTS) + 1))[:options['products']])
+            ],
+            'tone': 'enthusiastic',
+        })
+        variants = len(batch['personas']) * len(batch['channels']) * len(batch['products'])
+        generator = content.StubGenerator(options['latency'])
+        self.stdout.write(
+            f'{variants} variants ({len(batch["personas"])} personas x {len(batch["channels"])} channels x '
+            f'{len(batch["products"])} products), {options["latency"] * 1000:.0f}ms per call'
+        )
+        self.stdout.write('')
+        self.stdout.write(f'{"run":<28} {"seconds":>9} {"variants/s":>11} {"first result":>13}')
+
+        with ThreadPoolExecutor(1) as sequential, ThreadPoolExecutor(options['workers']) as pool:
+            self.run('sequential (1 worker)', batch, generator, sequential)
+            self.run(f'pool ({options["workers"]} workers)', batch, generator, pool)
+            self.run('repeat (memoized)', batch, generator, pool, clear=False)
+
+        stats = content.templates.stats()
+        self.stdout.write('')
+        self.stdout.write(
+            f'Template cache: {stats["size"]} compiled, {stats["hits"]} hits, {stats["misses"]} misses'
+        )
+
+    def run(self, label, batch, generator, executor, clear=True):
+        if clear:
+            content.outputs.clear()
+        started = time.perf_counter()
+        first = None
+        count = 0
+        for item in content.generate_batch(batch, generator, executor):
+            if first is None:
+                first = time.perf_counter() - started
+            count += 1
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{label:<28} {elapsed:>8.2f}s {count / elapsed:>11.0f} {(first or 0) * 1000:>11.1f}ms'
+        )
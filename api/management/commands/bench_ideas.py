@@ -0,0 +1,102 @@
+"""
+Benchmark idea insert-and-query latency as the corpus grows.
+
+Runs inside a transaction that is rolled back, so the database is left
+untouched.
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Idea
+
+WORDS = (
+    'dashboard export slack integration mobile offline sync onboarding analytics '
+    'report billing invoice search filter roadmap sprint feedback survey alert '
+    'notification dark mode api webhook sso permission audit template workflow '
+    'pricing trial churn retention cohort funnel persona segment ai summary'
+).split()
+
+
+def synthetic_idea(rng, bases):
+    """Return a fresh idea text, or a lightly edited copy of an earlier one"""
+    if bases and rng.random() < 0.3:
+        words = rng.choice(bases).split()
+        for _ in range(rng.randint(0, 2)):
+            words[rng.randrange(len(words))] = rng.choice(WORDS)
+        return ' '.join(words)
+    text = ' '.join(
+        rng.choice(WORDS) if rng.random() < 0.5 else _random_word(rng)
+        for _ in range(rng.randint(12, 30))
+    )
+    bases.append(text)
+    return text
+
+
+def _random_word(rng):
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 9)))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark duplicate-detecting idea inserts as the corpus grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=20000, help='Final corpus size')
+        parser.add_argument('--checkpoints', type=int, default=5,
+                            help='Number of corpus sizes to report latency at')
+        parser.add_argument('--samples', type=int, default=200,
+                            help='Timed inserts per checkpoint')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        size = options['size']
+        samples = options['samples']
+        step = max(size // options['checkpoints'], samples)
+        bases = []
+
+        self.stdout.write(f'{"corpus":>8} {"insert p50":>11} {"insert p95":>11} '
+                          f'{"query p50":>10} {"query p95":>10} {"dups/query":>10}')
+        with transaction.atomic():
+            inserted = 0
+            while inserted < size:
+                target = min(inserted + step, size)
+                # Untimed bulk growth up to the checkpoint, minus the timed samples
+                bulk = []
+                while inserted + len(bulk) < target - samples:
+                    text = synthetic_idea(rng, bases)
+                    bulk.append(Idea(title=text[:80], description=text))
+                for idea in Idea.objects.bulk_create(bulk, batch_size=1000):
+                    idea.index()
+                inserted += len(bulk)
+
+                insert_times, query_times, found = [], [], 0
+                for _ in range(target - inserted):
+                    text = synthetic_idea(rng, bases)
+                    started = time.perf_counter()
+                    idea = Idea.objects.create(title=text[:80], description=text)
+                    idea.index()
+                    insert_times.append(time.perf_counter() - started)
+
+                    started = time.perf_counter()
+                    found += len(idea.find_duplicates())
+                    query_times.append(time.perf_counter() - started)
+                inserted = target
+
+                self.stdout.write(
+                    f'{inserted:>8} {_ms(insert_times, 50):>9.2f}ms {_ms(insert_times, 95):>9.2f}ms '
+                    f'{_ms(query_times, 50):>8.2f}ms {_ms(query_times, 95):>8.2f}ms '
+                    f'{found / max(len(query_times), 1):>10.2f}'
+                )
+            transaction.set_rollback(True)
+
+
+def _ms(values, percentile):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0] * 1000
+    return statistics.quantiles(values, n=100)[percentile - 1] * 1000
@@ -0,0 +1,139 @@
+"""
+Benchmark organization membership queries at scale.
+
+Generates users whose profiles carry organizationName/industry only in their
+preferences JSON (as onboarding used to store them), backfills
+UserProfile.organization with the data migration's batched backfill, then
+compares JSON scans with the indexed foreign key. Everything happens inside a
+transaction that is rolled back, so the database is left untouched.
+"""
+import json
+import random
+import statistics
+import time
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.models import Organization, UserProfile
+
+from ._bench import rss_bytes
+
+INDUSTRIES = [
+    'Fintech', 'Healthcare', 'Retail', 'Education', 'Logistics', 'Media', 'Gaming', 'Energy',
+    'Travel', 'Real Estate', 'Insurance', 'Manufacturing', 'Telecom', 'Automotive', 'Agriculture',
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare org membership queries over preferences JSON and the indexed organization FK'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--orgs', type=int, default=20000)
+        parser.add_argument('--samples', type=int, default=200, help='Indexed queries timed per case')
+        parser.add_argument('--scan-samples', type=int, default=5, help='JSON scan queries timed per case')
+        parser.add_argument('--seed', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            names = self.generate(rng, options['users'], options['orgs'])
+            self.backfill()
+            self.compare(rng, names, options)
+            transaction.set_rollback(True)
+
+    def generate(self, rng, count, orgs):
+        """Insert users and profiles; org sizes are skewed so a few orgs are large"""
+        names = [(f'Company {i}', rng.choice(INDUSTRIES)) for i in range(orgs)]
+        weights = [1 / (rank + 1) for rank in range(orgs)]
+        user_table = connection.ops.quote_name(User._meta.db_table)
+        profile_table = connection.ops.quote_name(UserProfile._meta.db_table)
+        now = timezone.now()
+        self.stdout.write(f'Generating {count} users in {orgs} organizations...')
+        started = time.perf_counter()
+        first_id = (User.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        with connection.cursor() as cursor:
+            for offset in range(0, count, 10000):
+                size = min(10000, count - offset)
+                cursor.executemany(
+                    f'INSERT INTO {user_table} (id, password, is_superuser, username, first_name, last_name, '
+                    f'email, is_staff, is_active, date_joined) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)',
+                    [
+                        (first_id + offset + i, '!', False, f'bench-org-{offset + i}', '', '',
+                         f'bench-org-{offset + i}@example.com', False, True, now)
+                        for i in range(size)
+                    ]
+                )
+                members = rng.choices(names, weights, k=size)
+                cursor.executemany(
+                    f'INSERT INTO {profile_table} (user_id, preferences, onboarding_completed, onboarding_data, '
+                    f'created_at, updated_at) VALUES (%s, %s, %s, %s, %s, %s)',
+                    [
+                        (first_id + offset + i, json.dumps({'organizationName': name, 'industry': industry}),
+                         True, '{}', now, now)
+                        for i, (name, industry) in enumerate(members)
+                    ]
+                )
+        self.stdout.write(f'  done in {time.perf_counter() - started:.1f}s')
+        return names
+
+    def backfill(self):
+        migration = import_module('api.migrations.0011_backfill_organizations')
+        baseline = rss_bytes()
+        started = time.perf_counter()
+        # The backfill only needs schema_editor.connection
+        migration.backfill(apps, SimpleNamespace(connection=connection))
+        self.stdout.write(
+            f'Backfilled {Organization.objects.count()} organizations in '
+            f'{time.perf_counter() - started:.1f}s (RSS +{(rss_bytes() - baseline) / 2 ** 20:.1f}MB)'
+        )
+
+    def timed(self, query, samples):
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def compare(self, rng, names, options):
+        orgs = dict(Organization.objects.values_list('name', 'id'))
+        largest = names[0]
+        cases = [
+            (
+                'member count (largest org)',
+                lambda: UserProfile.objects.filter(preferences__organizationName=largest[0]).count(),
+                lambda: UserProfile.objects.filter(organization_id=orgs[largest[0]]).count(),
+            ),
+            (
+                'member count (random org)',
+                lambda: UserProfile.objects.filter(preferences__organizationName=rng.choice(names)[0]).count(),
+                lambda: UserProfile.objects.filter(organization_id=orgs[rng.choice(names)[0]]).count(),
+            ),
+            (
+                'first 50 members (largest org)',
+                lambda: list(UserProfile.objects.filter(preferences__organizationName=largest[0])
+                             .order_by('user_id').values_list('user_id', flat=True)[:50]),
+                lambda: list(UserProfile.objects.filter(organization_id=orgs[largest[0]])
+                             .order_by('user_id').values_list('user_id', flat=True)[:50]),
+            ),
+            (
+                'users in an industry',
+                lambda: UserProfile.objects.filter(preferences__industry=rng.choice(INDUSTRIES)).count(),
+                lambda: UserProfile.objects.filter(organization__industry=rng.choice(INDUSTRIES)).count(),
+            ),
+        ]
+        self.stdout.write('')
+        self.stdout.write(f'{"query":<32} {"JSON scan":>11} {"indexed FK":>11} {"speedup":>8}')
+        for label, scan, indexed in cases:
+            scan_ms = self.timed(scan, options['scan_samples'])
+            indexed_ms = self.timed(indexed, options['samples'])
+            self.stdout.write(
+                f'{label:<32} {scan_ms:>9.2f}ms {indexed_ms:>9.3f}ms {scan_ms / indexed_ms:>7.0f}x'
+            )
@@ -0,0 +1,75 @@
+"""
+Benchmark persona derivation fit time and memory on a synthetic record stream.
+
+Records are generated lazily, so any growth in RSS comes from the fitter
+rather than the input.
+"""
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.personas import PersonaDeriver, chunked
+
+from ._bench import rss_bytes
+
+ARCHETYPES = [
+    ('Software Engineer', 'Urban', 'Mobile App', 'Push notifications', 31, 80000),
+    ('Teacher', 'Suburban', 'Web', 'Email', 38, 62000),
+    ('Nurse', 'Suburban', 'Mobile App', 'SMS', 42, 70000),
+    ('Retired', 'Rural', 'Branch', 'Phone', 68, 40000),
+    ('Student', 'Urban', 'Mobile App', 'In-app', 21, 12000),
+    ('Small Business Owner', 'Urban', 'Web', 'Email', 47, 110000),
+]
+
+
+def synthetic_records(count, seed):
+    rng = random.Random(seed)
+    occupations = [archetype[0] for archetype in ARCHETYPES]
+    for _ in range(count):
+        occupation, location, channel, communication, age, income = rng.choice(ARCHETYPES)
+        yield {
+            'occupation': occupation if rng.random() < 0.85 else rng.choice(occupations),
+            'location': location if rng.random() < 0.8 else rng.choice(['Urban', 'Suburban', 'Rural']),
+            'channel': channel,
+            'communication': communication if rng.random() < 0.9 else 'Email',
+            'age': round(rng.gauss(age, 5)),
+            'income': round(rng.lognormvariate(math.log(income), 0.3)),
+        }
+
+
+class Command(BaseCommand):
+    help = 'Measure persona fit time and memory on a synthetic stream of records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--k', type=int, default=6)
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=3)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        deriver = PersonaDeriver(k=options['k'], seed=options['seed'])
+        baseline = rss_bytes()
+        report_every = max(rows // 10, options['chunk_size'])
+        next_report = report_every
+
+        self.stdout.write(f'{"rows":>10} {"seconds":>8} {"rows/sec":>9} {"RSS delta":>10}')
+        started = time.perf_counter()
+        for chunk in chunked(synthetic_records(rows, options['seed']), options['chunk_size']):
+            deriver.partial_fit(chunk)
+            if deriver.n_samples >= next_report or deriver.n_samples == rows:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{deriver.n_samples:>10} {elapsed:>8.1f} {deriver.n_samples / elapsed:>9.0f} '
+                    f'{(rss_bytes() - baseline) / 2 ** 20:>8.1f}MB'
+                )
+                next_report += report_every
+
+        self.stdout.write('')
+        for persona in deriver.personas():
+            self.stdout.write(
+                f'  {persona["percentage"]:>5}%  {persona["name"]} '
+                f'(age {persona["age"]}, income {persona["income"]:.0f})'
+            )
@@ -0,0 +1,192 @@
+"""
+Benchmark PRD version history: storage per edit, save latency, and the time
+to rebuild and diff arbitrary versions over a long synthetic edit history.
+
+A generated PRD with long text sections and structured lists is edited one
+change at a time (rewording, inserting or deleting a paragraph, editing a
+list), first as explicit saves that each add a revision, then as bursts of
+autosaves that are coalesced. Runs inside a transaction that is rolled back,
+so the database is left untouched.
+"""
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from api import prds
+from api.models import PRDRevision
+
+TEXT_SECTIONS = ['problem', 'background', 'user_stories', 'ux', 'technical_approach', 'risks', 'rollout']
+LIST_SECTIONS = ['goals', 'requirements', 'metrics', 'out_of_scope']
+WORDS = (
+    'user biometric login secure fast session token device fallback passcode enrollment consent privacy '
+    'latency conversion retention onboarding support fraud compliance audit android ios web flow screen '
+    'prompt error retry timeout analytics experiment cohort release flag migration'
+).split()
+
+
+class Editor:
+    """Generates a PRD and applies one random edit at a time"""
+
+    def __init__(self, rng, paragraphs):
+        self.rng = rng
+        self.document = {
+            section: '\n'.join(self.paragraph() for _ in range(paragraphs)) for section in TEXT_SECTIONS
+        }
+        for section in LIST_SECTIONS:
+            self.document[section] = [self.item(i) for i in range(8)]
+
+    def sentence(self):
+        words = self.rng.choices(WORDS, k=self.rng.randint(8, 18))
+        return ' '.join(words).capitalize() + '.'
+
+    def paragraph(self):
+        return ' '.join(self.sentence() for _ in range(self.rng.randint(2, 5)))
+
+    def item(self, ident):
+        return {'id': ident, 'text': self.sentence(), 'priority': self.rng.choice(['P0', 'P1', 'P2'])}
+
+    def edit(self):
+        section = self.rng.choice(TEXT_SECTIONS + LIST_SECTIONS)
+        value = self.document[section]
+        if isinstance(value, str):
+            paragraphs = value.split('\n')
+            index = self.rng.randrange(len(paragraphs))
+            roll = self.rng.random()
+            if roll < 0.8:
+                sentences = paragraphs[index].split('. ')
+                sentences[self.rng.randrange(len(sentences))] = self.sentence().rstrip('.')
+                paragraphs[index] = '. '.join(sentences)
+            elif roll < 0.9 or len(paragraphs) < 5:
+                paragraphs.insert(index, self.paragraph())
+            else:
+                del paragraphs[index]
+            value = '\n'.join(paragraphs)
+        else:
+            value = [dict(item) for item in value]
+            roll = self.rng.random()
+            if roll < 0.6:
+                self.rng.choice(value)['text'] = self.sentence()
+            elif roll < 0.8 or len(value) < 3:
+                value.append(self.item(max(item['id'] for item in value) + 1))
+            else:
+                del value[self.rng.randrange(len(value))]
+        self.document = dict(self.document, **{section: value})
+        return self.document
+
+
+class Command(BaseCommand):
+    help = 'Measure PRD revision storage, save latency and version reconstruction over a long edit history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--revisions', type=int, default=10000)
+        parser.add_argument('--autosaves', type=int, default=2000,
+                            help='Autosaves, arriving in typing bursts, to coalesce after the explicit saves')
+        parser.add_argument('--paragraphs', type=int, default=12, help='Paragraphs per text section')
+        parser.add_argument('--samples', type=int, default=300)
+        parser.add_argument('--seed', type=int, default=21)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            owner = User.objects.create(username='bench-prds', email='bench-prds@example.com')
+            editor = Editor(rng, options['paragraphs'])
+            self.now = timezone.now() - timedelta(days=90)
+            prd = prds.create(owner, 'Biometric Authentication', editor.document, now=self.now)
+            self.save_revisions(prd, owner, editor, options['revisions'])
+            self.report_storage(prd)
+            self.report_reads(rng, prd, options['samples'])
+            self.coalesce(rng, prd, owner, editor, options['autosaves'])
+            transaction.set_rollback(True)
+
+    def timed(self, func, samples):
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.95) - 1], timings[-1]
+
+    def save_revisions(self, prd, owner, editor, count):
+        self.stdout.write(
+            f'Saving {count} revisions of a {len(json.dumps(editor.document)) / 1024:.0f}KB PRD '
+            f'(keyframe interval {settings.PRD_KEYFRAME_INTERVAL})...'
+        )
+        self.full_bytes = len(json.dumps(editor.document))
+        timings = []
+        for _ in range(count):
+            document = editor.edit()
+            self.full_bytes += len(json.dumps(document))
+            self.now += timedelta(minutes=5)
+            started = time.perf_counter()
+            prds.save(prd, document, author=owner, now=self.now)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'  save p50 {statistics.median(timings):.2f}ms, p95 {timings[int(len(timings) * 0.95) - 1]:.2f}ms'
+        )
+
+    def report_storage(self, prd):
+        stats = PRDRevision.objects.filter(prd=prd).aggregate(n=Count('id'), stored=Sum(Length('data')))
+        keyframes = PRDRevision.objects.filter(prd=prd, is_keyframe=True).aggregate(
+            n=Count('id'), stored=Sum(Length('data'))
+        )
+        deltas = (stats['stored'] or 0) - (keyframes['stored'] or 0)
+        self.stdout.write('')
+        self.stdout.write(f'Revisions:               {stats["n"]:>10}')
+        self.stdout.write(f'Full copies (JSON):      {self.full_bytes / 2 ** 20:>9.1f}MB')
+        self.stdout.write(f'Stored:                  {stats["stored"] / 2 ** 20:>9.2f}MB')
+        self.stdout.write(f'  keyframes:             {keyframes["n"]:>10} ({keyframes["stored"] / 2 ** 20:.2f}MB)')
+        self.stdout.write(f'  deltas:                {stats["n"] - keyframes["n"]:>10} ({deltas / 2 ** 20:.2f}MB)')
+        self.stdout.write(f'Bytes per edit:          {stats["stored"] / stats["n"]:>10.0f}')
+        self.stdout.write(f'  vs full copies:        {self.full_bytes / stats["stored"]:>9.0f}x smaller')
+
+    def report_reads(self, rng, prd, samples):
+        keyframes = list(PRDRevision.objects.filter(prd=prd, is_keyframe=True).values_list('version', flat=True))
+        # The version just before a keyframe replays the longest delta chain
+        longest = [version - 1 for version in keyframes if version > 1]
+        random_versions = iter(rng.randint(1, prd.version) for _ in range(samples))
+        worst_versions = iter(rng.choice(longest) for _ in range(samples))
+        pairs = iter(sorted(rng.sample(range(1, prd.version + 1), 2)) for _ in range(samples))
+        cases = [
+            ('latest version', lambda: prds.document_at(prd, prd.version)),
+            ('random version', lambda: prds.document_at(prd, next(random_versions))),
+            ('longest delta chain', lambda: prds.document_at(prd, next(worst_versions))),
+            ('diff of random versions', lambda: prds.diff_versions(prd, *next(pairs))),
+            ('history page (50)', lambda: list(prds.history(prd))),
+        ]
+        self.stdout.write('')
+        self.stdout.write(f'{"read":<26} {"p50":>9} {"p95":>9} {"max":>9}')
+        for label, func in cases:
+            p50, p95, worst = self.timed(func, samples)
+            self.stdout.write(f'{label:<26} {p50:>7.2f}ms {p95:>7.2f}ms {worst:>7.2f}ms')
+
+    def coalesce(self, rng, prd, owner, editor, count):
+        if not count:
+            return
+        first_version = prd.version
+        outcomes = {prds.CREATED: 0, prds.COALESCED: 0, prds.UNCHANGED: 0}
+        saved = 0
+        while saved < count:
+            # A typing burst autosaving every few seconds, then a pause
+            for _ in range(min(rng.randint(10, 60), count - saved)):
+                self.now += timedelta(seconds=rng.uniform(2, 5))
+                _, outcome = prds.save(prd, editor.edit(), author=owner, autosave=True, now=self.now)
+                outcomes[outcome] += 1
+                saved += 1
+            self.now += timedelta(seconds=settings.PRD_AUTOSAVE_WINDOW + rng.randint(1, 600))
+        self.stdout.write('')
+        self.stdout.write(
+            f'Autosaves: {count} saves added {prd.version - first_version} revisions '
+            f'({outcomes[prds.COALESCED]} coalesced)'
+        )
@@ -0,0 +1,170 @@
+"""
+Benchmark the competitor snapshot store: storage size and diff latency over a
+synthetic stream of captures.
+
+Each competitor has a pricing page (HTML) and a product feed (JSON) captured
+repeatedly; most captures are unchanged and some change a price or add a
+feature. Runs inside a transaction that is rolled back, so the database is
+left untouched.
+"""
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from api import snapshots
+from api.models import Competitor, Snapshot, SnapshotBlob, SnapshotDiff
+
+FEATURES = [
+    'Early Direct Deposit', 'Savings Pods', 'Credit Builder', 'Bitcoin', 'Stock Trading', 'Cash Card',
+    'Bill Split', 'Dark Mode', 'Biometric Auth', 'Travel Insurance', 'Multi-Currency', 'Business Profiles',
+]
+
+
+class Source:
+    """Mutable state of one competitor source, rendered to a capture on demand"""
+
+    def __init__(self, rng, name):
+        self.rng = rng
+        self.name = name
+        self.plans = [
+            {'name': plan, 'price': round(rng.uniform(0, 50), 2)} for plan in ('Basic', 'Plus', 'Pro', 'Business')
+        ]
+        self.features = rng.sample(FEATURES, 6)
+        # Boilerplate that makes captured pages realistically large
+        self.footer = [f'Legal notice paragraph {i} for {name}. ' * 4 for i in range(60)]
+
+    def mutate(self):
+        if self.rng.random() < 0.7:
+            plan = self.rng.choice(self.plans)
+            plan['price'] = round(plan['price'] * self.rng.uniform(0.8, 1.25), 2)
+        else:
+            missing = [feature for feature in FEATURES if feature not in self.features]
+            if missing:
+                self.features.append(self.rng.choice(missing))
+
+    def page(self, nonce):
+        rows = ''.join(f'<li>{plan["name"]}: ${plan["price"]}/mo</li>' for plan in self.plans)
+        features = ''.join(f'<li>{feature}</li>' for feature in self.features)
+        footer = ''.join(f'<p>{line}</p>\n' for line in self.footer)
+        # The nonce stands in for per-request markup (tracking ids etc.)
+        return (
+            f'<html><head><script>window.requestId="{nonce}"</script></head><body>\n'
+            f'<h1>{self.name} pricing</h1>\n<ul>{rows}</ul>\n<h2>Features</h2>\n<ul>{features}</ul>\n'
+            f'{footer}</body></html>'
+        )
+
+    def feed(self):
+        return {'competitor': self.name, 'plans': self.plans, 'features': self.features}
+
+
+class Command(BaseCommand):
+    help = 'Measure snapshot storage size and diff latency over synthetic competitor captures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--captures', type=int, default=100000)
+        parser.add_argument('--competitors', type=int, default=100)
+        parser.add_argument('--change-rate', type=float, default=0.05,
+                            help='Probability that a capture differs from the previous one')
+        parser.add_argument('--markup-churn', type=float, default=0.05,
+                            help='Probability that a page capture differs only in markup')
+        parser.add_argument('--samples', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=13)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            owner = User.objects.create(username='bench-snapshots', email='bench-snapshots@example.com')
+            competitors = self.ingest(rng, owner, options)
+            self.report_storage()
+            self.report_latency(rng, competitors, options['samples'])
+            transaction.set_rollback(True)
+
+    def ingest(self, rng, owner, options):
+        competitors = []
+        for i in range(options['competitors']):
+            competitor = Competitor.objects.create(owner=owner, name=f'Competitor {i}')
+            competitors.append((competitor, Source(rng, competitor.name), {'page': None, 'feed': None}))
+
+        self.stdout.write(f'Ingesting {options["captures"]} captures...')
+        started = time.perf_counter()
+        captured_at = timezone.now() - timedelta(days=365)
+        self.raw_bytes = 0
+        for n in range(options['captures']):
+            competitor, source, latest = competitors[n % len(competitors)]
+            captured_at += timedelta(seconds=30)
+            if rng.random() < options['change_rate']:
+                source.mutate()
+            if n // len(competitors) % 2:
+                nonce = n if rng.random() < options['markup_churn'] else 0
+                content, content_type, name = source.page(nonce).encode(), snapshots.TYPE_PAGE, 'page'
+            else:
+                content, content_type, name = json.dumps(source.feed()).encode(), snapshots.TYPE_JSON, 'feed'
+            self.raw_bytes += len(content)
+            latest[name], _ = snapshots.ingest(
+                competitor, content, content_type, captured_at, source=name, previous=latest[name]
+            )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'  {options["captures"] / elapsed:.0f} captures/sec')
+        return [competitor for competitor, _, _ in competitors]
+
+    def report_storage(self):
+        versions = Snapshot.objects.count()
+        blobs = SnapshotBlob.objects.aggregate(n=Count('id'), size=Sum('size'), stored=Sum(Length('data')))
+        diffs = SnapshotDiff.objects.aggregate(n=Count('id'), stored=Sum(Length('data')))
+        stored = (blobs['stored'] or 0) + (diffs['stored'] or 0)
+        self.stdout.write('')
+        self.stdout.write(f'Captured content:    {self.raw_bytes / 2 ** 20:>9.1f}MB')
+        self.stdout.write(f'Versions:            {versions:>9}')
+        self.stdout.write(f'Unique blobs:        {blobs["n"]:>9} ({(blobs["size"] or 0) / 2 ** 20:.1f}MB uncompressed)')
+        self.stdout.write(f'Stored blobs:        {(blobs["stored"] or 0) / 2 ** 20:>9.2f}MB')
+        self.stdout.write(f'Cached diffs:        {diffs["n"]:>9} ({(diffs["stored"] or 0) / 2 ** 20:.2f}MB)')
+        self.stdout.write(f'Storage ratio:       {self.raw_bytes / max(stored, 1):>9.0f}x')
+
+    def timed(self, func, samples):
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+    def report_latency(self, rng, competitors, samples):
+        pairs = []
+        for competitor in rng.sample(competitors, min(len(competitors), samples)):
+            versions = list(
+                Snapshot.objects.filter(competitor=competitor, source='page')
+                .select_related('blob').defer('blob__data').order_by('captured_at')
+            )
+            if len(versions) >= 3:
+                pairs.append((versions, rng.sample(range(len(versions)), 2)))
+        if not pairs:
+            return
+
+        adjacent = iter([(versions[-2], versions[-1]) for versions, _ in pairs] * samples)
+        arbitrary = [(versions[min(a, b)], versions[max(a, b)]) for versions, (a, b) in pairs]
+        uncached = iter(arbitrary)
+        cached = iter(arbitrary * samples)
+        timeline = iter(rng.choice(competitors) for _ in range(samples))
+
+        snapshots._inflate.cache_clear()
+        cases = [
+            ('adjacent versions (cached at ingest)', lambda: snapshots.get_diff(*(s.blob for s in next(adjacent))), samples),
+            ('arbitrary versions, first request', lambda: snapshots.get_diff(*(s.blob for s in next(uncached))), len(arbitrary)),
+            ('arbitrary versions, repeated', lambda: snapshots.get_diff(*(s.blob for s in next(cached))), samples),
+            ('timeline (50 latest versions)', lambda: list(snapshots.timeline(next(timeline))), samples),
+        ]
+        self.stdout.write('')
+        self.stdout.write(f'{"query":<40} {"p50":>9} {"p95":>9}')
+        for label, func, count in cases:
+            p50, p95 = self.timed(func, count)
+            self.stdout.write(f'{label:<40} {p50:>7.2f}ms {p95:>7.2f}ms')
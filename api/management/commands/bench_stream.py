@@ -0,0 +1,110 @@
+"""
+Benchmark how many idle SSE connections one worker can hold.
+
+Drives the /api/stream/ ASGI application in-process with simulated clients
+(no sockets), so the numbers cover the endpoint, hub and queue costs but not
+the ASGI server's own per-socket buffers.
+"""
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from api.pubsub import Hub, LocalBackend
+from api.stream import EventStream
+
+from ._bench import rss_bytes
+
+
+class BenchEventStream(EventStream):
+    """Skips the session lookup; every simulated client is its own user"""
+
+    async def authenticate(self, scope):
+        return scope['bench_user_id']
+
+
+class SimulatedClient:
+    def __init__(self):
+        self.closed = asyncio.Event()
+        self.events = 0
+        self.received = None
+
+    async def receive(self):
+        await self.closed.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        body = message.get('body', b'')
+        if body.startswith(b'event:'):
+            self.events += body.count(b'event:')
+            if self.received is not None:
+                self.received()
+
+
+class Command(BaseCommand):
+    help = 'Measure memory per idle SSE connection and broadcast fan-out latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=10000)
+        parser.add_argument('--broadcasts', type=int, default=5)
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options['connections'], options['broadcasts']))
+
+    async def run(self, count, broadcasts):
+        hub = Hub(LocalBackend())
+        app = BenchEventStream(hub)
+        clients = [SimulatedClient() for _ in range(count)]
+
+        gc.collect()
+        rss_before = rss_bytes()
+        tracemalloc.start()
+        traced_before = tracemalloc.get_traced_memory()[0]
+
+        started = time.perf_counter()
+        tasks = [
+            asyncio.ensure_future(app(
+                {'type': 'http', 'method': 'GET', 'path': '/api/stream/',
+                 'query_string': b'topics=metrics', 'headers': [], 'bench_user_id': i},
+                client.receive, client.send
+            ))
+            for i, client in enumerate(clients)
+        ]
+        while hub.subscriber_count < count:
+            await asyncio.sleep(0.01)
+        connect_seconds = time.perf_counter() - started
+
+        gc.collect()
+        traced = tracemalloc.get_traced_memory()[0] - traced_before
+        tracemalloc.stop()
+        rss = rss_bytes() - rss_before
+
+        self.stdout.write(f'Opened {count} idle connections in {connect_seconds:.2f}s')
+        self.stdout.write(f'Python heap per connection: {traced / count / 1024:.2f} KiB')
+        self.stdout.write(f'RSS per connection:         {rss / count / 1024:.2f} KiB '
+                          f'(~{int(1024 ** 3 / max(rss / count, 1)):,} connections per GiB)')
+
+        for i in range(broadcasts):
+            remaining = count
+            done = asyncio.Event()
+
+            def received():
+                nonlocal remaining
+                remaining -= 1
+                if remaining == 0:
+                    done.set()
+
+            for client in clients:
+                client.received = received
+            started = time.perf_counter()
+            hub.dispatch({'topic': 'metrics', 'user_id': None, 'data': {'metric': 'dau', 'value': i}})
+            await done.wait()
+            self.stdout.write(f'Broadcast {i + 1} reached all {count} clients in '
+                              f'{(time.perf_counter() - started) * 1000:.1f}ms')
+
+        for client in clients:
+            client.closed.set()
+        await asyncio.gather(*tasks)
+        self.stdout.write(f'All connections closed; {hub.subscriber_count} subscriptions left')
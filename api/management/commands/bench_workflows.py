@@ -0,0 +1,56 @@
+"""
+Benchmark workflow worker throughput in jobs/sec.
+
+Creates a throwaway workflow, queues jobs for it, drains the queue with a
+single worker and deletes everything it created afterwards.
+"""
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import Workflow, WorkflowJob
+from api.workflows import WorkflowWorker
+
+
+class Command(BaseCommand):
+    help = 'Measure jobs/sec processed by one workflow worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=2000)
+        parser.add_argument('--steps', type=int, default=3, help='Steps per workflow')
+        parser.add_argument('--step-sleep', type=float, default=0.0,
+                            help='Seconds each step awaits, to simulate I/O-bound actions')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+
+    def handle(self, *args, **options):
+        if options['step_sleep']:
+            step = {'action': 'sleep', 'params': {'seconds': options['step_sleep']}}
+        else:
+            step = {'action': 'noop'}
+        steps = [dict(step, name=f'Step {i + 1}') for i in range(options['steps'])]
+
+        self.stdout.write(f'{"concurrency":>11} {"jobs":>7} {"seconds":>8} {"jobs/sec":>9}')
+        for concurrency in options['concurrency']:
+            workflow = Workflow.objects.create(
+                name='Benchmark workflow',
+                steps=steps,
+                max_concurrency=concurrency
+            )
+            try:
+                now = timezone.now()
+                WorkflowJob.objects.bulk_create([
+                    WorkflowJob(workflow=workflow, run_at=now, max_attempts=1)
+                    for _ in range(options['jobs'])
+                ], batch_size=1000)
+
+                worker = WorkflowWorker(concurrency=concurrency, poll_interval=0.05)
+                started = time.perf_counter()
+                asyncio.run(worker.run(once=True))
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{concurrency:>11} {worker.processed:>7} {elapsed:>8.2f} {worker.processed / elapsed:>9.1f}'
+                )
+            finally:
+                workflow.delete()
@@ -0,0 +1,84 @@
+"""
+Group the existing idea corpus into near-duplicate clusters.
+
+Works one LSH band at a time so memory stays proportional to the corpus size
+rather than corpus size x number of bands.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import minhash
+from api.models import Idea, IdeaBucket
+
+
+class Command(BaseCommand):
+    help = 'Cluster ideas into groups of likely duplicates using MinHash/LSH'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=None,
+                            help='Minimum estimated similarity (defaults to IDEA_DUPLICATE_THRESHOLD)')
+        parser.add_argument('--min-size', type=int, default=2,
+                            help='Only report clusters with at least this many ideas')
+        parser.add_argument('--reindex', action='store_true',
+                            help='Recompute signatures and buckets for ideas that have none')
+        parser.add_argument('--output', help='Write clusters as JSON to this file')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        threshold = options['threshold']
+        if threshold is None:
+            threshold = settings.IDEA_DUPLICATE_THRESHOLD
+        chunk_size = options['chunk_size']
+        started = time.perf_counter()
+
+        if options['reindex']:
+            indexed = IdeaBucket.objects.values('idea_id')
+            missing = Idea.objects.exclude(pk__in=indexed)
+            count = 0
+            for idea in missing.iterator(chunk_size=chunk_size):
+                idea.index()
+                count += 1
+            self.stdout.write(f'Indexed {count} ideas')
+
+        signatures = {}
+        for pk, data in Idea.objects.values_list('pk', 'signature').iterator(chunk_size=chunk_size):
+            if data:
+                signatures[pk] = minhash.from_bytes(data)
+        self.stdout.write(f'Loaded {len(signatures)} signatures')
+
+        clusters = minhash.UnionFind()
+        for band in range(minhash.BANDS):
+            buckets = {}
+            for pk, sig in signatures.items():
+                members = buckets.setdefault(minhash.band_key(sig, band), [])
+                # Every pair sharing a bucket is a candidate, as for
+                # Idea.find_similar; pairs already clustered are skipped
+                for other in members:
+                    if clusters.find(other) != clusters.find(pk) and \
+                            minhash.similarity(sig, signatures[other]) >= threshold:
+                        clusters.union(other, pk)
+                members.append(pk)
+
+        groups = [
+            sorted(members) for members in clusters.groups().values()
+            if len(members) >= options['min_size']
+        ]
+        groups.sort(key=len, reverse=True)
+
+        elapsed = time.perf_counter() - started
+        duplicates = sum(len(group) - 1 for group in groups)
+        self.stdout.write(self.style.SUCCESS(
+            f'Found {len(groups)} clusters covering {duplicates} duplicate ideas in {elapsed:.1f}s'
+        ))
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump({'threshold': threshold, 'clusters': groups}, fh)
+            self.stdout.write(f'Wrote clusters to {options["output"]}')
+        else:
+            for group in groups[:20]:
+                self.stdout.write(f'  {len(group)} ideas: {group[:10]}')
+
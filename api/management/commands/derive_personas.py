@@ -0,0 +1,50 @@
+"""
+Derive personas from a customer attribute file (CSV with header, or JSON Lines).
+
+The file is streamed in chunks, so memory use does not depend on its size.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import PersonaModel
+from api.personas import chunked, iter_records
+
+
+class Command(BaseCommand):
+    help = 'Fit (or incrementally update) a persona model from customer records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or .jsonl file of customer records')
+        parser.add_argument('--k', type=int, default=4, help='Number of personas for a new model')
+        parser.add_argument('--name', default='Derived personas', help='Name of a new model')
+        parser.add_argument('--model-id', type=int, help='Update this existing model instead of creating one')
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if options['model_id']:
+            try:
+                model = PersonaModel.objects.get(pk=options['model_id'])
+            except PersonaModel.DoesNotExist:
+                raise CommandError(f'Persona model {options["model_id"]} does not exist')
+        else:
+            model = PersonaModel(name=options['name'], k=options['k'])
+        deriver = model.get_deriver()
+
+        started = time.perf_counter()
+        try:
+            for chunk in chunked(iter_records(options['path']), options['chunk_size']):
+                deriver.partial_fit(chunk)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        model.save_deriver(deriver)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Persona model {model.pk} fitted on {model.n_samples} records '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
+        for persona in deriver.personas():
+            self.stdout.write(
+                f'  {persona["percentage"]:>5}%  {persona["name"]} '
+                f'(age {persona["age"]}, income {persona["income"]:.0f})'
+            )
@@ -0,0 +1,75 @@
+"""
+Ingest captured competitor pages or JSON feeds from local files into the
+snapshot store.
+"""
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api import snapshots
+from api.models import Competitor
+
+
+class Command(BaseCommand):
+    help = 'Ingest competitor captures (HTML/text pages or JSON feeds) from files or directories'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Capture files, or directories of captures')
+        parser.add_argument('--user', required=True, help='Email of the user who owns the competitor')
+        parser.add_argument('--competitor', required=True, help='Competitor name (created if missing)')
+        parser.add_argument('--source', default='main', help='Which page or feed these captures are of')
+        parser.add_argument('--type', choices=[snapshots.TYPE_PAGE, snapshots.TYPE_JSON],
+                            help='Content type (defaults to json for *.json files, page otherwise)')
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(email=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['user']}")
+        competitor, _ = Competitor.objects.get_or_create(owner=owner, name=options['competitor'])
+
+        # Captures are ingested oldest first, using file modification time as capture time
+        files = []
+        for path in map(Path, options['paths']):
+            if path.is_dir():
+                files.extend(child for child in path.iterdir() if child.is_file())
+            elif path.is_file():
+                files.append(path)
+            else:
+                raise CommandError(f'{path} does not exist')
+        files.sort(key=lambda path: (path.stat().st_mtime, path.name))
+
+        previous = None
+        created = 0
+        for path in files:
+            content_type = options['type'] or (
+                snapshots.TYPE_JSON if path.suffix.lower() == '.json' else snapshots.TYPE_PAGE
+            )
+            captured_at = datetime.fromtimestamp(path.stat().st_mtime, tz=dt_timezone.utc)
+            try:
+                previous, is_new = snapshots.ingest(
+                    competitor, path.read_bytes(), content_type, captured_at,
+                    source=options['source'], previous=previous
+                )
+            except ValueError as e:
+                raise CommandError(f'{path}: {e}')
+            created += is_new
+            if is_new and previous.previous_id and not (
+                previous.lines_added or previous.lines_removed or previous.fields_changed
+            ):
+                self.stdout.write(f'{path.name}: changed (markup only)')
+            elif is_new and previous.previous_id:
+                self.stdout.write(
+                    f'{path.name}: changed (+{previous.lines_added}/-{previous.lines_removed} lines, '
+                    f'{previous.fields_changed} fields)'
+                )
+            elif is_new:
+                self.stdout.write(f'{path.name}: first version')
+            else:
+                self.stdout.write(f'{path.name}: unchanged')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Ingested {len(files)} captures of {competitor.name}/{options["source"]}: {created} new versions'
+        ))
@@ -0,0 +1,34 @@
+"""
+Consume change events and keep every user's materialized briefing up to date.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.briefings import materialize_batch
+
+
+class Command(BaseCommand):
+    help = 'Fold new change events into the materialized PM daily briefings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to sleep when there are no new events')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once all pending events are consumed')
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                consumed = materialize_batch(options['batch_size'])
+                total += consumed
+                if consumed:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Consumed {total} change events'))
@@ -0,0 +1,19 @@
+"""
+Drop authentication audit events older than the retention period.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import audit
+
+
+class Command(BaseCommand):
+    help = 'Delete audit log days older than AUDIT_RETENTION_DAYS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.AUDIT_RETENTION_DAYS,
+                            help='Number of days of audit events to keep')
+
+    def handle(self, *args, **options):
+        removed = audit.prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} audit events older than {options["days"]} days'))
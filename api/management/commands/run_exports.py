@@ -0,0 +1,36 @@
+"""
+Run the export worker: lease queued export jobs and write their files, resuming
+jobs whose previous worker died from their last checkpoint.
+"""
+import signal
+
+from django.core.management.base import BaseCommand
+
+from api.exports import ExportWorker
+
+
+class Command(BaseCommand):
+    help = 'Run a worker that writes queued dataset exports to files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait between polls when no export is queued')
+        parser.add_argument('--batch-size', type=int,
+                            help='Rows written per checkpoint (defaults to EXPORT_JOB_BATCH_SIZE)')
+        parser.add_argument('--worker-id', help='Identifier recorded on leased jobs (defaults to host:pid)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no exports are left instead of polling forever')
+
+    def handle(self, *args, **options):
+        worker = ExportWorker(
+            worker_id=options['worker_id'],
+            poll_interval=options['poll_interval'],
+            batch_size=options['batch_size']
+        )
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *args: worker.stop())
+        self.stdout.write(f'Export worker {worker.worker_id} started')
+        worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Export worker stopped after {worker.processed} exports ({worker.failed} failed)'
+        ))
@@ -0,0 +1,44 @@
+"""
+Run the workflow worker: lease queued jobs, execute them and record run history.
+"""
+import asyncio
+import signal
+
+from django.core.management.base import BaseCommand
+
+from api.workflows import WorkflowWorker
+
+
+class Command(BaseCommand):
+    help = 'Run a worker that executes queued and scheduled workflows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=10,
+                            help='Maximum number of jobs running at once in this worker')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--worker-id', help='Identifier recorded on leased jobs (defaults to host:pid)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no due jobs are left instead of polling forever')
+
+    def handle(self, *args, **options):
+        worker = WorkflowWorker(
+            worker_id=options['worker_id'],
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval']
+        )
+        self.stdout.write(f'Worker {worker.worker_id} started (concurrency {worker.concurrency})')
+        asyncio.run(self.run_worker(worker, options['once']))
+        self.stdout.write(self.style.SUCCESS(
+            f'Worker stopped after {worker.processed} jobs ({worker.failed} failed permanently)'
+        ))
+
+    async def run_worker(self, worker, once):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, worker.stop)
+            except (NotImplementedError, RuntimeError):
+                # Signal handlers are not available on Windows event loops
+                pass
+        await worker.run(once=once)
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 22:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_passwordresettoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Idea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('source', models.CharField(blank=True, max_length=100)),
+                ('author', models.CharField(blank=True, max_length=255)),
+                ('impact', models.CharField(blank=True, max_length=50)),
+                ('effort', models.CharField(blank=True, max_length=50)),
+                ('signature', models.BinaryField(default=bytes)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ideas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='IdeaBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField(db_index=True)),
+                ('idea', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='api.idea')),
+            ],
+        ),
+    ]
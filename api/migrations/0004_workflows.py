@@ -0,0 +1,107 @@
+# Generated by Django 5.2.8 on 2026-10-18 22:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_idea_ideabucket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Workflow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('trigger', models.CharField(blank=True, max_length=255)),
+                ('schedule', models.CharField(blank=True, max_length=100)),
+                ('next_run_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('steps', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('paused', 'Paused')], default='active', max_length=20)),
+                ('runs', models.PositiveIntegerField(default=0)),
+                ('max_concurrency', models.PositiveSmallIntegerField(default=1)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='workflows', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkflowJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('leased', 'Leased'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3)),
+                ('leased_by', models.CharField(blank=True, max_length=100)),
+                ('lease_token', models.CharField(blank=True, max_length=32)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('workflow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='api.workflow')),
+            ],
+            options={
+                'ordering': ['run_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkflowRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt', models.PositiveSmallIntegerField(default=1)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='run_history', to='api.workflowjob')),
+                ('workflow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='run_history', to='api.workflow')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkflowStepRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('action', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], max_length=20)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('output', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='steps', to='api.workflowrun')),
+            ],
+            options={
+                'ordering': ['run', 'position'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='workflowjob',
+            index=models.Index(fields=['status', 'run_at'], name='api_workflo_status_0d6675_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workflowjob',
+            index=models.Index(fields=['status', 'lease_expires_at'], name='api_workflo_status_edf4c3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workflowrun',
+            index=models.Index(fields=['workflow', '-started_at'], name='api_workflo_workflo_ec1011_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_personamodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StreamMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=50)),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
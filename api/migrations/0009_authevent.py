@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_exportjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(choices=[('signup', 'Signup'), ('login_succeeded', 'Login succeeded'), ('login_failed', 'Login failed'), ('logout', 'Logout'), ('password_reset_requested', 'Password reset requested'), ('password_reset', 'Password reset')], max_length=30)),
+                ('email', models.CharField(blank=True, max_length=254)),
+                ('ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('day', models.DateField()),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'created_at'], name='api_autheve_user_id_a4efc6_idx'), models.Index(fields=['ip', 'created_at'], name='api_autheve_ip_c16d95_idx'), models.Index(fields=['created_at'], name='api_autheve_created_d6451a_idx'), models.Index(fields=['day'], name='api_autheve_day_0b5292_idx')],
+            },
+        ),
+    ]
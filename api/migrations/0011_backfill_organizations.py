@@ -0,0 +1,76 @@
+"""
+Backfill UserProfile.organization from the organizationName and industry
+values onboarding stored in UserProfile.preferences.
+
+Profiles are processed in primary key batches, each in its own transaction,
+so the migration never holds a long write lock or loads every profile at once.
+"""
+from django.db import migrations, transaction
+
+BATCH_SIZE = 2000
+
+
+def organization_key(name):
+    return ' '.join((name or '').split()).casefold()[:255]
+
+
+def backfill(apps, schema_editor):
+    UserProfile = apps.get_model('api', 'UserProfile')
+    Organization = apps.get_model('api', 'Organization')
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} = %s WHERE {} = %s'.format(
+        quote(UserProfile._meta.db_table), quote('organization_id'), quote('id')
+    )
+    last_id = 0
+    while True:
+        rows = list(
+            UserProfile.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'organization_id', 'preferences')[:BATCH_SIZE]
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+
+        # profile id -> org key, and key -> (display name, industry) for new orgs
+        members = {}
+        candidates = {}
+        for profile_id, organization_id, preferences in rows:
+            if organization_id is not None or not isinstance(preferences, dict):
+                continue
+            name = ' '.join(str(preferences.get('organizationName') or '').split())
+            if not name:
+                continue
+            key = organization_key(name)
+            members[profile_id] = key
+            industry = str(preferences.get('industry') or '')[:100]
+            # Keep the first spelling seen, and the first non-empty industry
+            first_name, first_industry = candidates.get(key, (name[:255], ''))
+            candidates[key] = (first_name, first_industry or industry)
+        if not members:
+            continue
+
+        with transaction.atomic(using=connection.alias):
+            Organization.objects.bulk_create([
+                Organization(name=name, key=key, industry=industry)
+                for key, (name, industry) in candidates.items()
+            ], ignore_conflicts=True)
+            ids = dict(Organization.objects.filter(key__in=candidates).values_list('key', 'id'))
+            # A plain executemany: bulk_update() builds a CASE expression per
+            # row, which dominates the run time on large tables
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, [(ids[key], profile_id) for profile_id, key in members.items()])
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('api', '0010_organization'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
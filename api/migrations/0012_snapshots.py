@@ -0,0 +1,85 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_backfill_organizations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('content_type', models.CharField(max_length=10)),
+                ('size', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Competitor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='competitors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Snapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(default='main', max_length=100)),
+                ('captured_at', models.DateTimeField()),
+                ('last_seen_at', models.DateTimeField()),
+                ('captures', models.PositiveIntegerField(default=1)),
+                ('lines_added', models.PositiveIntegerField(default=0)),
+                ('lines_removed', models.PositiveIntegerField(default=0)),
+                ('fields_changed', models.PositiveIntegerField(default=0)),
+                ('summary', models.JSONField(blank=True, default=list)),
+                ('competitor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='api.competitor')),
+                ('previous', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.snapshot')),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='snapshots', to='api.snapshotblob')),
+            ],
+            options={
+                'ordering': ['-captured_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotDiff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('new_blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.snapshotblob')),
+                ('old_blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.snapshotblob')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='competitor',
+            constraint=models.UniqueConstraint(fields=('owner', 'name'), name='unique_competitor_per_owner'),
+        ),
+        migrations.AddIndex(
+            model_name='snapshot',
+            index=models.Index(fields=['competitor', 'source', '-captured_at'], name='api_snapsho_competi_459bc7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='snapshot',
+            index=models.Index(fields=['competitor', '-captured_at'], name='api_snapsho_competi_088467_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='snapshotdiff',
+            constraint=models.UniqueConstraint(fields=('old_blob', 'new_blob'), name='unique_snapshot_diff'),
+        ),
+    ]
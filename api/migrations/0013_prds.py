@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_snapshots'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PRD',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('document', models.JSONField(default=dict)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('keyframe_version', models.PositiveIntegerField(default=0)),
+                ('keyframe_size', models.PositiveIntegerField(default=0)),
+                ('chain_size', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prds', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PRDRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('keyframe_version', models.PositiveIntegerField()),
+                ('is_keyframe', models.BooleanField(default=False)),
+                ('data', models.BinaryField()),
+                ('sections', models.JSONField(blank=True, default=list)),
+                ('autosave', models.BooleanField(default=False)),
+                ('saves', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('saved_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('author', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('prd', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='api.prd')),
+            ],
+            options={
+                'ordering': ['-version'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='prd',
+            index=models.Index(fields=['owner', '-updated_at'], name='api_prd_owner_i_db3657_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='prdrevision',
+            constraint=models.UniqueConstraint(fields=('prd', 'version'), name='unique_prd_revision'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_organization_join_requests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materializercursor',
+            name='gap_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_materializer_gaps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materializercursor',
+            name='caught_up_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
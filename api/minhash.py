@@ -0,0 +1,124 @@
+"""
+MinHash signatures and LSH banding used for near-duplicate detection.
+
+A signature is NUM_PERM 32-bit minimum hashes over the character shingles of
+a text. Signatures are split into BANDS bands of ROWS rows each; two texts
+land in the same bucket for a band when all rows of that band agree, which
+happens with high probability only when their Jaccard similarity is high.
+"""
+import hashlib
+import random
+import re
+import zlib
+from array import array
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+# Permutation coefficients are fixed so that stored signatures stay comparable
+# across processes and deployments.
+_rng = random.Random(0x1DEA)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+
+def normalize(text):
+    """Lowercase and collapse punctuation/whitespace into single spaces"""
+    return _NON_WORD.sub(' ', (text or '').lower()).strip()
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Return the set of hashed character shingles for a text"""
+    normalized = normalize(text)
+    if not normalized:
+        return set()
+    if len(normalized) <= size:
+        return {zlib.crc32(normalized.encode())}
+    return {
+        zlib.crc32(normalized[i:i + size].encode())
+        for i in range(len(normalized) - size + 1)
+    }
+
+
+def signature(text):
+    """Compute the MinHash signature of a text as an array of uint32"""
+    hashes = shingles(text)
+    sig = array('I', [_MAX_HASH]) * NUM_PERM
+    if not hashes:
+        return sig
+    for i, (a, b) in enumerate(_PERMUTATIONS):
+        sig[i] = min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+    return sig
+
+
+def to_bytes(sig):
+    return sig.tobytes()
+
+
+def from_bytes(data):
+    sig = array('I')
+    sig.frombytes(bytes(data))
+    return sig
+
+
+def similarity(sig_a, sig_b):
+    """Estimate Jaccard similarity from two signatures"""
+    matches = sum(1 for x, y in zip(sig_a, sig_b) if x == y)
+    return matches / NUM_PERM
+
+
+def band_key(sig, band):
+    """
+    Return the signed 64-bit bucket key of one band.
+
+    The band number is mixed into the hash so all bands can share a single
+    indexed column.
+    """
+    digest = hashlib.blake2b(
+        sig[band * ROWS:(band + 1) * ROWS].tobytes(),
+        digest_size=8,
+        salt=band.to_bytes(2, 'little'),
+    ).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def band_keys(sig):
+    """Return one bucket key per band"""
+    return [band_key(sig, band) for band in range(BANDS)]
+
+
+class UnionFind:
+    """Disjoint-set forest with path halving, keyed by arbitrary ids"""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent
+        parent.setdefault(item, item)
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # Keep the oldest (smallest) id as the cluster representative
+            if root_b < root_a:
+                root_a, root_b = root_b, root_a
+            self.parent[root_b] = root_a
+
+    def groups(self):
+        clusters = {}
+        for item in self.parent:
+            clusters.setdefault(self.find(item), []).append(item)
+        return clusters
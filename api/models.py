@@ -1,13 +1,102 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
+from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 import secrets
 import json
 
+from . import minhash
+
+def organization_key(name):
+    """Case- and whitespace-insensitive lookup key for an organization name"""
+    return ' '.join((name or '').split()).casefold()[:255]
+
+
+class Organization(models.Model):
+    """
+    A company or team that users belong to, resolved by normalized name.
+    Whoever creates it owns it; other users join only through an approved
+    OrganizationJoinRequest.
+    """
+    name = models.CharField(max_length=255)
+    key = models.CharField(max_length=255, unique=True)
+    industry = models.CharField(max_length=100, blank=True, db_index=True)
+    # Approves join requests; null for organizations created by the backfill
+    owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name='owned_organizations')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+    
+    @classmethod
+    def resolve(cls, name, industry='', owner=None):
+        """
+        Get the organization for a name, creating it (owned by owner) only if
+        the name is new. Returns (organization, created), or (None, False) for
+        a blank name. An existing organization's industry is left unchanged.
+        """
+        name = ' '.join((name or '').split())[:255]
+        if not name:
+            return None, False
+        key = organization_key(name)
+        org = cls.objects.filter(key=key).first()
+        if org is not None:
+            return org, False
+        try:
+            with transaction.atomic():
+                return cls.objects.create(name=name, key=key, industry=(industry or '')[:100], owner=owner), True
+        except IntegrityError:
+            # Created concurrently under the same name
+            return cls.objects.get(key=key), False
+    
+    def can_manage(self, user):
+        return user.is_staff or (self.owner_id is not None and self.owner_id == user.id)
+
+
+class OrganizationJoinRequest(models.Model):
+    """A user's request to join an existing organization, decided by its owner"""
+    STATUS_PENDING = 'pending'
+    STATUS_APPROVED = 'approved'
+    STATUS_DECLINED = 'declined'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_APPROVED, 'Approved'),
+        (STATUS_DECLINED, 'Declined'),
+    ]
+    
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='join_requests')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='organization_join_requests')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    decided_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    decided_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'user'], name='unique_organization_join_request'),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} -> {self.organization_id} ({self.status})"
+
+
 class UserProfile(models.Model):
     """Extended user profile to store preferences and settings"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
+    # Indexed together with user below, so member lists are index range scans
+    organization = models.ForeignKey(Organization, on_delete=models.SET_NULL, null=True, blank=True,
+                                     db_index=False, related_name='members')
     
     # User preferences stored as JSON
     preferences = models.JSONField(default=dict, blank=True)
@@ -20,6 +109,11 @@ class UserProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'user']),
+        ]
+    
     def __str__(self):
         return f"{self.user.username}'s Profile"
     
@@ -92,3 +186,609 @@ class PasswordResetToken(models.Model):
         """Mark this token as used"""
         self.used = True
         self.save()
+
+
+class Idea(models.Model):
+    """A product idea submitted to the idea repository"""
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    source = models.CharField(max_length=100, blank=True)
+    author = models.CharField(max_length=255, blank=True)
+    impact = models.CharField(max_length=50, blank=True)
+    effort = models.CharField(max_length=50, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='ideas')
+    
+    # MinHash signature of title + description (NUM_PERM packed uint32 values)
+    signature = models.BinaryField(editable=False, default=bytes)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return self.title
+    
+    @property
+    def text(self):
+        return f"{self.title} {self.description}"
+    
+    @classmethod
+    def visible_to(cls, user):
+        """Ideas of the user's organization, or only their own when they have none"""
+        organization_id = UserProfile.objects.filter(user=user).values_list('organization_id', flat=True).first()
+        if organization_id is None:
+            return cls.objects.filter(created_by=user)
+        return cls.objects.filter(created_by__profile__organization_id=organization_id)
+    
+    def index(self):
+        """Compute the signature and (re)write this idea's LSH buckets"""
+        sig = minhash.signature(self.text)
+        self.signature = minhash.to_bytes(sig)
+        Idea.objects.filter(pk=self.pk).update(signature=self.signature)
+        IdeaBucket.objects.filter(idea=self).delete()
+        IdeaBucket.objects.bulk_create([
+            IdeaBucket(idea=self, key=key) for key in minhash.band_keys(sig)
+        ])
+        return sig
+    
+    @classmethod
+    def find_similar(cls, sig, threshold=None, limit=10, exclude_id=None, ideas=None):
+        """
+        Return (idea, similarity) pairs whose estimated similarity to the
+        signature is at least threshold, most similar first. ideas limits the
+        candidates, e.g. to Idea.visible_to(user).
+        
+        Only ideas sharing at least one LSH bucket are loaded, so the cost
+        depends on the number of candidates rather than the repository size.
+        """
+        if threshold is None:
+            threshold = settings.IDEA_DUPLICATE_THRESHOLD
+        candidate_ids = IdeaBucket.objects.filter(
+            key__in=minhash.band_keys(sig)
+        ).values_list('idea_id', flat=True).distinct()
+        candidates = (cls.objects.all() if ideas is None else ideas).filter(pk__in=candidate_ids)
+        if exclude_id is not None:
+            candidates = candidates.exclude(pk=exclude_id)
+        
+        matches = []
+        for idea in candidates:
+            score = minhash.similarity(sig, minhash.from_bytes(idea.signature))
+            if score >= threshold:
+                matches.append((idea, score))
+        matches.sort(key=lambda match: (-match[1], match[0].pk))
+        return matches[:limit]
+    
+    def find_duplicates(self, threshold=None, limit=10, ideas=None):
+        """Return likely duplicates of this idea, among ideas if given"""
+        sig = minhash.from_bytes(self.signature)
+        return Idea.find_similar(sig, threshold=threshold, limit=limit, exclude_id=self.pk, ideas=ideas)
+
+
+class IdeaBucket(models.Model):
+    """LSH band bucket membership for an idea (one row per band)"""
+    idea = models.ForeignKey(Idea, on_delete=models.CASCADE, related_name='buckets')
+    key = models.BigIntegerField(db_index=True)
+    
+    def __str__(self):
+        return f"Bucket {self.key} for idea {self.idea_id}"
+
+
+class Workflow(models.Model):
+    """An automation made of ordered steps, run manually or on a cron schedule"""
+    STATUS_ACTIVE = 'active'
+    STATUS_PAUSED = 'paused'
+    STATUS_CHOICES = [
+        (STATUS_ACTIVE, 'Active'),
+        (STATUS_PAUSED, 'Paused'),
+    ]
+    
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='workflows')
+    name = models.CharField(max_length=255)
+    trigger = models.CharField(max_length=255, blank=True)
+    
+    # Five-field cron expression ("*/15 * * * *"); blank for manual-only workflows
+    schedule = models.CharField(max_length=100, blank=True)
+    next_run_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    
+    # List of {"name": ..., "action": ..., "params": {...}} dicts, run in order
+    steps = models.JSONField(default=list, blank=True)
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
+    runs = models.PositiveIntegerField(default=0)
+    max_concurrency = models.PositiveSmallIntegerField(default=1)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return self.name
+    
+    def enqueue(self, run_at=None):
+        """Queue a job that will execute this workflow"""
+        return WorkflowJob.objects.create(
+            workflow=self,
+            run_at=run_at or timezone.now(),
+            max_attempts=self.max_attempts
+        )
+
+
+class WorkflowJob(models.Model):
+    """A queued execution of a workflow, leased by one worker at a time"""
+    STATUS_QUEUED = 'queued'
+    STATUS_LEASED = 'leased'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_LEASED, 'Leased'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    workflow = models.ForeignKey(Workflow, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    
+    # Lease bookkeeping; a lease past its expiry may be taken over by another worker
+    leased_by = models.CharField(max_length=100, blank=True)
+    lease_token = models.CharField(max_length=32, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+            models.Index(fields=['status', 'lease_expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"Job {self.id} for {self.workflow_id} ({self.status})"
+
+
+class WorkflowRun(models.Model):
+    """One attempt at executing a workflow"""
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    workflow = models.ForeignKey(Workflow, on_delete=models.CASCADE, related_name='run_history')
+    job = models.ForeignKey(WorkflowJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='run_history')
+    attempt = models.PositiveSmallIntegerField(default=1)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    worker = models.CharField(max_length=100, blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['workflow', '-started_at']),
+        ]
+    
+    def __str__(self):
+        return f"Run {self.id} of {self.workflow_id} ({self.status})"
+
+
+class WorkflowStepRun(models.Model):
+    """Timing and outcome of a single step within a workflow run"""
+    run = models.ForeignKey(WorkflowRun, on_delete=models.CASCADE, related_name='steps')
+    position = models.PositiveSmallIntegerField()
+    name = models.CharField(max_length=255)
+    action = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=WorkflowRun.STATUS_CHOICES)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    output = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['run', 'position']
+    
+    def __str__(self):
+        return f"Step {self.position} of run {self.run_id}"
+
+
+class ChangeEvent(models.Model):
+    """
+    A change relevant to a user's daily briefing (an alert, a feedback
+    sentiment signal, ...). Consumed in id order by the briefing materializer.
+    """
+    KIND_ALERT = 'alert'
+    KIND_SENTIMENT = 'sentiment'
+    KIND_CHOICES = [
+        (KIND_ALERT, 'Alert'),
+        (KIND_SENTIMENT, 'Sentiment'),
+    ]
+    SEVERITIES = ['High', 'Medium', 'Low']
+    MAX_MESSAGE_LENGTH = 1000
+    MAX_MENTIONS = 1000000
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='change_events')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    source = models.CharField(max_length=100, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} event for user {self.user_id}"
+    
+    @classmethod
+    def clean_payload(cls, kind, payload):
+        """
+        The payload fields the briefing folds in for this kind of event,
+        validated and coerced; other fields are dropped. Raises ValueError.
+        """
+        if kind not in dict(cls.KIND_CHOICES):
+            raise ValueError(f"Invalid event kind '{kind}'")
+        if not isinstance(payload, dict):
+            raise ValueError('payload must be an object')
+
+        def text(field, default, max_length):
+            value = payload.get(field)
+            if value is None or value == '':
+                return default
+            if not isinstance(value, str):
+                raise ValueError(f'{field} must be a string')
+            return value[:max_length]
+
+        if kind == cls.KIND_ALERT:
+            severity = payload.get('severity') or 'Low'
+            if severity not in cls.SEVERITIES:
+                raise ValueError(f"severity must be one of: {', '.join(cls.SEVERITIES)}")
+            return {
+                'type': text('type', 'info', 50),
+                'severity': severity,
+                'message': text('message', '', cls.MAX_MESSAGE_LENGTH),
+            }
+
+        try:
+            score = float(payload.get('score', 0))
+        except (TypeError, ValueError):
+            raise ValueError('score must be a number')
+        if not -1 <= score <= 1:
+            raise ValueError('score must be between -1 and 1')
+        mentions = payload.get('mentions', 1)
+        if isinstance(mentions, bool) or not isinstance(mentions, (int, float)):
+            raise ValueError('mentions must be an integer')
+        if not 1 <= mentions <= cls.MAX_MENTIONS or mentions != int(mentions):
+            raise ValueError(f'mentions must be an integer between 1 and {cls.MAX_MENTIONS}')
+        return {'topic': text('topic', 'General', 100), 'score': score, 'mentions': int(mentions)}
+
+    @classmethod
+    def record(cls, user, kind, source='', **payload):
+        """Record a change event for a user's briefing; raises ValueError on an invalid payload"""
+        if not isinstance(source, str):
+            raise ValueError('source must be a string')
+        payload = cls.clean_payload(kind, payload)
+        return cls.objects.create(user=user, kind=kind, source=source[:100], payload=payload)
+
+
+class Briefing(models.Model):
+    """Materialized daily briefing document, kept up to date from ChangeEvents"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='briefing')
+    document = models.JSONField(default=dict)
+    
+    # Id of the newest ChangeEvent folded into the document
+    last_event_id = models.BigIntegerField(default=0)
+    # Incremented on every write; used for optimistic concurrency
+    version = models.PositiveIntegerField(default=0)
+    # Every event for the user created before this time is in the document
+    refreshed_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.user.username}'s Briefing"
+
+
+class MaterializerCursor(models.Model):
+    """Position of a background consumer in an append-only event table"""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    # When the id after position was first found missing, if it still is
+    gap_seen_at = models.DateTimeField(null=True, blank=True)
+    # Every event created before this time has been consumed
+    caught_up_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class PersonaModel(models.Model):
+    """Persona clustering fitted from customer attribute records"""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='persona_models')
+    name = models.CharField(max_length=255)
+    k = models.PositiveSmallIntegerField(default=4)
+    
+    # Serialized PersonaDeriver (encoder vocabularies/scaling and centroids)
+    state = models.JSONField(default=dict, blank=True)
+    n_samples = models.PositiveBigIntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-updated_at']
+    
+    def __str__(self):
+        return self.name
+    
+    def get_deriver(self):
+        from .personas import PersonaDeriver
+        if not self.state:
+            return PersonaDeriver(k=self.k)
+        return PersonaDeriver.from_state(self.state)
+    
+    def save_deriver(self, deriver):
+        self.state = deriver.to_state()
+        self.n_samples = deriver.n_samples
+        self.save()
+
+
+class StreamMessage(models.Model):
+    """Short-lived relay row used by the database stream backend"""
+    topic = models.CharField(max_length=50)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    def __str__(self):
+        return f"{self.topic} message {self.id}"
+
+
+class ExportJob(models.Model):
+    """
+    A dataset export written to a file in keyset-ordered batches. Progress is
+    checkpointed after every batch so an interrupted job resumes where it
+    stopped instead of starting over.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    dataset = models.CharField(max_length=50)
+    file_format = models.CharField(max_length=10, default='csv')
+    compress = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    
+    # Checkpoint: primary key of the last exported row and the file size after it
+    last_row_id = models.BigIntegerField(default=0)
+    rows_written = models.BigIntegerField(default=0)
+    bytes_written = models.BigIntegerField(default=0)
+    
+    # Lease bookkeeping; a lease past its expiry may be taken over by another worker
+    leased_by = models.CharField(max_length=100, blank=True)
+    lease_token = models.CharField(max_length=32, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'lease_expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"Export {self.id} of {self.dataset} ({self.status})"
+    
+    @property
+    def file_name(self):
+        extension = self.file_format + ('.gz' if self.compress else '')
+        return f"{self.dataset}-{self.id}.{extension}"
+
+
+class AuthEvent(models.Model):
+    """
+    Audit record of an authentication event. Written in batches by the
+    write-behind buffer in api/audit.py, never inline with the request.
+    """
+    SIGNUP = 'signup'
+    LOGIN_SUCCEEDED = 'login_succeeded'
+    LOGIN_FAILED = 'login_failed'
+    LOGOUT = 'logout'
+    PASSWORD_RESET_REQUESTED = 'password_reset_requested'
+    PASSWORD_RESET = 'password_reset'
+    EVENT_CHOICES = [
+        (SIGNUP, 'Signup'),
+        (LOGIN_SUCCEEDED, 'Login succeeded'),
+        (LOGIN_FAILED, 'Login failed'),
+        (LOGOUT, 'Logout'),
+        (PASSWORD_RESET_REQUESTED, 'Password reset requested'),
+        (PASSWORD_RESET, 'Password reset'),
+    ]
+    
+    event = models.CharField(max_length=30, choices=EVENT_CHOICES)
+    # No FK constraint: the audit trail must outlive deleted accounts, and
+    # batched inserts should not pay for constraint checks
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False,
+                             null=True, blank=True, related_name='+')
+    # Identifier that was attempted, e.g. the email of a failed login
+    email = models.CharField(max_length=254, blank=True)
+    ip = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Partition key: retention drops whole days at a time
+    day = models.DateField()
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['ip', 'created_at']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event} ({self.email or self.user_id}) at {self.created_at}"
+
+
+class Competitor(models.Model):
+    """A competitor whose pages or feeds are captured as snapshots"""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='competitors')
+    name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'name'], name='unique_competitor_per_owner'),
+        ]
+    
+    def __str__(self):
+        return self.name
+
+
+class SnapshotBlob(models.Model):
+    """Compressed capture content, stored once per distinct SHA-256 digest"""
+    digest = models.CharField(max_length=64, unique=True)
+    content_type = models.CharField(max_length=10)
+    size = models.PositiveIntegerField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.digest[:12]
+
+
+class Snapshot(models.Model):
+    """
+    One distinct version of a competitor source (e.g. its pricing page).
+    Captures identical to the latest version only extend last_seen_at, and
+    the change summary is stored here so timelines never need the blobs.
+    """
+    competitor = models.ForeignKey(Competitor, on_delete=models.CASCADE, related_name='snapshots')
+    source = models.CharField(max_length=100, default='main')
+    blob = models.ForeignKey(SnapshotBlob, on_delete=models.PROTECT, related_name='snapshots')
+    previous = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    captured_at = models.DateTimeField()
+    last_seen_at = models.DateTimeField()
+    captures = models.PositiveIntegerField(default=1)
+    
+    # Change summary against the previous version
+    lines_added = models.PositiveIntegerField(default=0)
+    lines_removed = models.PositiveIntegerField(default=0)
+    fields_changed = models.PositiveIntegerField(default=0)
+    summary = models.JSONField(default=list, blank=True)
+    
+    class Meta:
+        ordering = ['-captured_at']
+        indexes = [
+            models.Index(fields=['competitor', 'source', '-captured_at']),
+            models.Index(fields=['competitor', '-captured_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.competitor_id}/{self.source} at {self.captured_at}"
+
+
+class SnapshotDiff(models.Model):
+    """Cached compressed diff between two blobs"""
+    old_blob = models.ForeignKey(SnapshotBlob, on_delete=models.CASCADE, related_name='+')
+    new_blob = models.ForeignKey(SnapshotBlob, on_delete=models.CASCADE, related_name='+')
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['old_blob', 'new_blob'], name='unique_snapshot_diff'),
+        ]
+    
+    def __str__(self):
+        return f"Diff {self.old_blob_id} -> {self.new_blob_id}"
+
+
+class PRD(models.Model):
+    """
+    Product requirements document from the PRD builder. The latest version is
+    stored inline; earlier ones are rebuilt from PRDRevision (see api/prds.py).
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='prds')
+    title = models.CharField(max_length=255)
+    # Sections keyed by name
+    document = models.JSONField(default=dict)
+    version = models.PositiveIntegerField(default=0)
+    
+    # Latest keyframe, and bytes of deltas stored after it; a new keyframe is
+    # written once those outweigh it
+    keyframe_version = models.PositiveIntegerField(default=0)
+    keyframe_size = models.PositiveIntegerField(default=0)
+    chain_size = models.PositiveIntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['owner', '-updated_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} (v{self.version})"
+
+
+class PRDRevision(models.Model):
+    """
+    One saved version of a PRD: a compressed keyframe of the full document,
+    or a delta of the sections changed since the previous version
+    """
+    prd = models.ForeignKey(PRD, on_delete=models.CASCADE, related_name='revisions')
+    version = models.PositiveIntegerField()
+    # Version of the keyframe this revision is rebuilt from
+    keyframe_version = models.PositiveIntegerField()
+    is_keyframe = models.BooleanField(default=False)
+    data = models.BinaryField()
+    # Names of the sections changed by this revision
+    sections = models.JSONField(default=list, blank=True)
+    author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    autosave = models.BooleanField(default=False)
+    # Autosaves folded into this revision
+    saves = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(default=timezone.now)
+    saved_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-version']
+        constraints = [
+            models.UniqueConstraint(fields=['prd', 'version'], name='unique_prd_revision'),
+        ]
+    
+    def __str__(self):
+        return f"{self.prd_id} v{self.version}{' (keyframe)' if self.is_keyframe else ''}"
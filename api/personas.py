@@ -0,0 +1,408 @@
+"""
+Persona derivation with streaming mini-batch k-means.
+
+Customer records are encoded into sparse feature rows: one one-hot slot per
+categorical field plus one standardized value per numeric field, so every row
+has exactly len(CATEGORICAL_FIELDS) + len(NUMERIC_FIELDS) non-zero entries.
+Chunks of rows are stored in flat typed arrays and clustered with mini-batch
+k-means (Sculley, 2010). With a per-centre learning rate of 1/count each
+centroid is the running mean of the points assigned to it, so its categorical
+slots read directly as category shares and its numeric slots as averages.
+"""
+import csv
+import json
+import math
+import random
+import re
+from array import array
+from itertools import islice
+from operator import mul
+
+CATEGORICAL_FIELDS = ('occupation', 'location', 'channel', 'communication')
+NUMERIC_FIELDS = ('age', 'income')
+# Numeric fields spanning orders of magnitude are compared on a log scale
+LOG_SCALED_FIELDS = ('income',)
+
+# One-hot slots per categorical field; categories seen after the field is full
+# share the last slot
+MAX_CATEGORIES = 32
+OTHER = 'Other'
+# Two rows differing in one categorical field are as far apart as rows one
+# standard deviation apart on a numeric field
+CATEGORICAL_WEIGHT = 1 / math.sqrt(2)
+
+NNZ = len(CATEGORICAL_FIELDS) + len(NUMERIC_FIELDS)
+DIMS = len(CATEGORICAL_FIELDS) * MAX_CATEGORIES + len(NUMERIC_FIELDS)
+
+
+MULTIPLIERS = {'': 1, 'K': 1000, 'M': 1000000}
+# An amount or a range of amounts ('65K', '65K-95K', '35 to 70k'); whatever
+# follows, e.g. '(variable)' or '+', is an annotation and ignored
+AMOUNT = re.compile(
+    r'(\d+(?:\.\d+)?)\s*([KM]?)(?:\s*(?:-|\u2013|to)\s*(\d+(?:\.\d+)?)\s*([KM]?))?',
+    re.IGNORECASE
+)
+
+
+def _to_float(value):
+    """A number from a numeric field; ranges such as '$65K-$95K' give their midpoint"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = value.replace('$', '').replace(',', '').strip()
+        try:
+            number = float(value)
+            return number if math.isfinite(number) else None
+        except ValueError:
+            pass
+        match = AMOUNT.match(value)
+        if match is None:
+            return None
+        low, low_unit, high, high_unit = match.groups()
+        high_unit = (high_unit or '').upper()
+        # '65-95K': a unit given only at the end applies to both ends
+        low_unit = (low_unit or high_unit).upper()
+        low = float(low) * MULTIPLIERS[low_unit]
+        if high is None:
+            return low
+        return (low + float(high) * MULTIPLIERS[high_unit]) / 2
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+class FeatureEncoder:
+    """Maps customer records to fixed-width sparse rows"""
+
+    def __init__(self, vocabularies=None, means=None, stds=None, observed=None):
+        self.vocabularies = vocabularies or {field: [] for field in CATEGORICAL_FIELDS}
+        self._slots = {
+            field: {value: i for i, value in enumerate(values)}
+            for field, values in self.vocabularies.items()
+        }
+        self.means = means
+        self.stds = stds
+        # Whether each numeric field had any values when the encoder was fitted
+        self.observed = observed or [True] * len(NUMERIC_FIELDS)
+
+    @property
+    def fitted(self):
+        return self.means is not None
+
+    def _numeric(self, field, record):
+        value = _to_float(record.get(field))
+        if value is None:
+            return None
+        if field in LOG_SCALED_FIELDS:
+            value = math.log1p(max(value, 0))
+        return value
+
+    def fit(self, records):
+        """Freeze numeric standardization from a sample of records"""
+        means, stds, observed = [], [], []
+        for field in NUMERIC_FIELDS:
+            values = [v for v in (self._numeric(field, record) for record in records) if v is not None]
+            mean = sum(values) / len(values) if values else 0.0
+            variance = sum((v - mean) ** 2 for v in values) / len(values) if values else 0.0
+            means.append(mean)
+            stds.append(math.sqrt(variance) or 1.0)
+            observed.append(bool(values))
+        self.means, self.stds, self.observed = means, stds, observed
+
+    def _slot(self, field, record):
+        value = str(record.get(field) or '').strip() or OTHER
+        slots = self._slots[field]
+        slot = slots.get(value)
+        if slot is None:
+            vocabulary = self.vocabularies[field]
+            if len(vocabulary) < MAX_CATEGORIES - 1 or value == OTHER:
+                slot = len(vocabulary)
+                vocabulary.append(value)
+                slots[value] = slot
+            else:
+                slot = slots.get(OTHER)
+                if slot is None:
+                    slot = len(vocabulary)
+                    vocabulary.append(OTHER)
+                    slots[OTHER] = slot
+        return slot
+
+    def encode(self, records):
+        """
+        Encode records into a chunk: (indexes, values) flat arrays with NNZ
+        entries per row.
+        """
+        indexes = array('H')
+        values = array('d')
+        for record in records:
+            for f, field in enumerate(CATEGORICAL_FIELDS):
+                indexes.append(f * MAX_CATEGORIES + self._slot(field, record))
+                values.append(CATEGORICAL_WEIGHT)
+            base = len(CATEGORICAL_FIELDS) * MAX_CATEGORIES
+            for n, field in enumerate(NUMERIC_FIELDS):
+                value = self._numeric(field, record)
+                indexes.append(base + n)
+                # Missing values sit at the mean
+                values.append(0.0 if value is None else (value - self.means[n]) / self.stds[n])
+        return indexes, values
+
+    def decode_numeric(self, n, value):
+        """A centroid's numeric slot as a value of the field, or None if the field was never given"""
+        if not self.observed[n]:
+            return None
+        value = value * self.stds[n] + self.means[n]
+        if NUMERIC_FIELDS[n] in LOG_SCALED_FIELDS:
+            value = math.expm1(value)
+        return value
+
+    def to_state(self):
+        return {
+            'vocabularies': self.vocabularies, 'means': self.means, 'stds': self.stds, 'observed': self.observed
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state['vocabularies'], state['means'], state['stds'], state.get('observed'))
+
+
+class MiniBatchKMeans:
+    """
+    Mini-batch k-means over sparse fixed-width rows.
+
+    Each centroid is stored as scale * vector so that the update
+    c <- (1 - eta) * c + eta * x only touches the row's non-zero slots.
+    """
+
+    def __init__(self, k, vectors=None, scales=None, counts=None, norms=None):
+        self.k = k
+        self.vectors = vectors or []
+        self.scales = scales or []
+        self.counts = counts or []
+        self.norms = norms or []
+
+    @property
+    def initialized(self):
+        return len(self.vectors) == self.k
+
+    def _dot(self, c, idx, vals):
+        return self.scales[c] * sum(map(mul, map(self.vectors[c].__getitem__, idx), vals))
+
+    def _nearest(self, idx, vals, row_norm):
+        """Return (centroid, squared distance) of the centroid closest to a row"""
+        best, best_distance = 0, float('inf')
+        norms = self.norms
+        for c in range(len(self.vectors)):
+            distance = row_norm - 2 * self._dot(c, idx, vals) + norms[c]
+            if distance < best_distance:
+                best, best_distance = c, distance
+        return best, max(best_distance, 0.0)
+
+    def _add_centroid(self, idx, vals):
+        vector = array('d', bytes(8 * DIMS))
+        for i, value in zip(idx, vals):
+            vector[i] += value
+        self.vectors.append(vector)
+        self.scales.append(1.0)
+        self.counts.append(0)
+        self.norms.append(sum(map(mul, vals, vals)))
+
+    def initialize(self, chunk, rng):
+        """
+        Pick initial centroids from a chunk with greedy k-means++ seeding:
+        each new centroid is the best of a few distance-weighted candidates.
+        """
+        rows = list(iter_rows(chunk))
+        if len(rows) < self.k:
+            raise ValueError(f'Need at least {self.k} records to derive {self.k} personas')
+        trials = 2 + int(math.log(self.k))
+        self._add_centroid(*rng.choice(rows)[:2])
+        distances = [self._nearest(idx, vals, norm)[1] for idx, vals, norm in rows]
+        while len(self.vectors) < self.k:
+            if sum(distances) == 0:
+                candidates = rng.sample(rows, min(trials, len(rows)))
+            else:
+                candidates = rng.choices(rows, weights=distances, k=trials)
+            best = None
+            for candidate in candidates:
+                probe = MiniBatchKMeans(1)
+                probe._add_centroid(*candidate[:2])
+                candidate_distances = [
+                    min(current, probe._nearest(idx, vals, norm)[1])
+                    for current, (idx, vals, norm) in zip(distances, rows)
+                ]
+                potential = sum(candidate_distances)
+                if best is None or potential < best[0]:
+                    best = (potential, candidate, candidate_distances)
+            self._add_centroid(*best[1][:2])
+            distances = best[2]
+
+    def partial_fit(self, chunk, batch_size=1024):
+        """Update centroids with one pass of mini-batches over a chunk"""
+        batch = []
+        for row in iter_rows(chunk):
+            batch.append(row)
+            if len(batch) == batch_size:
+                self._fit_batch(batch)
+                batch = []
+        if batch:
+            self._fit_batch(batch)
+        # The norms are maintained incrementally; recompute them exactly once
+        # per chunk so rounding errors cannot accumulate
+        for c, vector in enumerate(self.vectors):
+            self.norms[c] = sum(map(mul, vector, vector)) * self.scales[c] ** 2
+
+    def _fit_batch(self, batch):
+        # Assign the whole mini-batch against the centroids as they were at
+        # its start, then apply the per-point gradient steps
+        assignments = [self._nearest(idx, vals, norm)[0] for idx, vals, norm in batch]
+        for (idx, vals, norm), c in zip(batch, assignments):
+            self._update(c, idx, vals, norm)
+
+    def _update(self, c, idx, vals, row_norm):
+        self.counts[c] += 1
+        eta = 1.0 / self.counts[c]
+        vector = self.vectors[c]
+        if eta == 1.0:
+            # First point: the centroid becomes the point itself
+            for i in range(DIMS):
+                vector[i] = 0.0
+            for i, value in zip(idx, vals):
+                vector[i] += value
+            self.scales[c] = 1.0
+            self.norms[c] = row_norm
+            return
+        dot = self._dot(c, idx, vals)
+        self.norms[c] = (
+            (1 - eta) ** 2 * self.norms[c] + 2 * eta * (1 - eta) * dot + eta ** 2 * row_norm
+        )
+        scale = self.scales[c] * (1 - eta)
+        step = eta / scale
+        for i, value in zip(idx, vals):
+            vector[i] += step * value
+        if scale < 1e-6:
+            # Fold the scale back into the vector before it loses precision
+            for i in range(DIMS):
+                vector[i] *= scale
+            scale = 1.0
+        self.scales[c] = scale
+
+    def centroid(self, c):
+        scale = self.scales[c]
+        return [value * scale for value in self.vectors[c]]
+
+    def to_state(self):
+        return {
+            'k': self.k,
+            'centroids': [self.centroid(c) for c in range(len(self.vectors))],
+            'counts': self.counts,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        vectors = [array('d', centroid) for centroid in state['centroids']]
+        norms = [sum(v * v for v in vector) for vector in vectors]
+        return cls(state['k'], vectors, [1.0] * len(vectors), list(state['counts']), norms)
+
+
+class PersonaDeriver:
+    """Encoder + clusterer pair that can be fit incrementally and serialized"""
+
+    def __init__(self, k=4, encoder=None, kmeans=None, seed=0):
+        self.encoder = encoder or FeatureEncoder()
+        self.kmeans = kmeans or MiniBatchKMeans(k)
+        self.rng = random.Random(seed)
+
+    @property
+    def n_samples(self):
+        return sum(self.kmeans.counts)
+
+    def partial_fit(self, records):
+        """Fold a chunk of records into the model"""
+        records = list(records)
+        if not records:
+            return
+        if not self.encoder.fitted:
+            self.encoder.fit(records)
+        chunk = self.encoder.encode(records)
+        if not self.kmeans.initialized:
+            self.kmeans.initialize(chunk, self.rng)
+        self.kmeans.partial_fit(chunk)
+
+    def fit_stream(self, records, chunk_size=10000):
+        """Fit from an iterable of records, holding one chunk in memory at a time"""
+        for chunk in chunked(records, chunk_size):
+            self.partial_fit(chunk)
+        return self
+
+    def personas(self, top=3):
+        """Summarize each centroid as a persona"""
+        total = self.n_samples or 1
+        summaries = []
+        for c in range(len(self.kmeans.vectors)):
+            centroid = self.kmeans.centroid(c)
+            summary = {
+                'cluster': c,
+                'size': self.kmeans.counts[c],
+                'percentage': round(100 * self.kmeans.counts[c] / total, 1),
+            }
+            for f, field in enumerate(CATEGORICAL_FIELDS):
+                vocabulary = self.encoder.vocabularies[field]
+                shares = [
+                    (centroid[f * MAX_CATEGORIES + slot] / CATEGORICAL_WEIGHT, value)
+                    for slot, value in enumerate(vocabulary)
+                ]
+                shares.sort(reverse=True)
+                summary[field] = [
+                    {'value': value, 'share': round(share, 3)}
+                    for share, value in shares[:top] if share > 0.005
+                ]
+            base = len(CATEGORICAL_FIELDS) * MAX_CATEGORIES
+            for n, field in enumerate(NUMERIC_FIELDS):
+                value = self.encoder.decode_numeric(n, centroid[base + n])
+                summary[field] = None if value is None else round(value, 1)
+            leading = [summary[field][0]['value'] for field in ('occupation', 'location') if summary[field]]
+            summary['name'] = ' / '.join(leading) or f'Persona {c + 1}'
+            summaries.append(summary)
+        summaries.sort(key=lambda summary: -summary['size'])
+        return summaries
+
+    def to_state(self):
+        return {'encoder': self.encoder.to_state(), 'kmeans': self.kmeans.to_state()}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(
+            encoder=FeatureEncoder.from_state(state['encoder']),
+            kmeans=MiniBatchKMeans.from_state(state['kmeans'])
+        )
+
+
+def iter_rows(chunk):
+    """Yield (indexes, values, squared norm) for each row of an encoded chunk"""
+    indexes, values = chunk
+    for start in range(0, len(values), NNZ):
+        vals = values[start:start + NNZ]
+        yield indexes[start:start + NNZ], vals, sum(map(mul, vals, vals))
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_records(path):
+    """Stream records from a CSV (with header) or JSON Lines file"""
+    with open(path, newline='', encoding='utf-8') as fh:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line in fh:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(fh)
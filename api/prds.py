@@ -0,0 +1,297 @@
+"""
+Version history for PRDs edited in the PRD builder.
+
+A PRD document is a JSON object whose top-level keys are its sections
+(problem, goals, requirements, ...). The latest version is kept inline on the
+PRD row, so opening a document never touches the history. Every save adds a
+PRDRevision holding either a keyframe (the full document) or a delta: the
+sections set or removed since the previous version, with long text sections
+and lists stored as line or item patches rather than whole values.
+
+A new keyframe is written every PRD_KEYFRAME_INTERVAL revisions, or sooner
+once the deltas since the last keyframe outweigh it, so rebuilding any
+version reads one keyframe plus a bounded run of deltas in a single range
+query.
+
+Autosaves from the same author that arrive within PRD_AUTOSAVE_WINDOW of the
+previous one are folded into that revision instead of adding a new one, for
+at most PRD_AUTOSAVE_MAX_SPAN; explicit saves always add a revision.
+"""
+import difflib
+import json
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Subquery
+from django.utils import timezone
+
+from . import snapshots
+from .models import PRD, PRDRevision
+
+CREATED = 'created'
+COALESCED = 'coalesced'
+UNCHANGED = 'unchanged'
+
+# Text sections shorter than this, and lists with fewer items, are stored
+# whole rather than patched
+PATCH_MIN_LENGTH = 200
+PATCH_MIN_ITEMS = 4
+
+
+class VersionConflict(Exception):
+    """The document was saved by someone else since the client loaded it"""
+
+
+def encode(value):
+    return zlib.compress(json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode())
+
+
+def decode(data):
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def validate_document(document):
+    if not isinstance(document, dict):
+        raise ValueError('document must be an object of sections')
+    size = len(json.dumps(document, separators=(',', ':'), ensure_ascii=False).encode())
+    if size > settings.PRD_MAX_BYTES:
+        raise ValueError(f'document is {size} bytes; at most {settings.PRD_MAX_BYTES} allowed')
+
+
+# Deltas
+
+def _elements(value):
+    """Patchable elements of a section: lines of text, or items of a list"""
+    if isinstance(value, str):
+        return value.splitlines(keepends=True)
+    return list(value)
+
+
+def _patch(old, new):
+    """Replacements turning old elements into new, as [start, end, elements]"""
+    old_elements = _elements(old)
+    new_elements = _elements(new)
+    if isinstance(new, list):
+        # SequenceMatcher needs hashable elements
+        a = [json.dumps(item, sort_keys=True) for item in old_elements]
+        b = [json.dumps(item, sort_keys=True) for item in new_elements]
+    else:
+        a, b = old_elements, new_elements
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    return [
+        [i1, i2, new_elements[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def _apply_patch(value, patch):
+    elements = _elements(value)
+    # Replacements are in ascending order and refer to the old elements
+    for start, end, replacement in reversed(patch):
+        elements[start:end] = replacement
+    return ''.join(elements) if isinstance(value, str) else elements
+
+
+def _patchable(old, new):
+    if isinstance(old, str) and isinstance(new, str):
+        return len(new) >= PATCH_MIN_LENGTH
+    return isinstance(old, list) and isinstance(new, list) and len(new) >= PATCH_MIN_ITEMS
+
+
+def diff_sections(old, new):
+    """Delta turning document old into new: {'set', 'patch', 'unset'}"""
+    delta = {}
+    for section, value in new.items():
+        if section in old and old[section] == value:
+            continue
+        previous = old.get(section)
+        if _patchable(previous, value):
+            patch = _patch(previous, value)
+            if len(json.dumps(patch)) < len(json.dumps(value)):
+                delta.setdefault('patch', {})[section] = patch
+                continue
+        delta.setdefault('set', {})[section] = value
+    unset = [section for section in old if section not in new]
+    if unset:
+        delta['unset'] = unset
+    return delta
+
+
+def apply_delta(document, delta):
+    """Apply a delta to a document in place and return it"""
+    for section in delta.get('unset', ()):
+        document.pop(section, None)
+    for section, patch in delta.get('patch', {}).items():
+        document[section] = _apply_patch(document[section], patch)
+    document.update(delta.get('set', {}))
+    return document
+
+
+def changed_sections(delta):
+    return sorted({*delta.get('set', ()), *delta.get('patch', ()), *delta.get('unset', ())})
+
+
+# Reading
+
+def document_at(prd, version):
+    """
+    The document as of a version: the latest is read from the PRD row, older
+    ones from their keyframe and the deltas after it, in one range query.
+    """
+    if version == prd.version:
+        return prd.document
+    keyframe = PRDRevision.objects.filter(prd=prd, version=version).values('keyframe_version')
+    rows = list(
+        PRDRevision.objects.filter(prd=prd, version__lte=version, version__gte=Subquery(keyframe))
+        .order_by('version')
+        .values_list('is_keyframe', 'data')
+    )
+    if not rows:
+        raise PRDRevision.DoesNotExist(f'Version {version} not found')
+    document = decode(rows[0][1])
+    for _, data in rows[1:]:
+        apply_delta(document, decode(data))
+    return document
+
+
+def history(prd, before=None, limit=50):
+    """Revisions of a PRD, newest first, without their content"""
+    revisions = PRDRevision.objects.filter(prd=prd)
+    if before is not None:
+        revisions = revisions.filter(version__lt=before)
+    return revisions.order_by('-version').values(
+        'version', 'is_keyframe', 'sections', 'author_id', 'autosave', 'saves', 'created_at', 'saved_at'
+    )[:limit]
+
+
+def diff_versions(prd, old_version, new_version):
+    """
+    Section-level diff between two versions. Text sections are diffed line by
+    line, structured ones field by field; unchanged sections are left out.
+    """
+    old = document_at(prd, old_version)
+    new = document_at(prd, new_version)
+    sections = []
+    unchanged = 0
+    for section in list(old) + [section for section in new if section not in old]:
+        if section not in new:
+            sections.append({'section': section, 'op': 'removed', 'old': old[section]})
+        elif section not in old:
+            sections.append({'section': section, 'op': 'added', 'new': new[section]})
+        elif old[section] != new[section]:
+            if isinstance(old[section], str) and isinstance(new[section], str):
+                diff = snapshots.diff_lines(old[section].splitlines(), new[section].splitlines())
+            else:
+                diff = snapshots.diff_documents(old[section], new[section])
+            sections.append({'section': section, 'op': 'changed', 'diff': diff})
+        else:
+            unchanged += 1
+    return {'from': old_version, 'to': new_version, 'sections': sections, 'unchanged': unchanged}
+
+
+# Writing
+
+def create(owner, title, document, now=None):
+    """Create a PRD with its first version stored as a keyframe"""
+    validate_document(document)
+    now = now or timezone.now()
+    data = encode(document)
+    with transaction.atomic():
+        prd = PRD.objects.create(
+            owner=owner, title=title, document=document, version=1,
+            keyframe_version=1, keyframe_size=len(data), chain_size=0
+        )
+        PRDRevision.objects.create(
+            prd=prd, version=1, keyframe_version=1, is_keyframe=True, data=data,
+            sections=sorted(document), author=owner, created_at=now, saved_at=now
+        )
+    return prd
+
+
+def _can_coalesce(latest, author, now):
+    return (
+        latest.autosave
+        and latest.author_id == (author.pk if author else None)
+        and latest.saved_at >= now - timedelta(seconds=settings.PRD_AUTOSAVE_WINDOW)
+        and latest.created_at >= now - timedelta(seconds=settings.PRD_AUTOSAVE_MAX_SPAN)
+    )
+
+
+def _copy_state(source, prd):
+    for field in PRD._meta.concrete_fields:
+        setattr(prd, field.attname, getattr(source, field.attname))
+
+
+def save(prd, document, author=None, base_version=None, autosave=False, title=None, now=None):
+    """
+    Save a new version of a PRD and return (version, outcome), where outcome
+    is CREATED, COALESCED (folded into the previous autosave) or UNCHANGED.
+
+    base_version is the version the client edited; VersionConflict is raised
+    if another save has landed since. prd is updated in place.
+    """
+    validate_document(document)
+    now = now or timezone.now()
+    with transaction.atomic():
+        current = PRD.objects.select_for_update().get(pk=prd.pk)
+        if base_version is not None and base_version != current.version:
+            raise VersionConflict(
+                f'Version {current.version} was saved after version {base_version}; reload and retry'
+            )
+        fields = {'updated_at': now}
+        if title is not None and title != current.title:
+            current.title = fields['title'] = title
+        if document == current.document:
+            if 'title' in fields:
+                PRD.objects.filter(pk=current.pk).update(**fields)
+            _copy_state(current, prd)
+            return current.version, UNCHANGED
+
+        latest = None
+        if autosave:
+            latest = PRDRevision.objects.filter(prd=current, version=current.version).first()
+        if latest is not None and _can_coalesce(latest, author, now):
+            outcome = COALESCED
+            # Re-diff against the version before the burst, so the revision
+            # holds one delta however many saves it absorbed
+            delta = diff_sections(document_at(current, latest.version - 1), document)
+            if latest.is_keyframe:
+                data = encode(document)
+                current.keyframe_size = fields['keyframe_size'] = len(data)
+            else:
+                data = encode(delta)
+                current.chain_size = fields['chain_size'] = current.chain_size - len(latest.data) + len(data)
+            PRDRevision.objects.filter(pk=latest.pk).update(
+                data=data, sections=changed_sections(delta), saves=latest.saves + 1, saved_at=now
+            )
+        else:
+            outcome = CREATED
+            version = current.version + 1
+            delta = diff_sections(current.document, document)
+            data = encode(delta)
+            is_keyframe = (
+                version - current.keyframe_version >= settings.PRD_KEYFRAME_INTERVAL
+                or current.chain_size + len(data) > current.keyframe_size
+            )
+            if is_keyframe:
+                data = encode(document)
+                current.keyframe_version = fields['keyframe_version'] = version
+                current.keyframe_size = fields['keyframe_size'] = len(data)
+                current.chain_size = fields['chain_size'] = 0
+            else:
+                current.chain_size = fields['chain_size'] = current.chain_size + len(data)
+            PRDRevision.objects.create(
+                prd=current, version=version, keyframe_version=current.keyframe_version,
+                is_keyframe=is_keyframe, data=data, sections=changed_sections(delta),
+                author=author, autosave=autosave, created_at=now, saved_at=now
+            )
+            current.version = fields['version'] = version
+
+        current.document = fields['document'] = document
+        current.updated_at = now
+        PRD.objects.filter(pk=current.pk).update(**fields)
+    _copy_state(current, prd)
+    return current.version, outcome
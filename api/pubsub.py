@@ -0,0 +1,280 @@
+"""
+In-process publish/subscribe hub for pushing small updates to streaming clients.
+
+Subscribers are per-user and per-topic. Every subscription owns a bounded queue;
+a subscriber that falls behind has its queue replaced by a single 'resync'
+message (telling the client to refetch full state) instead of growing without
+limit, and is disconnected if it keeps overflowing.
+
+Messages reach the hub through a backend. DatabaseBackend (the default) relays
+through the StreamMessage table so that publishers in other processes
+(management commands, other workers) reach subscribers here; LocalBackend
+delivers within this process only. Pick one with the STREAM_BACKEND setting.
+"""
+import asyncio
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import StreamMessage
+
+logger = logging.getLogger(__name__)
+
+RESYNC = 'resync'
+# Queue sentinels: the hub's heartbeat tick, the client going away, and the
+# hub closing a persistently slow subscription
+HEARTBEAT = object()
+DISCONNECTED = object()
+CLOSED = None
+
+
+class Subscription:
+    """A client's interest in some topics, with a bounded delivery queue"""
+
+    __slots__ = ('user_id', 'topics', 'queue', 'overflows', 'closed')
+
+    def __init__(self, user_id, topics, maxsize):
+        self.user_id = user_id
+        self.topics = frozenset(topics)
+        self.queue = asyncio.Queue(maxsize)
+        self.overflows = 0
+        self.closed = False
+
+    def deliver(self, message):
+        """Queue a message without blocking the publisher (event loop thread only)"""
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            pass
+        # Slow consumer: drop what it has not read and ask it to refetch
+        self.overflows += 1
+        if self.overflows > settings.STREAM_MAX_OVERFLOWS:
+            self.closed = True
+            self.interrupt(CLOSED)
+        else:
+            self.interrupt({'topic': RESYNC, 'data': {'reason': 'overflow'}})
+
+    def interrupt(self, message):
+        """Replace anything still queued with a single message"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+
+class Hub:
+    """Fans published messages out to matching subscriptions"""
+
+    def __init__(self, backend=None):
+        # topic -> user id -> set of subscriptions
+        self.index = {}
+        self.subscriptions = set()
+        self.loop = None
+        self.backend = backend or LocalBackend()
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self):
+        return len(self.subscriptions)
+
+    async def _heartbeat(self):
+        """
+        Wake idle subscriptions periodically so their connections send a
+        keep-alive. One timer for the whole hub is far cheaper than one per
+        connection.
+        """
+        while True:
+            await asyncio.sleep(settings.STREAM_HEARTBEAT_SECONDS)
+            for subscription in list(self.subscriptions):
+                if subscription.queue.empty():
+                    subscription.queue.put_nowait(HEARTBEAT)
+
+    def subscribe(self, user_id, topics, maxsize=None):
+        """Register a subscription; must be called from the event loop"""
+        if self.loop is None:
+            with self._lock:
+                if self.loop is None:
+                    self.loop = asyncio.get_running_loop()
+                    self.loop.create_task(self._heartbeat())
+                    self.backend.start(self)
+        subscription = Subscription(user_id, topics, maxsize or settings.STREAM_QUEUE_SIZE)
+        self.subscriptions.add(subscription)
+        for topic in subscription.topics:
+            self.index.setdefault(topic, {}).setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.closed = True
+        self.subscriptions.discard(subscription)
+        for topic in subscription.topics:
+            users = self.index.get(topic, {})
+            subs = users.get(subscription.user_id)
+            if subs is not None:
+                subs.discard(subscription)
+                if not subs:
+                    del users[subscription.user_id]
+            if not users:
+                self.index.pop(topic, None)
+
+    def publish(self, topic, data, user_id=None):
+        """
+        Publish a message to one user's subscribers of a topic, or to every
+        subscriber of the topic when user_id is None. Safe to call from any
+        thread; backends may do blocking I/O, so call it from sync code.
+        """
+        self.backend.publish_many([{'topic': topic, 'user_id': user_id, 'data': data}])
+
+    def publish_many(self, messages):
+        """Publish several {'topic', 'user_id', 'data'} messages at once"""
+        if messages:
+            self.backend.publish_many(messages)
+
+    def dispatch(self, message):
+        """Deliver a message to local subscribers (event loop thread only)"""
+        users = self.index.get(message['topic'])
+        if not users:
+            return
+        if message.get('user_id') is None:
+            targets = [sub for subs in users.values() for sub in subs]
+        else:
+            targets = list(users.get(message['user_id'], ()))
+        for subscription in targets:
+            subscription.deliver(message)
+
+    def dispatch_threadsafe(self, message):
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            # Nobody in this process has subscribed yet
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.dispatch(message)
+        else:
+            loop.call_soon_threadsafe(self.dispatch, message)
+
+
+class LocalBackend:
+    """
+    Delivers messages to subscribers in this process only. Messages published
+    before anything here has subscribed, e.g. from a management command, can
+    never be delivered, so they are dropped with a warning.
+    """
+
+    def __init__(self):
+        self.hub = None
+        self.dropped = 0
+
+    def start(self, hub):
+        self.hub = hub
+
+    def publish_many(self, messages):
+        if self.hub is None:
+            if not self.dropped:
+                logger.warning(
+                    'Dropping stream messages published from a process with no subscribers; '
+                    'set STREAM_BACKEND to api.pubsub.DatabaseBackend to reach other processes'
+                )
+            self.dropped += len(messages)
+            return
+        for message in messages:
+            self.hub.dispatch_threadsafe(message)
+
+
+class DatabaseBackend:
+    """
+    Relays messages through the StreamMessage table so publishers in any
+    process reach subscribers in every process. Each process polls for rows
+    newer than the last one it has seen.
+
+    Messages older than STREAM_MESSAGE_RETENTION are deleted every
+    STREAM_PRUNE_INTERVAL seconds by publishers as well as subscribers, so
+    the table stays bounded even where nothing ever subscribes.
+    """
+
+    def __init__(self, poll_interval=None):
+        self.poll_interval = poll_interval or settings.STREAM_POLL_INTERVAL
+        self.pruned_at = None
+
+    def start(self, hub):
+        self.hub = hub
+        hub.loop.create_task(self._poll())
+
+    def publish_many(self, messages):
+        StreamMessage.objects.bulk_create([
+            StreamMessage(topic=message['topic'], user_id=message['user_id'], payload=message['data'])
+            for message in messages
+        ], batch_size=1000)
+        if self._prune_due():
+            try:
+                self._prune()
+            except Exception:
+                logger.exception('Stream message prune failed')
+
+    def _latest_id(self):
+        return StreamMessage.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def _fetch(self, after_id):
+        return list(
+            StreamMessage.objects.filter(id__gt=after_id)
+            .order_by('id')
+            .values_list('id', 'topic', 'user_id', 'payload')[:1000]
+        )
+
+    def _prune_due(self):
+        return self.pruned_at is None or time.monotonic() - self.pruned_at >= settings.STREAM_PRUNE_INTERVAL
+
+    def _prune(self):
+        self.pruned_at = time.monotonic()
+        cutoff = timezone.now() - timedelta(seconds=settings.STREAM_MESSAGE_RETENTION)
+        StreamMessage.objects.filter(created_at__lt=cutoff).delete()
+
+    async def _poll(self):
+        last_id = await sync_to_async(self._latest_id)()
+        while True:
+            rows = []
+            try:
+                rows = await sync_to_async(self._fetch)(last_id)
+                for row_id, topic, user_id, payload in rows:
+                    self.hub.dispatch({'topic': topic, 'user_id': user_id, 'data': payload})
+                    last_id = row_id
+                if self._prune_due():
+                    await sync_to_async(self._prune)()
+            except Exception:
+                logger.exception('Stream message poll failed')
+            if not rows:
+                await asyncio.sleep(self.poll_interval)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """Return the process-wide hub, creating it with STREAM_BACKEND on first use"""
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = Hub(import_string(settings.STREAM_BACKEND)())
+    return _hub
+
+
+def publish(topic, data, user_id=None):
+    """Publish a message through the process-wide hub"""
+    get_hub().publish(topic, data, user_id=user_id)
+
+
+def publish_many(messages):
+    """Publish several messages through the process-wide hub"""
+    get_hub().publish_many(messages)
@@ -0,0 +1,333 @@
+"""
+Competitor snapshot store.
+
+Captured pages and JSON feeds are stored as zlib-compressed blobs addressed by
+the SHA-256 of their (canonicalized) content, so a capture identical to one
+already stored adds no blob. Consecutive identical captures of a source add no
+row either: they only extend the latest Snapshot's last_seen_at.
+
+When a capture differs from the previous version of its source, the diff
+against that version alone is computed at ingest time. Its summary (line and
+field counts, the first few changes) is kept on the Snapshot row so change
+timelines are plain index reads; the full diff is cached in SnapshotDiff,
+keyed by blob pair, and diffs between arbitrary versions are cached the same
+way on first request.
+
+Pages are diffed line by line on their visible text (markup is stripped so
+layout churn does not register as change); JSON feeds are diffed
+structurally, matching list items by their 'id' or 'name' where present.
+"""
+import difflib
+import hashlib
+import json
+import zlib
+from functools import lru_cache
+from html.parser import HTMLParser
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+
+from .models import Snapshot, SnapshotBlob, SnapshotDiff
+
+TYPE_PAGE = 'page'
+TYPE_JSON = 'json'
+
+# Changes kept on the Snapshot row for timelines; the full diff is in the cache
+SUMMARY_LIMIT = 5
+# Characters kept per changed line or value in diffs
+VALUE_LIMIT = 500
+
+
+# Content
+
+def canonicalize(content, content_type):
+    """
+    Bytes to hash and store. JSON is re-serialized with sorted keys so that
+    formatting-only differences between captures deduplicate.
+    """
+    if content_type == TYPE_JSON:
+        document = json.loads(content)
+        return json.dumps(document, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+    if isinstance(content, str):
+        content = content.encode()
+    return content
+
+
+def compress(data):
+    return zlib.compress(data, 9)
+
+
+def content_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@lru_cache(maxsize=256)
+def _inflate(digest):
+    # Keyed by digest rather than id: content for a digest can never change
+    return zlib.decompress(bytes(SnapshotBlob.objects.values_list('data', flat=True).get(digest=digest)))
+
+
+def read_blob(blob):
+    """Decompressed content of a blob (recently read blobs are cached in-process)"""
+    return _inflate(blob.digest)
+
+
+def store_blob(data, content_type, digest=None):
+    """Return (blob, created) for some content, creating the blob only if the digest is new"""
+    digest = digest or content_digest(data)
+    blob = SnapshotBlob.objects.filter(digest=digest).only('id', 'digest', 'content_type').first()
+    if blob is not None:
+        return blob, False
+    try:
+        with transaction.atomic():
+            return SnapshotBlob.objects.create(
+                digest=digest, content_type=content_type, size=len(data), data=compress(data)
+            ), True
+    except IntegrityError:
+        # Stored concurrently by another ingester
+        return SnapshotBlob.objects.get(digest=digest), False
+
+
+# Diffing
+
+class _TextExtractor(HTMLParser):
+    """Collects the visible text of an HTML page, one line per text block"""
+
+    SKIP = {'script', 'style', 'noscript', 'template'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self.skipping:
+            self.skipping -= 1
+
+    def handle_data(self, data):
+        if not self.skipping:
+            for line in data.splitlines():
+                line = ' '.join(line.split())
+                if line:
+                    self.lines.append(line)
+
+
+def page_lines(data):
+    text = data.decode('utf-8', errors='replace')
+    if '<' not in text[:1024]:
+        return text.splitlines()
+    extractor = _TextExtractor()
+    extractor.feed(text)
+    extractor.close()
+    return extractor.lines
+
+
+def _clip(value):
+    if isinstance(value, str) and len(value) > VALUE_LIMIT:
+        return value[:VALUE_LIMIT] + '…'
+    return value
+
+
+def diff_lines(old, new):
+    """Line-level diff as hunks of removed and added lines"""
+    hunks = []
+    added = removed = 0
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        removed += i2 - i1
+        added += j2 - j1
+        hunks.append({
+            'old_start': i1 + 1,
+            'new_start': j1 + 1,
+            'removed': [_clip(line) for line in old[i1:i2]],
+            'added': [_clip(line) for line in new[j1:j2]],
+        })
+    return {'type': TYPE_PAGE, 'added': added, 'removed': removed, 'hunks': hunks}
+
+
+def _list_key(old, new):
+    """The field uniquely identifying items in both lists of objects, if any"""
+    if not old or not new:
+        return None
+    for key in ('id', 'name', 'key', 'title'):
+        if all(
+            all(isinstance(item, dict) and key in item for item in items)
+            and len({repr(item[key]) for item in items}) == len(items)
+            for items in (old, new)
+        ):
+            return key
+    return None
+
+
+def _walk(old, new, path, changes):
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in sorted(old.keys() | new.keys()):
+            child = f'{path}.{key}' if path else key
+            if key not in new:
+                changes.append({'path': child, 'op': 'removed', 'old': old[key]})
+            elif key not in old:
+                changes.append({'path': child, 'op': 'added', 'new': new[key]})
+            else:
+                _walk(old[key], new[key], child, changes)
+    elif isinstance(old, list) and isinstance(new, list):
+        key = _list_key(old, new)
+        if key is not None:
+            old_items = {repr(item[key]): item for item in old}
+            new_items = {repr(item[key]): item for item in new}
+            for item in old:
+                ident = repr(item[key])
+                child = f'{path}[{key}={item[key]}]'
+                if ident not in new_items:
+                    changes.append({'path': child, 'op': 'removed', 'old': item})
+                else:
+                    _walk(item, new_items[ident], child, changes)
+            for item in new:
+                if repr(item[key]) not in old_items:
+                    changes.append({'path': f'{path}[{key}={item[key]}]', 'op': 'added', 'new': item})
+        else:
+            for index in range(max(len(old), len(new))):
+                child = f'{path}[{index}]'
+                if index >= len(new):
+                    changes.append({'path': child, 'op': 'removed', 'old': old[index]})
+                elif index >= len(old):
+                    changes.append({'path': child, 'op': 'added', 'new': new[index]})
+                else:
+                    _walk(old[index], new[index], child, changes)
+    elif old != new or type(old) is not type(new):
+        changes.append({'path': path, 'op': 'changed', 'old': old, 'new': new})
+
+
+def diff_documents(old, new):
+    """Structured diff of two JSON documents as a list of path-level changes"""
+    changes = []
+    _walk(old, new, '', changes)
+    for change in changes:
+        for side in ('old', 'new'):
+            if side in change:
+                change[side] = _clip(change[side])
+    return {'type': TYPE_JSON, 'changed': len(changes), 'changes': changes}
+
+
+def compute_diff(old_blob, new_blob):
+    old, new = read_blob(old_blob), read_blob(new_blob)
+    if old_blob.content_type == TYPE_JSON and new_blob.content_type == TYPE_JSON:
+        return diff_documents(json.loads(old), json.loads(new))
+    return diff_lines(page_lines(old), page_lines(new))
+
+
+def _cache_diff(old_blob, new_blob, diff):
+    data = compress(json.dumps(diff, cls=DjangoJSONEncoder, separators=(',', ':')).encode())
+    try:
+        with transaction.atomic():
+            SnapshotDiff.objects.create(old_blob=old_blob, new_blob=new_blob, data=data)
+    except IntegrityError:
+        pass
+
+
+def get_diff(old_blob, new_blob):
+    """Diff between two blobs, from the cache or computed and cached"""
+    if old_blob.pk == new_blob.pk:
+        return {'type': new_blob.content_type, 'identical': True}
+    cached = SnapshotDiff.objects.filter(old_blob=old_blob, new_blob=new_blob).values_list('data', flat=True).first()
+    if cached is not None:
+        return json.loads(zlib.decompress(bytes(cached)))
+    diff = compute_diff(old_blob, new_blob)
+    _cache_diff(old_blob, new_blob, diff)
+    return diff
+
+
+def summarize(diff):
+    """Counts and the first few changes of a diff, for storing on a Snapshot"""
+    if diff['type'] == TYPE_JSON:
+        return {
+            'fields_changed': diff['changed'],
+            'summary': [
+                {key: change[key] for key in ('path', 'op')} for change in diff['changes'][:SUMMARY_LIMIT]
+            ],
+        }
+    summary = []
+    for hunk in diff['hunks']:
+        summary.extend({'op': 'removed', 'line': _clip(line)[:200]} for line in hunk['removed'])
+        summary.extend({'op': 'added', 'line': _clip(line)[:200]} for line in hunk['added'])
+        if len(summary) >= SUMMARY_LIMIT:
+            break
+    return {
+        'lines_added': diff['added'],
+        'lines_removed': diff['removed'],
+        'summary': summary[:SUMMARY_LIMIT],
+    }
+
+
+# Ingestion
+
+def latest_snapshot(competitor, source):
+    return (
+        Snapshot.objects.select_related('blob')
+        .defer('blob__data')
+        .filter(competitor=competitor, source=source)
+        .order_by('-captured_at', '-id')
+        .first()
+    )
+
+
+def ingest(competitor, content, content_type, captured_at, source='main', previous=None):
+    """
+    Record a capture of a competitor source and return (snapshot, created).
+    created is False when the content matched the latest version.
+
+    Pass the snapshot returned for the previous capture as `previous` when
+    ingesting a sequence, to skip looking it up again.
+    """
+    if content_type not in (TYPE_PAGE, TYPE_JSON):
+        raise ValueError(f"Unsupported content type '{content_type}'")
+    data = canonicalize(content, content_type)
+    digest = content_digest(data)
+    if previous is None:
+        previous = latest_snapshot(competitor, source)
+    if previous is not None and captured_at < previous.last_seen_at:
+        raise ValueError(
+            f'Capture at {captured_at.isoformat()} is older than the latest one '
+            f'({previous.last_seen_at.isoformat()}); ingest captures in order'
+        )
+
+    with transaction.atomic():
+        if previous is not None and previous.blob.digest == digest:
+            Snapshot.objects.filter(pk=previous.pk).update(
+                last_seen_at=captured_at, captures=previous.captures + 1
+            )
+            previous.last_seen_at = captured_at
+            previous.captures += 1
+            return previous, False
+
+        blob, _ = store_blob(data, content_type, digest)
+        changes = {}
+        if previous is not None:
+            diff = compute_diff(previous.blob, blob)
+            _cache_diff(previous.blob, blob, diff)
+            changes = summarize(diff)
+        snapshot = Snapshot.objects.create(
+            competitor=competitor, source=source, blob=blob, previous=previous,
+            captured_at=captured_at, last_seen_at=captured_at, **changes
+        )
+        return snapshot, True
+
+
+def timeline(competitor, source=None, since=None, until=None, limit=50):
+    """Versions of a competitor's sources, newest first, read from the index only"""
+    snapshots = Snapshot.objects.filter(competitor=competitor)
+    if source:
+        snapshots = snapshots.filter(source=source)
+    if since is not None:
+        snapshots = snapshots.filter(captured_at__gte=since)
+    if until is not None:
+        snapshots = snapshots.filter(captured_at__lt=until)
+    return snapshots.order_by('-captured_at', '-id').values(
+        'id', 'source', 'captured_at', 'last_seen_at', 'captures', 'previous_id',
+        'lines_added', 'lines_removed', 'fields_changed', 'summary'
+    )[:limit]
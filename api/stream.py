@@ -0,0 +1,178 @@
+"""
+Server-Sent Events endpoint at /api/stream/.
+
+Routed straight from backend/asgi.py instead of through Django's middleware
+stack: the session cookie is resolved to a user once when the connection
+opens, after which an idle connection costs one hub subscription and its
+queue until the client goes away.
+
+Clients subscribe with ?topics=briefing,workflows and receive each published
+delta as an SSE event named after its topic. A 'resync' event means messages
+were dropped because the client fell behind and it should refetch full state.
+"""
+import asyncio
+import json
+import re
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http.cookie import parse_cookie
+
+from .pubsub import CLOSED, DISCONNECTED, HEARTBEAT, get_hub
+
+HEARTBEAT_COMMENT = b': ping\n\n'
+
+
+def encode_event(message):
+    data = json.dumps(message['data'], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f"event: {message['topic']}\ndata: {data}\n\n".encode()
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', ()):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+def _cors_headers(scope):
+    origin = _header(scope, b'origin')
+    if not origin:
+        return []
+    allowed = origin in settings.CORS_ALLOWED_ORIGINS or any(
+        re.match(pattern, origin) for pattern in getattr(settings, 'CORS_ALLOWED_ORIGIN_REGEXES', [])
+    )
+    if not allowed:
+        return []
+    return [
+        (b'access-control-allow-origin', origin.encode('latin-1')),
+        (b'access-control-allow-credentials', b'true'),
+        (b'vary', b'Origin'),
+    ]
+
+
+class EventStream:
+    """ASGI application serving one SSE connection per request"""
+
+    def __init__(self, hub=None):
+        self.hub = hub
+
+    async def __call__(self, scope, receive, send):
+        if scope['method'] != 'GET':
+            await self.reject(scope, send, 405, 'Method not allowed')
+            return
+        user_id = await self.authenticate(scope)
+        if user_id is None:
+            await self.reject(scope, send, 403, 'Authentication credentials were not provided.')
+            return
+        try:
+            topics = self.parse_topics(scope)
+        except ValueError as e:
+            await self.reject(scope, send, 400, str(e))
+            return
+
+        hub = self.hub or get_hub()
+        subscription = hub.subscribe(user_id, topics)
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    # Stop nginx and similar proxies from buffering the stream
+                    (b'x-accel-buffering', b'no'),
+                ] + _cors_headers(scope),
+            })
+            await send({
+                'type': 'http.response.body',
+                'body': b'retry: 5000\n: connected\n\n',
+                'more_body': True,
+            })
+            if await self.pump(subscription, receive, send):
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            hub.unsubscribe(subscription)
+
+    async def authenticate(self, scope):
+        """Resolve the session cookie to a user id, or None"""
+        return await sync_to_async(self._session_user_id)(scope)
+
+    def _session_user_id(self, scope):
+        cookies = parse_cookie(_header(scope, b'cookie') or '')
+        session_key = cookies.get(settings.SESSION_COOKIE_NAME)
+        if not session_key:
+            return None
+        engine = import_module(settings.SESSION_ENGINE)
+        # get_user only needs request.session, and performs the same session
+        # hash verification as AuthenticationMiddleware
+        user = get_user(SimpleNamespace(session=engine.SessionStore(session_key)))
+        return user.pk if user.is_authenticated else None
+
+    def parse_topics(self, scope):
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        requested = [
+            topic.strip()
+            for value in query.get('topics', [])
+            for topic in value.split(',') if topic.strip()
+        ]
+        if not requested:
+            return list(settings.STREAM_TOPICS)
+        unknown = sorted(set(requested) - set(settings.STREAM_TOPICS))
+        if unknown:
+            raise ValueError(f"Unknown topics: {', '.join(unknown)}")
+        return requested
+
+    async def pump(self, subscription, receive, send):
+        """
+        Forward queued messages to the client until it disconnects. Returns
+        True if the server ended the stream (the client is still connected).
+        """
+        watcher = asyncio.ensure_future(self._watch_disconnect(receive, subscription))
+        try:
+            while True:
+                message = await subscription.queue.get()
+                # Coalesce everything already queued into a single write
+                body = b''
+                while True:
+                    if message is DISCONNECTED:
+                        return False
+                    if message is CLOSED:
+                        # The hub gave up on this persistently slow client
+                        if body:
+                            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+                        return True
+                    body += HEARTBEAT_COMMENT if message is HEARTBEAT else encode_event(message)
+                    if subscription.queue.empty():
+                        break
+                    message = subscription.queue.get_nowait()
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            watcher.cancel()
+
+    async def _watch_disconnect(self, receive, subscription):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                subscription.interrupt(DISCONNECTED)
+                return
+
+    async def reject(self, scope, send, status_code, error):
+        body = json.dumps({'error': error}).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status_code,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+            ] + _cors_headers(scope),
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+sse_application = EventStream()
@@ -1,3 +1,462 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+from array import array
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import audit, briefings, content, minhash, pubsub
+from .management.commands._bench import rss_bytes
+from .models import (
+    Briefing, ChangeEvent, Idea, MaterializerCursor, Organization, OrganizationJoinRequest, StreamMessage,
+    UserProfile
+)
+from .personas import PersonaDeriver, _to_float
+
+
+class ExportStreamingTests(TransactionTestCase):
+    """
+    Exports are served through the ASGI handler (backend/asgi.py) and must
+    stream: memory stays flat however many rows are exported.
+    """
+    ROWS = int(os.getenv('EXPORT_TEST_ROWS', '200000'))
+    # Allowed RSS growth while streaming; the full export is several times this
+    MAX_RSS_GROWTH = 32 * 2 ** 20
+
+    def setUp(self):
+        self.user = User.objects.create_user('exporter', 'exporter@example.com', 'password')
+        table = connection.ops.quote_name(ChangeEvent._meta.db_table)
+        payload = json.dumps({'title': 'x' * 400})
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            for offset in range(0, self.ROWS, 10000):
+                cursor.executemany(
+                    f'INSERT INTO {table} (user_id, kind, source, payload, created_at) VALUES (%s, %s, %s, %s, %s)',
+                    [(self.user.id, 'idea', 'test', payload, now)] * min(10000, self.ROWS - offset)
+                )
+        self.client.force_login(self.user)
+
+    def request(self, path, query):
+        """Run a GET through the ASGI handler, recording body size and peak RSS as it streams"""
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'cookie', f'sessionid={self.client.cookies["sessionid"].value}'.encode()),
+            ],
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+        result = {'status': None, 'bytes': 0, 'messages': 0, 'peak': rss_bytes()}
+
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # The client stays connected until the response is complete
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                result['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                result['bytes'] += len(message.get('body', b''))
+                result['messages'] += 1
+                if result['messages'] % 16 == 0:
+                    result['peak'] = max(result['peak'], rss_bytes())
+
+        async_to_sync(ASGIHandler())(scope, receive, send)
+        return result
+
+    def test_export_memory_stays_flat_under_asgi(self):
+        baseline = rss_bytes()
+        result = self.request('/api/exports/events/', 'type=jsonl')
+
+        self.assertEqual(result['status'], 200)
+        self.assertGreater(result['bytes'], self.ROWS * 400)
+        self.assertGreater(result['messages'], 1)
+        self.assertLess(
+            result['peak'] - baseline, self.MAX_RSS_GROWTH,
+            f"RSS grew {(result['peak'] - baseline) / 2 ** 20:.1f}MB streaming "
+            f"{result['bytes'] / 2 ** 20:.1f}MB of export"
+        )
+
+
+class BriefingMaterializerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('briefed', 'briefed@example.com', 'password')
+        MaterializerCursor.objects.create(name=briefings.CURSOR_NAME)
+
+    def alert(self, severity='High', **fields):
+        return ChangeEvent.objects.create(
+            user=self.user, kind=ChangeEvent.KIND_ALERT, source='test',
+            payload={'severity': severity, 'message': 'Velocity dropped', **fields}
+        )
+
+    def cursor(self):
+        return MaterializerCursor.objects.get(name=briefings.CURSOR_NAME)
+
+    def test_waits_at_a_missing_id_then_skips_it(self):
+        events = [self.alert() for _ in range(5)]
+        # An id that is missing above the cursor, as if still uncommitted
+        events[2].delete()
+
+        self.assertEqual(briefings.materialize_batch(), 2)
+        self.assertEqual(briefings.materialize_batch(), 0)
+        self.assertEqual(self.cursor().position, events[1].id)
+        self.assertIsNotNone(self.cursor().gap_seen_at)
+
+        MaterializerCursor.objects.filter(name=briefings.CURSOR_NAME).update(
+            gap_seen_at=timezone.now() - timedelta(seconds=settings.BRIEFING_GAP_TIMEOUT + 1)
+        )
+        with self.assertLogs('api.briefings', 'WARNING'):
+            self.assertEqual(briefings.materialize_batch(), 2)
+        self.assertEqual(self.cursor().position, events[4].id)
+        self.assertIsNone(self.cursor().gap_seen_at)
+        self.assertEqual(Briefing.objects.get(user=self.user).document['alert_counts'], {'High': 4})
+
+    def test_late_commit_below_the_cursor_is_not_lost(self):
+        first = self.alert()
+        second = self.alert('Low')
+        ChangeEvent.objects.filter(pk=first.pk).delete()
+        self.assertEqual(briefings.materialize_batch(), 0)
+
+        # The lower id commits before the gap times out
+        ChangeEvent.objects.create(
+            id=first.id, user=self.user, kind=ChangeEvent.KIND_ALERT, payload={'severity': 'High'}
+        )
+        self.assertEqual(briefings.materialize_batch(), 2)
+        self.assertEqual(self.cursor().position, second.id)
+        self.assertEqual(Briefing.objects.get(user=self.user).document['alert_counts'], {'High': 1, 'Low': 1})
+
+    def test_lost_compare_and_set_is_refolded(self):
+        self.alert()
+        briefings.materialize_batch()
+        self.alert('Low')
+        store_many = briefings._store_many
+
+        def competing_write(updated, refreshed_at):
+            # Another writer lands between the consumer's read and its write
+            for briefing in updated:
+                Briefing.objects.filter(pk=briefing.pk).update(version=briefing.version + 1)
+            return store_many(updated, refreshed_at)
+
+        with mock.patch.object(briefings, '_store_many', side_effect=competing_write) as patched:
+            self.assertEqual(briefings.materialize_batch(), 1)
+        self.assertEqual(patched.call_count, 1)
+        briefing = Briefing.objects.get(user=self.user)
+        self.assertEqual(briefing.document['alert_counts'], {'High': 1, 'Low': 1})
+        # Written once by the competing writer and once by the retry
+        self.assertEqual(briefing.version, 2)
+
+    def test_store_many_reports_only_the_rows_it_lost(self):
+        self.alert()
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        ChangeEvent.objects.create(user=other, kind=ChangeEvent.KIND_ALERT, payload={'severity': 'Low'})
+        briefings.materialize_batch()
+        stale = list(Briefing.objects.order_by('user_id'))
+        # The first briefing is written twice by someone else: version + 2
+        Briefing.objects.filter(pk=stale[0].pk).update(version=stale[0].version + 2)
+
+        versions = [briefing.version for briefing in stale]
+
+        lost = briefings._store_many(stale, timezone.now())
+        self.assertEqual(lost, [stale[0]])
+        self.assertEqual(Briefing.objects.get(pk=stale[0].pk).version, versions[0] + 2)
+        self.assertEqual(Briefing.objects.get(pk=stale[1].pk).version, versions[1] + 1)
+
+    def test_invalid_payload_is_skipped_by_the_consumer(self):
+        self.alert()
+        # Stored before payloads were validated
+        ChangeEvent.objects.create(
+            user=self.user, kind=ChangeEvent.KIND_SENTIMENT, payload={'score': 'very good'}
+        )
+        ChangeEvent.objects.create(user=self.user, kind=ChangeEvent.KIND_ALERT, payload={'severity': ['High']})
+        last = self.alert('Low')
+
+        with self.assertLogs('api.briefings', 'WARNING') as logs:
+            self.assertEqual(briefings.materialize_batch(), 4)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(self.cursor().position, last.id)
+        document = Briefing.objects.get(user=self.user).document
+        self.assertEqual(document['alert_counts'], {'High': 1, 'Low': 1})
+        self.assertEqual(document['sentiment'], {})
+
+    def test_record_rejects_invalid_payloads(self):
+        self.client.force_login(self.user)
+        for payload in (
+            {'kind': 'sentiment', 'payload': {'score': 'very good'}},
+            {'kind': 'sentiment', 'payload': {'score': 5}},
+            {'kind': 'sentiment', 'payload': {'mentions': 0}},
+            {'kind': 'alert', 'payload': {'severity': ['High']}},
+            {'kind': 'alert', 'payload': {'message': {'nested': True}}},
+            {'kind': 'alert', 'payload': 'High'},
+        ):
+            response = self.client.post('/api/briefing/events/', payload, content_type='application/json')
+            self.assertEqual(response.status_code, 400, payload)
+        self.assertFalse(ChangeEvent.objects.exists())
+
+        response = self.client.post('/api/briefing/events/', {
+            'kind': 'sentiment',
+            'payload': {'topic': 'Dark Mode', 'score': '0.5', 'kind': 'alert', 'user': 1, 'source': 'x'},
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        event = ChangeEvent.objects.get()
+        self.assertEqual(event.payload, {'topic': 'Dark Mode', 'score': 0.5, 'mentions': 1})
+
+        briefings.materialize_batch()
+        response = self.client.get('/api/briefing/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['briefing']['sentiment']['Dark Mode']['mentions'], 1)
+
+
+class StreamPruneTests(TestCase):
+    def message(self):
+        return {'topic': 'briefing', 'user_id': 1, 'data': {}}
+
+    def test_publisher_without_subscribers_prunes_expired_messages(self):
+        backend = pubsub.DatabaseBackend()
+        expired = timezone.now() - timedelta(seconds=settings.STREAM_MESSAGE_RETENTION + 1)
+        StreamMessage.objects.create(topic='briefing', user_id=1, created_at=expired)
+
+        backend.publish_many([self.message()])
+        self.assertEqual(StreamMessage.objects.count(), 1)
+
+        # Not due again until STREAM_PRUNE_INTERVAL has passed
+        StreamMessage.objects.create(topic='briefing', user_id=1, created_at=expired)
+        backend.publish_many([self.message()])
+        self.assertEqual(StreamMessage.objects.count(), 3)
+
+        backend.pruned_at -= settings.STREAM_PRUNE_INTERVAL
+        backend.publish_many([self.message()])
+        self.assertFalse(StreamMessage.objects.filter(created_at__lt=expired + timedelta(seconds=1)).exists())
+        self.assertEqual(StreamMessage.objects.count(), 3)
+
+
+class PersonaIncomeTests(TestCase):
+    def test_income_ranges_parse_to_their_midpoint(self):
+        self.assertEqual(_to_float('$65K-$95K'), 80000)
+        self.assertEqual(_to_float('$35K-$70K (variable)'), 52500)
+        self.assertEqual(_to_float('65-95k'), 80000)
+        self.assertEqual(_to_float('$100K+'), 100000)
+        self.assertEqual(_to_float('$55,000'), 55000)
+        self.assertIsNone(_to_float('unknown'))
+        self.assertIsNone(_to_float('nan'))
+
+    def test_personas_report_income_from_ranges(self):
+        records = [
+            {'occupation': 'Engineer', 'age': 30, 'income': '$65K-$95K'},
+            {'occupation': 'Teacher', 'age': 45, 'income': '$35K-$70K (variable)'},
+        ] * 50
+        deriver = PersonaDeriver(k=2).fit_stream(records)
+        incomes = sorted(persona['income'] for persona in deriver.personas())
+        self.assertAlmostEqual(incomes[0], 52500, delta=100)
+        self.assertAlmostEqual(incomes[1], 80000, delta=100)
+
+    def test_income_is_none_when_never_given(self):
+        records = [{'occupation': 'Engineer', 'age': 30}, {'occupation': 'Teacher', 'age': 45}] * 10
+        deriver = PersonaDeriver(k=2).fit_stream(records)
+        restored = PersonaDeriver.from_state(json.loads(json.dumps(deriver.to_state())))
+        for persona in restored.personas():
+            self.assertIsNone(persona['income'])
+            self.assertIsNotNone(persona['age'])
+
+
+class OrganizationJoinTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.member = User.objects.create_user('member', 'member@example.com', 'password')
+        self.join(self.owner, 'Acme')
+
+    def join(self, user, name):
+        self.client.force_login(user)
+        response = self.client.put(
+            '/api/auth/preferences/', {'preferences': {'organizationName': name}}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']['user']['organization_request']
+
+    def decide(self, join_request, action):
+        self.client.force_login(self.owner)
+        response = self.client.post(
+            f"/api/organization/requests/{join_request['id']}/", {'action': action}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def pending(self):
+        self.client.force_login(self.owner)
+        return [item['id'] for item in self.client.get('/api/organization/requests/').json()['data']['requests']]
+
+    def test_declined_user_can_request_again(self):
+        join_request = self.join(self.member, 'Acme')
+        self.decide(join_request, 'decline')
+        self.assertEqual(self.pending(), [])
+
+        again = self.join(self.member, 'Acme')
+        self.assertEqual(again['status'], OrganizationJoinRequest.STATUS_PENDING)
+        self.assertEqual(self.pending(), [again['id']])
+        self.assertIsNone(OrganizationJoinRequest.objects.get(pk=again['id']).decided_at)
+
+    def test_former_member_rejoining_needs_approval_again(self):
+        self.decide(self.join(self.member, 'Acme'), 'approve')
+        self.join(self.member, 'Globex')
+        self.assertEqual(UserProfile.objects.get(user=self.member).organization.name, 'Globex')
+
+        again = self.join(self.member, 'Acme')
+        self.assertEqual(again['status'], OrganizationJoinRequest.STATUS_PENDING)
+        self.assertEqual(UserProfile.objects.get(user=self.member).organization.name, 'Globex')
+        self.decide(again, 'approve')
+        self.assertEqual(UserProfile.objects.get(user=self.member).organization.name, 'Acme')
+
+
+class AuditClientIpTests(TestCase):
+    def ip(self, forwarded, remote='10.0.0.2', proxies=()):
+        request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR=forwarded, REMOTE_ADDR=remote)
+        with override_settings(AUDIT_TRUST_X_FORWARDED_FOR=True):
+            return audit.client_ip(request, audit.parse_networks(proxies))
+
+    def test_takes_the_right_most_untrusted_hop(self):
+        self.assertEqual(self.ip('6.6.6.6, 1.2.3.4'), '1.2.3.4')
+        self.assertEqual(self.ip('6.6.6.6, 1.2.3.4, 10.1.1.1', proxies=['10.0.0.0/8']), '1.2.3.4')
+        self.assertEqual(self.ip('1.2.3.4, <script>'), '10.0.0.2')
+        self.assertIsNone(self.ip('', remote='bogus'))
+
+    def test_invalid_trusted_proxies_are_ignored(self):
+        with self.assertLogs('api.audit', 'ERROR'):
+            networks = audit.parse_networks(['10.0.0.0/8', 'not-a-network'])
+        self.assertEqual([str(network) for network in networks], ['10.0.0.0/8'])
+
+    def test_a_failing_audit_record_does_not_fail_login(self):
+        User.objects.create_user('audited', 'audited@example.com', 'password')
+        with mock.patch.object(audit, 'client_ip', side_effect=ValueError('boom')), \
+                self.assertLogs('api.audit', 'ERROR'):
+            response = self.client.post(
+                '/api/auth/login/', {'email': 'audited@example.com', 'password': 'password'},
+                content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+class ClusterIdeasTests(TestCase):
+    def test_compares_every_pair_sharing_a_bucket(self):
+        ideas = {
+            name: Idea.objects.create(title=name, signature=minhash.to_bytes(array('I', [tag] * minhash.NUM_PERM)))
+            for tag, name in enumerate(['a', 'b', 'c'], 1)
+        }
+        # a heads the shared bucket: it is loaded first (newest first)
+        Idea.objects.filter(pk=ideas['a'].pk).update(created_at=timezone.now() + timedelta(days=1))
+        similar = {frozenset([2, 3])}
+
+        def band_key(sig, band):
+            # All three share band 0; no other band collides
+            return 0 if band == 0 else (band, sig[0])
+
+        def similarity(sig_a, sig_b):
+            return 0.9 if frozenset([sig_a[0], sig_b[0]]) in similar else 0.1
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as output, \
+                mock.patch.object(minhash, 'band_key', side_effect=band_key), \
+                mock.patch.object(minhash, 'similarity', side_effect=similarity):
+            call_command('cluster_ideas', output=output.name, threshold=0.5, stdout=open(os.devnull, 'w'))
+            clusters = json.load(open(output.name))['clusters']
+        self.assertEqual(clusters, [[ideas['b'].pk, ideas['c'].pk]])
+
+
+class IdeaScopeTests(TestCase):
+    TEXT = 'Let users sign in with Face ID instead of typing their password every time'
+
+    def setUp(self):
+        self.users = {}
+        for username, organization in (('alice', 'Acme'), ('bob', 'Acme'), ('mallory', 'Globex'), ('solo', None)):
+            user = User.objects.create_user(username, f'{username}@example.com', 'password')
+            profile = UserProfile.objects.create(user=user)
+            if organization:
+                profile.organization, _ = Organization.resolve(organization, owner=user)
+                profile.save()
+            self.users[username] = user
+
+    def submit(self, username, title=TEXT):
+        self.client.force_login(self.users[username])
+        response = self.client.post('/api/ideas/', {'title': title}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['data']
+
+    def listed(self, username):
+        self.client.force_login(self.users[username])
+        return {idea['id'] for idea in self.client.get('/api/ideas/').json()['data']['ideas']}
+
+    def test_ideas_are_listed_and_matched_within_the_organization(self):
+        alice = self.submit('alice')['idea']['id']
+        mallory = self.submit('mallory')
+        solo = self.submit('solo')
+        self.assertEqual(mallory['duplicates'], [])
+        self.assertEqual(solo['duplicates'], [])
+
+        bob = self.submit('bob')
+        self.assertEqual([idea['id'] for idea in bob['duplicates']], [alice])
+        self.assertEqual(self.listed('alice'), {alice, bob['idea']['id']})
+        self.assertEqual(self.listed('mallory'), {mallory['idea']['id']})
+        self.assertEqual(self.listed('solo'), {solo['idea']['id']})
+
+        self.client.force_login(self.users['mallory'])
+        self.assertEqual(self.client.get(f'/api/ideas/{alice}/duplicates/').status_code, 404)
+        self.client.force_login(self.users['bob'])
+        duplicates = self.client.get(f'/api/ideas/{alice}/duplicates/').json()['data']['duplicates']
+        self.assertEqual([idea['id'] for idea in duplicates], [bob['idea']['id']])
+
+
+class ContentTemplateTests(TestCase):
+    def batch(self, template, **data):
+        return content.parse_batch(dict({
+            'personas': ['Engineer'], 'products': [{'name': 'Face ID', 'tags': ['auth']}],
+            'channels': ['custom'], 'templates': {'custom': template},
+        }, **data))
+
+    def test_only_the_safe_subset_compiles(self):
+        for template in (
+            '{% debug %}', '{% load static %}', '{% include "base.html" %}', '{% now "Y" %}',
+            '{{ product.name|ljust:"100000" }}', '{% if brief|center:"100000" %}{% endif %}',
+            '{% for a in product.tags %}{% for b in a %}{% for c in b %}{% endfor %}{% endfor %}{% endfor %}',
+            'x' * (settings.CONTENT_TEMPLATE_MAX_LENGTH + 1),
+        ):
+            with self.assertRaises(ValueError, msg=template[:60]):
+                self.batch(template)
+        for template in content.CHANNEL_TEMPLATES.values():
+            content.compile_template(template)
+
+    def test_request_lists_and_text_are_capped(self):
+        with self.assertRaises(ValueError):
+            self.batch('{{ product.name }}', products=[{'name': 'Face ID', 'tags': ['t'] * 1000}])
+        with self.assertRaises(ValueError):
+            self.batch('{{ product.name }}', products=[{'name': 'Face ID', 'features': ['f' * 100000]}])
+        with self.assertRaises(ValueError):
+            self.batch('{{ brief }}', brief='b' * (settings.CONTENT_MAX_BRIEF_LENGTH + 1))
+
+    def test_oversized_prompt_fails_the_variant(self):
+        tags = ['t'] * settings.CONTENT_MAX_LIST_ITEMS
+        batch = self.batch(
+            '{% for a in product.tags %}{% for b in product.tags %}{{ brief }}{% endfor %}{% endfor %}',
+            brief='b' * settings.CONTENT_MAX_BRIEF_LENGTH, products=[{'name': 'Face ID', 'tags': tags}]
+        )
+        [item] = content.generate_batch(batch, content.StubGenerator(0))
+        self.assertIn('longer than', item['error'])
+        self.assertIsNone(item['content'])
@@ -14,5 +14,44 @@ urlpatterns = [
     path('auth/forgot-password/', views.forgot_password_view, name='forgot_password'),
     path('auth/validate-reset-token/', views.validate_reset_token_view, name='validate_reset_token'),
     path('auth/reset-password/', views.reset_password_view, name='reset_password'),
+    path('auth/audit/', views.audit_events_view, name='audit_events'),
+    # Organization endpoints
+    path('organization/', views.organization_view, name='organization'),
+    path('organization/members/', views.organization_members_view, name='organization_members'),
+    path('organization/requests/', views.organization_requests_view, name='organization_requests'),
+    path('organization/requests/<int:request_id>/', views.organization_request_view, name='organization_request'),
+    path('organizations/', views.organizations_view, name='organizations'),
+    # Idea repository endpoints
+    path('ideas/', views.ideas_view, name='ideas'),
+    path('ideas/<int:idea_id>/duplicates/', views.idea_duplicates_view, name='idea_duplicates'),
+    # Workflow automation endpoints
+    path('workflows/', views.workflows_view, name='workflows'),
+    path('workflows/<int:workflow_id>/', views.workflow_detail_view, name='workflow_detail'),
+    path('workflows/<int:workflow_id>/run/', views.workflow_run_view, name='workflow_run'),
+    path('workflows/<int:workflow_id>/runs/', views.workflow_runs_view, name='workflow_runs'),
+    # PM daily briefing endpoints
+    path('briefing/', views.briefing_view, name='briefing'),
+    path('briefing/events/', views.briefing_events_view, name='briefing_events'),
+    # Persona derivation endpoints
+    path('personas/models/', views.persona_models_view, name='persona_models'),
+    path('personas/models/<int:model_id>/', views.persona_model_view, name='persona_model'),
+    # Competitor snapshot endpoints
+    path('competitors/', views.competitors_view, name='competitors'),
+    path('competitors/<int:competitor_id>/timeline/', views.competitor_timeline_view, name='competitor_timeline'),
+    path('competitors/<int:competitor_id>/diff/', views.competitor_diff_view, name='competitor_diff'),
+    path('competitors/<int:competitor_id>/snapshots/<int:snapshot_id>/', views.competitor_snapshot_view, name='competitor_snapshot'),
+    # PRD endpoints
+    path('prds/', views.prds_view, name='prds'),
+    path('prds/<int:prd_id>/', views.prd_view, name='prd'),
+    path('prds/<int:prd_id>/history/', views.prd_history_view, name='prd_history'),
+    path('prds/<int:prd_id>/diff/', views.prd_diff_view, name='prd_diff'),
+    # Content generation endpoints
+    path('content/templates/', views.content_templates_view, name='content_templates'),
+    path('content/generate/', views.content_generate_view, name='content_generate'),
+    # Dataset export endpoints
+    path('exports/jobs/', views.export_jobs_view, name='export_jobs'),
+    path('exports/jobs/<int:job_id>/', views.export_job_view, name='export_job'),
+    path('exports/jobs/<int:job_id>/download/', views.export_job_download_view, name='export_job_download'),
+    path('exports/<str:dataset>/', views.export_view, name='export'),
 ]
 
@@ -1,14 +1,22 @@
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.views.decorators.csrf import csrf_exempt
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
-from .models import UserProfile, PasswordResetToken
+from django.db import transaction
+from django.db.models import Count, Max
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import UserProfile, Organization, OrganizationJoinRequest, PasswordResetToken, Idea, Workflow, ChangeEvent, PersonaModel, ExportJob, AuthEvent, Competitor, Snapshot, PRD, PRDRevision
+from . import audit, briefings, content, exports, prds, snapshots, workflows
 import json
 
 @api_view(['GET'])
@@ -72,6 +80,7 @@ def signup_view(request):
         
         # Log the user in
         login(request, user)
+        audit.record(AuthEvent.SIGNUP, request, user=user)
         
         return Response({
             'data': {
@@ -112,20 +121,24 @@ def login_view(request):
         try:
             user = User.objects.get(email=email)
         except User.DoesNotExist:
+            audit.record(AuthEvent.LOGIN_FAILED, request, email=email)
             return Response({
                 'error': 'Invalid email or password'
             }, status=status.HTTP_401_UNAUTHORIZED)
         
         # Authenticate user
+        account = user
         user = authenticate(request, username=user.username, password=password)
         
         if user is None:
+            audit.record(AuthEvent.LOGIN_FAILED, request, user=account, email=email)
             return Response({
                 'error': 'Invalid email or password'
             }, status=status.HTTP_401_UNAUTHORIZED)
         
         # Log the user in
         login(request, user)
+        audit.record(AuthEvent.LOGIN_SUCCEEDED, request, user=user)
         
         # Get or create user profile
         profile, created = UserProfile.objects.get_or_create(user=user)
@@ -158,6 +171,7 @@ def logout_view(request):
     Logout the current user
     """
     try:
+        audit.record(AuthEvent.LOGOUT, request, user=request.user)
         logout(request)
         return Response({
             'data': {
@@ -169,6 +183,49 @@ def logout_view(request):
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def serialize_organization(organization):
+    if organization is None:
+        return None
+    return {
+        'id': organization.id,
+        'name': organization.name,
+        'industry': organization.industry
+    }
+
+def assign_organization(profile, name, industry=''):
+    """
+    Point a profile at the organization named in its preferences. A new name
+    creates the organization with this user as owner; joining an existing one
+    files a join request for its owner to approve instead. Returns the
+    pending request, if any. Does not save the profile.
+    """
+    organization, created = Organization.resolve(name, industry, owner=profile.user)
+    if organization is None or created:
+        profile.organization = organization
+        return None
+    if organization.id == profile.organization_id:
+        return None
+    join_request, created = OrganizationJoinRequest.objects.get_or_create(organization=organization, user=profile.user)
+    if not created and join_request.status != OrganizationJoinRequest.STATUS_PENDING:
+        # Declined before, or approved and since moved elsewhere: reopen the
+        # request for the owner to decide again
+        join_request.status = OrganizationJoinRequest.STATUS_PENDING
+        join_request.decided_by = None
+        join_request.decided_at = None
+        join_request.created_at = timezone.now()
+        join_request.save(update_fields=['status', 'decided_by', 'decided_at', 'created_at'])
+    return join_request
+
+def serialize_join_request(join_request):
+    if join_request is None:
+        return None
+    return {
+        'id': join_request.id,
+        'organization': join_request.organization.name,
+        'status': join_request.status,
+        'created_at': join_request.created_at.isoformat()
+    }
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_view(request):
@@ -177,7 +234,7 @@ def user_view(request):
     """
     try:
         user = request.user
-        profile, created = UserProfile.objects.get_or_create(user=user)
+        profile, created = UserProfile.objects.select_related('organization').get_or_create(user=user)
         
         return Response({
             'data': {
@@ -188,6 +245,7 @@ def user_view(request):
                     'first_name': user.first_name,
                     'last_name': user.last_name,
                     'preferences': profile.preferences,
+                    'organization': serialize_organization(profile.organization),
                     'onboarding_completed': profile.onboarding_completed,
                     'onboarding_data': profile.onboarding_data
                 }
@@ -209,7 +267,14 @@ def update_preferences_view(request):
         profile, created = UserProfile.objects.get_or_create(user=user)
         
         preferences = request.data.get('preferences', {})
+        join_request = None
         if preferences:
+            if 'organizationName' in preferences:
+                join_request = assign_organization(
+                    profile,
+                    preferences['organizationName'],
+                    preferences.get('industry') or profile.get_preference('industry', '')
+                )
             profile.update_preferences(preferences)
         
         return Response({
@@ -221,6 +286,8 @@ def update_preferences_view(request):
                     'first_name': user.first_name,
                     'last_name': user.last_name,
                     'preferences': profile.preferences,
+                    'organization': serialize_organization(profile.organization),
+                    'organization_request': serialize_join_request(join_request),
                     'onboarding_completed': profile.onboarding_completed
                 },
                 'message': 'Preferences updated successfully'
@@ -246,12 +313,14 @@ def complete_onboarding_view(request):
         profile.onboarding_completed = True
         
         # Also save onboarding data as preferences for easy access
+        join_request = None
         if onboarding_data:
             # Extract preferences from onboarding data
             preferences = {
                 'organizationName': onboarding_data.get('organizationName', ''),
                 'industry': onboarding_data.get('industry', '')
             }
+            join_request = assign_organization(profile, preferences['organizationName'], preferences['industry'])
             profile.update_preferences(preferences)
         
         profile.save()
@@ -265,6 +334,8 @@ def complete_onboarding_view(request):
                     'first_name': user.first_name,
                     'last_name': user.last_name,
                     'preferences': profile.preferences,
+                    'organization': serialize_organization(profile.organization),
+                    'organization_request': serialize_join_request(join_request),
                     'onboarding_completed': profile.onboarding_completed,
                     'onboarding_data': profile.onboarding_data
                 },
@@ -294,6 +365,7 @@ def forgot_password_view(request):
         try:
             user = User.objects.get(email=email)
         except User.DoesNotExist:
+            audit.record(AuthEvent.PASSWORD_RESET_REQUESTED, request, email=email)
             # Don't reveal if email exists or not (security best practice)
             return Response({
                 'data': {
@@ -301,6 +373,8 @@ def forgot_password_view(request):
                 }
             }, status=status.HTTP_200_OK)
         
+        audit.record(AuthEvent.PASSWORD_RESET_REQUESTED, request, user=user)
+        
         # Generate password reset token
         reset_token = PasswordResetToken.generate_token(user)
         
@@ -416,6 +490,7 @@ def reset_password_view(request):
         
         # Mark token as used
         reset_token.mark_as_used()
+        audit.record(AuthEvent.PASSWORD_RESET, request, user=user)
         
         return Response({
             'data': {
@@ -427,3 +502,1290 @@ def reset_password_view(request):
         return Response({
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def serialize_idea(idea):
+    return {
+        'id': idea.id,
+        'title': idea.title,
+        'description': idea.description,
+        'source': idea.source,
+        'author': idea.author,
+        'impact': idea.impact,
+        'effort': idea.effort,
+        'created_at': idea.created_at.isoformat(),
+    }
+
+def serialize_duplicates(matches):
+    return [
+        dict(serialize_idea(idea), similarity=round(score, 3))
+        for idea, score in matches
+    ]
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def ideas_view(request):
+    """
+    List ideas, or submit a new idea and get back its likely duplicates.
+    Only ideas from the user's organization (or their own, without one) are
+    listed or matched.
+    """
+    try:
+        if request.method == 'GET':
+            limit = min(int(request.query_params.get('limit', 50)), 500)
+            offset = int(request.query_params.get('offset', 0))
+            ideas = Idea.visible_to(request.user)[offset:offset + limit]
+            return Response({
+                'data': {
+                    'ideas': [serialize_idea(idea) for idea in ideas]
+                }
+            }, status=status.HTTP_200_OK)
+        
+        title = (request.data.get('title') or '').strip()
+        if not title:
+            return Response({
+                'error': 'Title is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        user = request.user
+        idea = Idea.objects.create(
+            title=title,
+            description=request.data.get('description', ''),
+            source=request.data.get('source', ''),
+            author=request.data.get('author') or user.get_full_name() or user.username,
+            impact=request.data.get('impact', ''),
+            effort=request.data.get('effort', ''),
+            created_by=user
+        )
+        idea.index()
+        
+        return Response({
+            'data': {
+                'idea': serialize_idea(idea),
+                'duplicates': serialize_duplicates(idea.find_duplicates(ideas=Idea.visible_to(user))),
+                'message': 'Idea submitted successfully'
+            }
+        }, status=status.HTTP_201_CREATED)
+    except ValueError:
+        return Response({
+            'error': 'limit and offset must be integers'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def idea_duplicates_view(request, idea_id):
+    """
+    Get likely duplicates of an existing idea
+    """
+    try:
+        ideas = Idea.visible_to(request.user)
+        try:
+            idea = ideas.get(pk=idea_id)
+        except Idea.DoesNotExist:
+            return Response({
+                'error': 'Idea not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response({
+            'data': {
+                'idea': serialize_idea(idea),
+                'duplicates': serialize_duplicates(idea.find_duplicates(ideas=ideas))
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def serialize_workflow(workflow):
+    return {
+        'id': workflow.id,
+        'name': workflow.name,
+        'trigger': workflow.trigger,
+        'schedule': workflow.schedule,
+        'next_run_at': workflow.next_run_at.isoformat() if workflow.next_run_at else None,
+        'steps': workflow.steps,
+        'status': workflow.status,
+        'runs': workflow.runs,
+        'max_concurrency': workflow.max_concurrency,
+        'max_attempts': workflow.max_attempts,
+        'created_at': workflow.created_at.isoformat(),
+        'updated_at': workflow.updated_at.isoformat(),
+    }
+
+def apply_workflow_changes(workflow, data):
+    """Copy editable fields from request data onto a workflow, validating them"""
+    for field in ('name', 'trigger'):
+        if field in data:
+            setattr(workflow, field, data[field] or '')
+    if 'steps' in data:
+        workflow.steps = workflows.normalize_steps(data['steps'])
+    if 'status' in data:
+        if data['status'] not in dict(Workflow.STATUS_CHOICES):
+            raise ValueError(f"Invalid status '{data['status']}'")
+        workflow.status = data['status']
+    for field in ('max_concurrency', 'max_attempts'):
+        if field in data:
+            value = int(data[field])
+            if value < 1:
+                raise ValueError(f'{field} must be at least 1')
+            setattr(workflow, field, value)
+    if 'schedule' in data:
+        workflow.schedule = (data['schedule'] or '').strip()
+        workflows.schedule_workflow(workflow)
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def workflows_view(request):
+    """
+    List the current user's workflows, or create a new one
+    """
+    try:
+        if request.method == 'GET':
+            return Response({
+                'data': {
+                    'workflows': [
+                        serialize_workflow(workflow)
+                        for workflow in Workflow.objects.filter(owner=request.user)
+                    ]
+                }
+            }, status=status.HTTP_200_OK)
+        
+        if not request.data.get('name'):
+            return Response({
+                'error': 'Name is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        workflow = Workflow(owner=request.user)
+        try:
+            apply_workflow_changes(workflow, request.data)
+        except (TypeError, ValueError) as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        workflow.save()
+        
+        return Response({
+            'data': {
+                'workflow': serialize_workflow(workflow),
+                'message': 'Workflow created successfully'
+            }
+        }, status=status.HTTP_201_CREATED)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET', 'PATCH', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def workflow_detail_view(request, workflow_id):
+    """
+    Get, update (e.g. pause/resume) or delete a workflow
+    """
+    try:
+        try:
+            workflow = Workflow.objects.get(pk=workflow_id, owner=request.user)
+        except Workflow.DoesNotExist:
+            return Response({
+                'error': 'Workflow not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        if request.method == 'DELETE':
+            workflow.delete()
+            return Response({
+                'data': {
+                    'message': 'Workflow deleted successfully'
+                }
+            }, status=status.HTTP_200_OK)
+        
+        if request.method == 'PATCH':
+            try:
+                apply_workflow_changes(workflow, request.data)
+            except (TypeError, ValueError) as e:
+                return Response({
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            workflow.save()
+        
+        return Response({
+            'data': {
+                'workflow': serialize_workflow(workflow)
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def workflow_run_view(request, workflow_id):
+    """
+    Queue a manual run of a workflow
+    """
+    try:
+        try:
+            workflow = Workflow.objects.get(pk=workflow_id, owner=request.user)
+        except Workflow.DoesNotExist:
+            return Response({
+                'error': 'Workflow not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        if workflow.status != Workflow.STATUS_ACTIVE:
+            return Response({
+                'error': 'Workflow is paused'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        job = workflow.enqueue()
+        return Response({
+            'data': {
+                'job': {
+                    'id': job.id,
+                    'status': job.status,
+                    'run_at': job.run_at.isoformat()
+                },
+                'message': 'Workflow run queued'
+            }
+        }, status=status.HTTP_202_ACCEPTED)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def workflow_runs_view(request, workflow_id):
+    """
+    Get the run history of a workflow, with per-step timings
+    """
+    try:
+        try:
+            workflow = Workflow.objects.get(pk=workflow_id, owner=request.user)
+        except Workflow.DoesNotExist:
+            return Response({
+                'error': 'Workflow not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        limit = min(int(request.query_params.get('limit', 20)), 100)
+        runs = workflow.run_history.prefetch_related('steps')[:limit]
+        
+        return Response({
+            'data': {
+                'runs': [
+                    {
+                        'id': run.id,
+                        'job_id': run.job_id,
+                        'attempt': run.attempt,
+                        'status': run.status,
+                        'worker': run.worker,
+                        'started_at': run.started_at.isoformat(),
+                        'finished_at': run.finished_at.isoformat() if run.finished_at else None,
+                        'duration_ms': run.duration_ms,
+                        'error': run.error,
+                        'steps': [
+                            {
+                                'position': step.position,
+                                'name': step.name,
+                                'action': step.action,
+                                'status': step.status,
+                                'duration_ms': step.duration_ms,
+                                'error': step.error
+                            }
+                            for step in run.steps.all()
+                        ]
+                    }
+                    for run in runs
+                ]
+            }
+        }, status=status.HTTP_200_OK)
+    except ValueError:
+        return Response({
+            'error': 'limit must be an integer'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def briefing_view(request):
+    """
+    Get the current user's materialized daily briefing
+    """
+    try:
+        briefing = briefings.get_briefing(request.user)
+        return Response({
+            'data': {
+                'briefing': briefing.document,
+                'as_of': briefing.refreshed_at.isoformat()
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def briefing_events_view(request):
+    """
+    Record a change event (alert or sentiment signal) for the current user's briefing
+    """
+    try:
+        kind = request.data.get('kind')
+        payload = request.data.get('payload') or {}
+        if kind not in dict(ChangeEvent.KIND_CHOICES):
+            return Response({
+                'error': f"kind must be one of: {', '.join(dict(ChangeEvent.KIND_CHOICES))}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            payload = ChangeEvent.clean_payload(kind, payload)
+            event = ChangeEvent.record(request.user, kind, source=request.data.get('source') or '', **payload)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'data': {
+                'event_id': event.id,
+                'message': 'Event recorded'
+            }
+        }, status=status.HTTP_201_CREATED)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+# Larger record sets should be streamed with `manage.py derive_personas`
+MAX_PERSONA_RECORDS_PER_REQUEST = 50000
+
+def serialize_persona_model(model, deriver=None):
+    deriver = deriver or model.get_deriver()
+    return {
+        'id': model.id,
+        'name': model.name,
+        'k': model.k,
+        'n_samples': model.n_samples,
+        'personas': deriver.personas() if model.n_samples else [],
+        'created_at': model.created_at.isoformat(),
+        'updated_at': model.updated_at.isoformat(),
+    }
+
+def get_persona_records(request):
+    records = request.data.get('records')
+    if not isinstance(records, list) or not records:
+        raise ValueError('records must be a non-empty list of customer attribute objects')
+    if len(records) > MAX_PERSONA_RECORDS_PER_REQUEST:
+        raise ValueError(f'At most {MAX_PERSONA_RECORDS_PER_REQUEST} records can be sent per request')
+    if not all(isinstance(record, dict) for record in records):
+        raise ValueError('Each record must be an object')
+    return records
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def persona_models_view(request):
+    """
+    List persona models, or derive a new one from customer attribute records
+    """
+    try:
+        if request.method == 'GET':
+            return Response({
+                'data': {
+                    'models': [
+                        serialize_persona_model(model)
+                        for model in PersonaModel.objects.filter(owner=request.user)
+                    ]
+                }
+            }, status=status.HTTP_200_OK)
+        
+        try:
+            records = get_persona_records(request)
+            k = int(request.data.get('k', 4))
+            if not 1 <= k <= 20:
+                raise ValueError('k must be between 1 and 20')
+            model = PersonaModel(owner=request.user, name=request.data.get('name') or 'Personas', k=k)
+            deriver = model.get_deriver()
+            deriver.partial_fit(records)
+        except (TypeError, ValueError) as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        model.save_deriver(deriver)
+        
+        return Response({
+            'data': {
+                'model': serialize_persona_model(model, deriver),
+                'message': 'Personas derived successfully'
+            }
+        }, status=status.HTTP_201_CREATED)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def persona_model_view(request, model_id):
+    """
+    Get a persona model, or fold new customer records into it incrementally
+    """
+    try:
+        try:
+            model = PersonaModel.objects.get(pk=model_id, owner=request.user)
+        except PersonaModel.DoesNotExist:
+            return Response({
+                'error': 'Persona model not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        deriver = model.get_deriver()
+        if request.method == 'POST':
+            try:
+                deriver.partial_fit(get_persona_records(request))
+            except (TypeError, ValueError) as e:
+                return Response({
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            model.save_deriver(deriver)
+        
+        return Response({
+            'data': {
+                'model': serialize_persona_model(model, deriver)
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+async def iterate_async(iterator):
+    """
+    Pull blocks from a sync iterator one at a time off the event loop. Given
+    a sync iterator, Django's ASGI handler reads the whole response into a
+    list before sending the first byte.
+    """
+    done = object()
+    pull = sync_to_async(next)
+    try:
+        while True:
+            block = await pull(iterator, done)
+            if block is done:
+                return
+            yield block
+    finally:
+        # Release the cursor or pool work if the client goes away mid-stream
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close)()
+
+def streaming_response(request, iterator, content_type):
+    """Stream a sync iterator of blocks incrementally under both WSGI and ASGI"""
+    if isinstance(request._request, ASGIRequest):
+        return StreamingHttpResponse(iterate_async(iter(iterator)), content_type=content_type)
+    return StreamingHttpResponse(iterator, content_type=content_type)
+
+def get_export_options(params):
+    file_format = params.get('type', 'csv')
+    if file_format not in exports.FORMATS:
+        raise ValueError(f"type must be one of: {', '.join(exports.FORMATS)}")
+    compress = str(params.get('gzip', '')).lower() in ('1', 'true', 'yes')
+    return file_format, compress
+
+def serialize_export_job(job):
+    return {
+        'id': job.id,
+        'dataset': job.dataset,
+        'type': job.file_format,
+        'gzip': job.compress,
+        'status': job.status,
+        'rows_written': job.rows_written,
+        'bytes_written': job.bytes_written,
+        'file_name': job.file_name,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_view(request, dataset):
+    """
+    Stream a dataset export as CSV or JSON Lines (?type=csv|jsonl), optionally
+    gzip-compressed (?gzip=1). Pass ?after=<id> to resume an interrupted
+    download after the last row received.
+    """
+    try:
+        dataset = exports.get_dataset(dataset)
+    except ValueError as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        file_format, compress = get_export_options(request.query_params)
+        after_id = int(request.query_params.get('after', 0))
+    except ValueError as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    file_name = f"{dataset.name}.{file_format}" + ('.gz' if compress else '')
+    response = streaming_response(
+        request,
+        exports.stream_export(dataset, request.user, file_format, compress, after_id),
+        'application/gzip' if compress else exports.FORMATS[file_format]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+    return response
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def export_jobs_view(request):
+    """
+    List export jobs, or queue a resumable export of a large dataset to a file
+    """
+    try:
+        if request.method == 'GET':
+            return Response({
+                'data': {
+                    'jobs': [
+                        serialize_export_job(job)
+                        for job in ExportJob.objects.filter(owner=request.user)[:50]
+                    ]
+                }
+            }, status=status.HTTP_200_OK)
+        
+        try:
+            file_format, compress = get_export_options(request.data)
+            job = exports.create_job(request.user, request.data.get('dataset', ''), file_format, compress)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'data': {
+                'job': serialize_export_job(job),
+                'message': 'Export queued'
+            }
+        }, status=status.HTTP_202_ACCEPTED)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_job_view(request, job_id):
+    """
+    Get the progress of an export job
+    """
+    try:
+        job = ExportJob.objects.get(pk=job_id, owner=request.user)
+    except ExportJob.DoesNotExist:
+        return Response({
+            'error': 'Export not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'data': {
+            'job': serialize_export_job(job)
+        }
+    }, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_job_download_view(request, job_id):
+    """
+    Download the file written by a finished export job
+    """
+    try:
+        job = ExportJob.objects.get(pk=job_id, owner=request.user)
+    except ExportJob.DoesNotExist:
+        return Response({
+            'error': 'Export not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    if job.status != ExportJob.STATUS_SUCCEEDED:
+        return Response({
+            'error': 'Export has not finished yet'
+        }, status=status.HTTP_409_CONFLICT)
+    
+    path = exports.export_path(job)
+    if not path.exists():
+        return Response({
+            'error': 'Export file is no longer available'
+        }, status=status.HTTP_410_GONE)
+    
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=job.file_name)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def audit_events_view(request):
+    """
+    Query the authentication audit log, newest first. Filters: since/until
+    (ISO 8601), event, and for staff also user_id and ip. Other users only
+    see their own events.
+    
+    Events are written behind by each worker process, so the newest ones can
+    take up to AUDIT_FLUSH_INTERVAL seconds to appear.
+    """
+    try:
+        params = request.query_params
+        filters = {}
+        for name in ('since', 'until'):
+            if params.get(name):
+                filters[name] = parse_datetime(params[name])
+                if filters[name] is None:
+                    raise ValueError(f'{name} must be an ISO 8601 datetime')
+        if request.user.is_staff:
+            if params.get('user_id'):
+                filters['user_id'] = int(params['user_id'])
+            filters['ip'] = params.get('ip')
+        else:
+            filters['user_id'] = request.user.id
+        limit = min(int(params.get('limit', 100)), 1000)
+    except ValueError as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        events = audit.query(event=params.get('event'), limit=limit, **filters)
+        return Response({
+            'data': {
+                'events': [
+                    {
+                        'id': event.id,
+                        'event': event.event,
+                        'user_id': event.user_id,
+                        'email': event.email,
+                        'ip': event.ip,
+                        'user_agent': event.user_agent,
+                        'created_at': event.created_at.isoformat()
+                    }
+                    for event in events
+                ],
+                'buffer': audit.get_buffer().stats() if request.user.is_staff else None
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def get_organization(request):
+    return Organization.objects.filter(members__user=request.user).first()
+
+@api_view(['GET', 'PATCH'])
+@permission_classes([IsAuthenticated])
+def organization_view(request):
+    """
+    Get the current user's organization and its member count. Its owner can
+    change the industry with PATCH.
+    """
+    try:
+        organization = get_organization(request)
+        if organization is None:
+            return Response({
+                'error': 'You do not belong to an organization'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        if request.method == 'PATCH':
+            if not organization.can_manage(request.user):
+                return Response({
+                    'error': 'Only the organization owner can change it'
+                }, status=status.HTTP_403_FORBIDDEN)
+            if 'industry' in request.data:
+                organization.industry = str(request.data.get('industry') or '')[:100]
+                organization.save(update_fields=['industry', 'updated_at'])
+        
+        data = serialize_organization(organization)
+        data['member_count'] = UserProfile.objects.filter(organization=organization).count()
+        data['is_owner'] = organization.owner_id == request.user.id
+        return Response({
+            'data': {
+                'organization': data
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def organization_members_view(request):
+    """
+    List members of the current user's organization in user id order. Pass
+    the returned next_after as ?after= to fetch the next page. Email
+    addresses are only shown to the organization's owner.
+    """
+    try:
+        organization = get_organization(request)
+        if organization is None:
+            return Response({
+                'error': 'You do not belong to an organization'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            after = int(request.query_params.get('after', 0))
+            limit = min(int(request.query_params.get('limit', 50)), 500)
+        except ValueError:
+            return Response({
+                'error': 'after and limit must be integers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Keyset pagination over the (organization, user) index
+        members = list(
+            UserProfile.objects.filter(organization=organization, user_id__gt=after)
+            .order_by('user_id')
+            .values_list('user_id', 'user__email', 'user__first_name', 'user__last_name')[:limit]
+        )
+        show_email = organization.can_manage(request.user)
+        return Response({
+            'data': {
+                'members': [
+                    {
+                        'id': user_id,
+                        'email': email if show_email else None,
+                        'first_name': first_name,
+                        'last_name': last_name
+                    }
+                    for user_id, email, first_name, last_name in members
+                ],
+                'next_after': members[-1][0] if len(members) == limit else None
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def organization_requests_view(request):
+    """
+    List pending requests to join the current user's organization (owner only)
+    """
+    try:
+        organization = get_organization(request)
+        if organization is None or not organization.can_manage(request.user):
+            return Response({
+                'error': 'Only the organization owner can see join requests'
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        join_requests = OrganizationJoinRequest.objects.filter(
+            organization=organization, status=OrganizationJoinRequest.STATUS_PENDING
+        ).select_related('user')[:500]
+        return Response({
+            'data': {
+                'requests': [
+                    {
+                        'id': join_request.id,
+                        'user': {
+                            'id': join_request.user.id,
+                            'email': join_request.user.email,
+                            'first_name': join_request.user.first_name,
+                            'last_name': join_request.user.last_name
+                        },
+                        'created_at': join_request.created_at.isoformat()
+                    }
+                    for join_request in join_requests
+                ]
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def organization_request_view(request, request_id):
+    """
+    Approve or decline a join request ({"action": "approve" | "decline"}).
+    Allowed for the organization's owner, or staff.
+    """
+    try:
+        join_request = OrganizationJoinRequest.objects.select_related('organization').filter(
+            pk=request_id, status=OrganizationJoinRequest.STATUS_PENDING
+        ).first()
+        if join_request is None or not join_request.organization.can_manage(request.user):
+            return Response({
+                'error': 'Join request not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        action = request.data.get('action')
+        if action not in ('approve', 'decline'):
+            return Response({
+                'error': "action must be 'approve' or 'decline'"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        with transaction.atomic():
+            join_request.status = (
+                OrganizationJoinRequest.STATUS_APPROVED if action == 'approve'
+                else OrganizationJoinRequest.STATUS_DECLINED
+            )
+            join_request.decided_by = request.user
+            join_request.decided_at = timezone.now()
+            join_request.save(update_fields=['status', 'decided_by', 'decided_at'])
+            if action == 'approve':
+                profile, _ = UserProfile.objects.get_or_create(user_id=join_request.user_id)
+                profile.organization = join_request.organization
+                profile.save(update_fields=['organization', 'updated_at'])
+        
+        return Response({
+            'data': {
+                'request': serialize_join_request(join_request)
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def organizations_view(request):
+    """
+    List organizations, optionally filtered by ?industry=, with member counts
+    """
+    try:
+        organizations = Organization.objects.all()
+        industry = request.query_params.get('industry')
+        if industry:
+            organizations = organizations.filter(industry=industry)
+        organizations = list(organizations[:min(int(request.query_params.get('limit', 100)), 1000)])
+        counts = dict(
+            UserProfile.objects.filter(organization__in=organizations)
+            .values('organization_id')
+            .annotate(count=Count('id'))
+            .values_list('organization_id', 'count')
+        )
+        return Response({
+            'data': {
+                'organizations': [
+                    dict(serialize_organization(organization), member_count=counts.get(organization.id, 0))
+                    for organization in organizations
+                ]
+            }
+        }, status=status.HTTP_200_OK)
+    except ValueError:
+        return Response({
+            'error': 'limit must be an integer'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def get_competitor(request, competitor_id):
+    return Competitor.objects.filter(pk=competitor_id, owner=request.user).first()
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def competitors_view(request):
+    """
+    List tracked competitors with their version counts, or add a competitor
+    """
+    try:
+        if request.method == 'GET':
+            competitors = Competitor.objects.filter(owner=request.user).annotate(
+                versions=Count('snapshots'), last_changed_at=Max('snapshots__captured_at')
+            )
+            return Response({
+                'data': {
+                    'competitors': [
+                        {
+                            'id': competitor.id,
+                            'name': competitor.name,
+                            'versions': competitor.versions,
+                            'last_changed_at': competitor.last_changed_at.isoformat() if competitor.last_changed_at else None
+                        }
+                        for competitor in competitors
+                    ]
+                }
+            }, status=status.HTTP_200_OK)
+        
+        name = (request.data.get('name') or '').strip()
+        if not name:
+            return Response({
+                'error': 'Name is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        competitor, created = Competitor.objects.get_or_create(owner=request.user, name=name)
+        return Response({
+            'data': {
+                'competitor': {
+                    'id': competitor.id,
+                    'name': competitor.name
+                }
+            }
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def competitor_timeline_view(request, competitor_id):
+    """
+    Get a competitor's change timeline, newest first. Filters: source,
+    since/until (ISO 8601), limit.
+    """
+    try:
+        competitor = get_competitor(request, competitor_id)
+        if competitor is None:
+            return Response({
+                'error': 'Competitor not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        params = request.query_params
+        try:
+            filters = {}
+            for name in ('since', 'until'):
+                if params.get(name):
+                    filters[name] = parse_datetime(params[name])
+                    if filters[name] is None:
+                        raise ValueError(f'{name} must be an ISO 8601 datetime')
+            limit = min(int(params.get('limit', 50)), 500)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        versions = snapshots.timeline(competitor, source=params.get('source'), limit=limit, **filters)
+        return Response({
+            'data': {
+                'competitor': competitor.name,
+                'timeline': [
+                    dict(
+                        version,
+                        captured_at=version['captured_at'].isoformat(),
+                        last_seen_at=version['last_seen_at'].isoformat()
+                    )
+                    for version in versions
+                ]
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def competitor_diff_view(request, competitor_id):
+    """
+    Diff two versions of a competitor source (?from=<id>&to=<id>). Without
+    from, the version is compared with the one before it; without to, the
+    latest version is used.
+    """
+    try:
+        competitor = get_competitor(request, competitor_id)
+        if competitor is None:
+            return Response({
+                'error': 'Competitor not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        versions = Snapshot.objects.filter(competitor=competitor).select_related('blob').defer('blob__data')
+        try:
+            if request.query_params.get('to'):
+                new = versions.get(pk=int(request.query_params['to']))
+            else:
+                new = versions.order_by('-captured_at', '-id').first()
+            if request.query_params.get('from'):
+                old = versions.get(pk=int(request.query_params['from']))
+            else:
+                old = versions.get(pk=new.previous_id) if new and new.previous_id else None
+        except (ValueError, Snapshot.DoesNotExist):
+            return Response({
+                'error': 'Snapshot not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        if old is None or new is None:
+            return Response({
+                'error': 'At least two versions are needed to compute a diff'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'data': {
+                'from': old.id,
+                'to': new.id,
+                'diff': snapshots.get_diff(old.blob, new.blob)
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def competitor_snapshot_view(request, competitor_id, snapshot_id):
+    """
+    Get the captured content of one version
+    """
+    try:
+        snapshot = Snapshot.objects.select_related('blob').defer('blob__data').filter(
+            pk=snapshot_id, competitor_id=competitor_id, competitor__owner=request.user
+        ).first()
+        if snapshot is None:
+            return Response({
+                'error': 'Snapshot not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        content = snapshots.read_blob(snapshot.blob)
+        if snapshot.blob.content_type == snapshots.TYPE_JSON:
+            content = json.loads(content)
+        else:
+            content = content.decode('utf-8', errors='replace')
+        return Response({
+            'data': {
+                'id': snapshot.id,
+                'source': snapshot.source,
+                'type': snapshot.blob.content_type,
+                'captured_at': snapshot.captured_at.isoformat(),
+                'last_seen_at': snapshot.last_seen_at.isoformat(),
+                'content': content
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def content_templates_view(request):
+    """
+    List the built-in channel templates and tones for batch generation
+    """
+    return Response({
+        'data': {
+            'channels': content.CHANNEL_TEMPLATES,
+            'tones': content.TONES,
+            'max_variants': settings.CONTENT_MAX_VARIANTS
+        }
+    }, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def content_generate_view(request):
+    """
+    Generate every persona x channel x product variant and stream the results
+    as JSON Lines in completion order, followed by a summary line
+    """
+    try:
+        batch = content.parse_batch(request.data)
+    except ValueError as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    response = streaming_response(request, content.stream_batch(batch), 'application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def serialize_prd(prd, document=None, version=None):
+    return {
+        'id': prd.id,
+        'title': prd.title,
+        'version': version or prd.version,
+        'latest_version': prd.version,
+        'document': prd.document if document is None else document,
+        'created_at': prd.created_at.isoformat(),
+        'updated_at': prd.updated_at.isoformat()
+    }
+
+def get_prd(request, prd_id):
+    return PRD.objects.filter(pk=prd_id, owner=request.user).first()
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def prds_view(request):
+    """
+    List the user's PRDs, or create one from a document of sections
+    """
+    try:
+        if request.method == 'GET':
+            documents = PRD.objects.filter(owner=request.user).values('id', 'title', 'version', 'updated_at')
+            return Response({
+                'data': {
+                    'prds': [
+                        dict(prd, updated_at=prd['updated_at'].isoformat())
+                        for prd in documents
+                    ]
+                }
+            }, status=status.HTTP_200_OK)
+        
+        title = (request.data.get('title') or '').strip()
+        if not title:
+            return Response({
+                'error': 'Title is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            prd = prds.create(request.user, title[:255], request.data.get('document') or {})
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'data': {
+                'prd': serialize_prd(prd)
+            }
+        }, status=status.HTTP_201_CREATED)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def prd_view(request, prd_id):
+    """
+    Get a PRD (?version=<n> for an earlier version), save a new version, or
+    delete it. Saves send the document, the base_version it was edited from,
+    and autosave: true for editor autosaves, which are coalesced.
+    """
+    try:
+        prd = get_prd(request, prd_id)
+        if prd is None:
+            return Response({
+                'error': 'PRD not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        if request.method == 'GET':
+            try:
+                version = int(request.query_params.get('version') or prd.version)
+                document = prds.document_at(prd, version)
+            except (ValueError, PRDRevision.DoesNotExist):
+                return Response({
+                    'error': 'Version not found'
+                }, status=status.HTTP_404_NOT_FOUND)
+            return Response({
+                'data': {
+                    'prd': serialize_prd(prd, document, version)
+                }
+            }, status=status.HTTP_200_OK)
+        
+        if request.method == 'DELETE':
+            prd.delete()
+            return Response({
+                'data': {
+                    'message': 'PRD deleted'
+                }
+            }, status=status.HTTP_200_OK)
+        
+        title = request.data.get('title')
+        base_version = request.data.get('base_version')
+        try:
+            if base_version is not None:
+                base_version = int(base_version)
+            version, outcome = prds.save(
+                prd,
+                request.data.get('document'),
+                author=request.user,
+                base_version=base_version,
+                autosave=bool(request.data.get('autosave')),
+                title=title.strip()[:255] if isinstance(title, str) and title.strip() else None
+            )
+        except prds.VersionConflict as e:
+            return Response({
+                'error': str(e),
+                'latest_version': PRD.objects.values_list('version', flat=True).get(pk=prd.pk)
+            }, status=status.HTTP_409_CONFLICT)
+        except (TypeError, ValueError) as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'data': {
+                'version': version,
+                'outcome': outcome,
+                'updated_at': prd.updated_at.isoformat()
+            }
+        }, status=status.HTTP_201_CREATED if outcome == prds.CREATED else status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def prd_history_view(request, prd_id):
+    """
+    Get a PRD's revisions, newest first (?before=<version>&limit=<n>)
+    """
+    try:
+        prd = get_prd(request, prd_id)
+        if prd is None:
+            return Response({
+                'error': 'PRD not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            before = int(request.query_params['before']) if request.query_params.get('before') else None
+            limit = min(int(request.query_params.get('limit', 50)), 500)
+        except ValueError:
+            return Response({
+                'error': 'before and limit must be integers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        revisions = list(prds.history(prd, before=before, limit=limit))
+        return Response({
+            'data': {
+                'revisions': [
+                    dict(
+                        revision,
+                        created_at=revision['created_at'].isoformat(),
+                        saved_at=revision['saved_at'].isoformat()
+                    )
+                    for revision in revisions
+                ],
+                'next_before': revisions[-1]['version'] if len(revisions) == limit else None
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def prd_diff_view(request, prd_id):
+    """
+    Section-level diff between two versions of a PRD (?from=<n>&to=<n>).
+    Without to, the latest version is used; without from, the one before it.
+    """
+    try:
+        prd = get_prd(request, prd_id)
+        if prd is None:
+            return Response({
+                'error': 'PRD not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            new_version = int(request.query_params.get('to') or prd.version)
+            old_version = int(request.query_params.get('from') or new_version - 1)
+            diff = prds.diff_versions(prd, old_version, new_version)
+        except (ValueError, PRDRevision.DoesNotExist):
+            return Response({
+                'error': 'Version not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response({
+            'data': {
+                'diff': diff
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,505 @@
+"""
+Workflow execution engine.
+
+Jobs are leased from the WorkflowJob table, executed concurrently on an
+asyncio event loop and written back together with per-step timings. Leasing
+uses SELECT ... FOR UPDATE SKIP LOCKED where the database supports it (Postgres)
+and a compare-and-set UPDATE otherwise (SQLite serializes writers, so the
+conditional update is atomic).
+"""
+import asyncio
+import logging
+import os
+import random
+import secrets
+import socket
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import pubsub
+from .models import ChangeEvent, Workflow, WorkflowJob, WorkflowRun, WorkflowStepRun
+
+logger = logging.getLogger(__name__)
+
+
+# Actions
+# Each action is a coroutine taking (params, context) and returning a JSON-able
+# output that is stored with the step run.
+
+ACTIONS = {}
+
+
+def register_action(name):
+    """Decorator registering a coroutine as a workflow step action"""
+    def decorator(func):
+        ACTIONS[name] = func
+        return func
+    return decorator
+
+
+@register_action('noop')
+async def noop_action(params, context):
+    return {}
+
+
+@register_action('log')
+async def log_action(params, context):
+    message = params.get('message') or context['step']['name']
+    logger.info('[workflow %s run %s] %s', context['workflow_id'], context['run_id'], message)
+    return {'message': message}
+
+
+@register_action('sleep')
+async def sleep_action(params, context):
+    seconds = float(params.get('seconds', 1))
+    await asyncio.sleep(seconds)
+    return {'slept': seconds}
+
+
+def normalize_steps(steps):
+    """
+    Validate workflow steps and return them as dicts.
+
+    Plain strings (as shown in the workflow builder) become 'log' steps.
+    """
+    if not isinstance(steps, list):
+        raise ValueError('Steps must be a list')
+    normalized = []
+    for step in steps:
+        if isinstance(step, str):
+            step = {'name': step, 'action': 'log'}
+        if not isinstance(step, dict):
+            raise ValueError('Each step must be a string or an object')
+        action = step.get('action', 'log')
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action '{action}'")
+        params = step.get('params') or {}
+        if not isinstance(params, dict):
+            raise ValueError('Step params must be an object')
+        normalized.append({
+            'name': step.get('name') or action,
+            'action': action,
+            'params': params
+        })
+    return normalized
+
+
+# Cron schedules
+
+_CRON_FIELDS = [
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('weekday', 0, 7),
+]
+
+
+def _parse_cron_field(text, low, high):
+    values = set()
+    for item in text.split(','):
+        value_range, _, step = item.partition('/')
+        step = int(step) if step else 1
+        if step < 1:
+            raise ValueError(f"Invalid step in '{item}'")
+        if value_range == '*':
+            start, end = low, high
+        elif '-' in value_range:
+            start, end = (int(part) for part in value_range.split('-', 1))
+        else:
+            start = int(value_range)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"Value out of range in '{item}'")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Five-field cron expression (minute hour day month weekday), evaluated in UTC"""
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError('Cron expressions need five fields: minute hour day month weekday')
+        try:
+            fields = [
+                _parse_cron_field(part, low, high)
+                for part, (_, low, high) in zip(parts, _CRON_FIELDS)
+            ]
+        except ValueError as e:
+            raise ValueError(f"Invalid cron expression '{expression}': {e}")
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        # Cron allows both 0 and 7 for Sunday
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+    def _day_matches(self, dt):
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day:
+            return weekday_ok
+        if self.any_weekday:
+            return day_ok
+        # When both fields are restricted cron fires on either match
+        return day_ok or weekday_ok
+
+    def next_after(self, after):
+        """Return the first matching minute strictly after the given datetime"""
+        dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 4)
+        while dt < limit:
+            if dt.month not in self.months:
+                month_start = dt.replace(day=1, hour=0, minute=0)
+                dt = (month_start + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError('Cron expression never fires')
+
+
+def schedule_workflow(workflow, now=None):
+    """Set next_run_at from the workflow's cron schedule (or clear it)"""
+    if workflow.schedule:
+        workflow.next_run_at = CronSchedule(workflow.schedule).next_after(now or timezone.now())
+    else:
+        workflow.next_run_at = None
+    return workflow.next_run_at
+
+
+def enqueue_due_workflows(now=None):
+    """Queue a job for every active scheduled workflow whose next run is due"""
+    now = now or timezone.now()
+    due = Workflow.objects.filter(
+        status=Workflow.STATUS_ACTIVE,
+        next_run_at__lte=now
+    ).exclude(schedule='')
+    count = 0
+    for workflow in due:
+        try:
+            next_run_at = CronSchedule(workflow.schedule).next_after(now)
+        except ValueError as e:
+            logger.warning('Disabling schedule of workflow %s: %s', workflow.pk, e)
+            next_run_at = None
+        # Compare-and-set on next_run_at so only one worker enqueues each tick
+        claimed = Workflow.objects.filter(
+            pk=workflow.pk,
+            next_run_at=workflow.next_run_at
+        ).update(next_run_at=next_run_at)
+        if claimed:
+            workflow.enqueue(run_at=workflow.next_run_at)
+            count += 1
+    return count
+
+
+# Job queue
+
+def retry_delay(attempt):
+    """Exponential backoff with +/-20% jitter, in seconds"""
+    delay = settings.WORKFLOW_RETRY_BACKOFF * (2 ** max(attempt - 1, 0))
+    delay = min(delay, settings.WORKFLOW_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _running(now):
+    """Live leases per workflow, as a subquery on the outer job's workflow"""
+    return Coalesce(Subquery(
+        WorkflowJob.objects.filter(
+            workflow=OuterRef('workflow_id'),
+            status=WorkflowJob.STATUS_LEASED,
+            lease_expires_at__gte=now
+        ).order_by().values('workflow').annotate(count=Count('id')).values('count')
+    ), 0)
+
+
+def lease_jobs(worker_id, limit, lease_seconds=None):
+    """
+    Lease up to limit due jobs for this worker and return them.
+
+    A job holding a live lease counts against its workflow's max_concurrency
+    whichever worker holds it, so jobs are only leased for workflows with
+    spare capacity and the cap holds across any number of workers. Jobs whose
+    lease expired (e.g. their worker crashed) are leased again.
+    """
+    now = timezone.now()
+    lease_seconds = lease_seconds or settings.WORKFLOW_LEASE_SECONDS
+    token = secrets.token_hex(16)
+    available = (
+        Q(status=WorkflowJob.STATUS_QUEUED, run_at__lte=now) |
+        Q(status=WorkflowJob.STATUS_LEASED, lease_expires_at__lt=now)
+    ) & Q(workflow__status=Workflow.STATUS_ACTIVE)
+    lease = {
+        'status': WorkflowJob.STATUS_LEASED,
+        'leased_by': worker_id,
+        'lease_token': token,
+        'lease_expires_at': now + timedelta(seconds=lease_seconds),
+        'attempts': F('attempts') + 1,
+        'updated_at': now,
+    }
+    candidates = (
+        WorkflowJob.objects.filter(available)
+        .alias(running=_running(now))
+        .filter(workflow__max_concurrency__gt=F('running'))
+        .order_by('run_at')
+    )
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            rows = list(candidates.values_list('id', 'workflow_id')[:limit * 4])
+            # Capacity is counted and taken under the workflow's row lock, so
+            # concurrent workers cannot both fill the same free slot
+            capacity = dict(
+                Workflow.objects.select_for_update(skip_locked=True)
+                .filter(id__in={workflow_id for _, workflow_id in rows})
+                .values_list('id', 'max_concurrency')
+            )
+            running = dict(
+                WorkflowJob.objects.filter(
+                    workflow_id__in=capacity,
+                    status=WorkflowJob.STATUS_LEASED,
+                    lease_expires_at__gte=now
+                ).order_by().values('workflow_id').annotate(count=Count('id')).values_list('workflow_id', 'count')
+            )
+            ids = []
+            for job_id, workflow_id in rows:
+                if workflow_id in capacity and running.get(workflow_id, 0) < capacity[workflow_id]:
+                    running[workflow_id] = running.get(workflow_id, 0) + 1
+                    ids.append(job_id)
+                    if len(ids) == limit:
+                        break
+            WorkflowJob.objects.filter(available, id__in=ids).update(**lease)
+    else:
+        ids = list(candidates.values_list('id', flat=True)[:limit])
+        # One conditional UPDATE per job: SQLite runs each statement
+        # atomically, so availability and capacity are re-checked against
+        # every lease committed before it and two workers cannot overfill a
+        # workflow or both win a job
+        for job_id in ids:
+            WorkflowJob.objects.filter(available, id=job_id).alias(running=_running(now)).filter(
+                workflow__max_concurrency__gt=F('running')
+            ).update(**lease)
+
+    return list(
+        WorkflowJob.objects.select_related('workflow')
+        .filter(id__in=ids, lease_token=token)
+        .order_by('run_at')
+    )
+
+
+def renew_leases(job_ids, lease_seconds=None):
+    """
+    Extend the leases of jobs this worker is running and return the ids of
+    those it still holds. A job missing from the result was leased away
+    (its lease had expired) and must not be finished by this worker.
+    """
+    now = timezone.now()
+    lease_seconds = lease_seconds or settings.WORKFLOW_LEASE_SECONDS
+    held = WorkflowJob.objects.filter(
+        status=WorkflowJob.STATUS_LEASED, lease_expires_at__gte=now,
+        id__in=[job_id for job_id, _ in job_ids],
+        lease_token__in={token for _, token in job_ids}
+    )
+    held.update(lease_expires_at=now + timedelta(seconds=lease_seconds), updated_at=now)
+    still_held = set(held.values_list('id', 'lease_token'))
+    return {job_id for job_id, token in job_ids if (job_id, token) in still_held}
+
+
+def start_run(job, worker_id):
+    Workflow.objects.filter(pk=job.workflow_id).update(runs=F('runs') + 1)
+    return WorkflowRun.objects.create(
+        workflow_id=job.workflow_id,
+        job=job,
+        attempt=job.attempts,
+        worker=worker_id
+    )
+
+
+def finish_run(job, run, step_runs, error=None):
+    """Store the run outcome and either complete, retry or fail the job"""
+    now = timezone.now()
+    run.status = WorkflowRun.STATUS_FAILED if error else WorkflowRun.STATUS_SUCCEEDED
+    run.finished_at = now
+    run.duration_ms = int((now - run.started_at).total_seconds() * 1000)
+    run.error = error or ''
+
+    if error is None:
+        update = {'status': WorkflowJob.STATUS_SUCCEEDED, 'last_error': ''}
+    elif job.attempts < job.max_attempts:
+        update = {
+            'status': WorkflowJob.STATUS_QUEUED,
+            'run_at': now + timedelta(seconds=retry_delay(job.attempts)),
+            'last_error': error,
+        }
+    else:
+        update = {'status': WorkflowJob.STATUS_FAILED, 'last_error': error}
+    update.update(lease_token='', lease_expires_at=None, updated_at=now)
+
+    with transaction.atomic():
+        run.save(update_fields=['status', 'finished_at', 'duration_ms', 'error'])
+        WorkflowStepRun.objects.bulk_create(step_runs)
+        # Only the current lease holder may move the job on
+        held = WorkflowJob.objects.filter(pk=job.pk, lease_token=job.lease_token).update(**update)
+    if not held:
+        # The lease expired and the job belongs to another worker now
+        return None
+
+    if job.workflow.owner_id:
+        pubsub.publish('workflows', {
+            'workflow_id': job.workflow_id,
+            'run_id': run.pk,
+            'status': run.status,
+            'job_status': update['status'],
+            'duration_ms': run.duration_ms,
+        }, user_id=job.workflow.owner_id)
+    if update['status'] == WorkflowJob.STATUS_FAILED and job.workflow.owner_id:
+        ChangeEvent.record(
+            job.workflow.owner,
+            ChangeEvent.KIND_ALERT,
+            source='Workflows',
+            type='alert',
+            severity='High',
+            message=f"Workflow '{job.workflow.name}' failed after {job.attempts} attempts: {error}"
+        )
+    return update['status']
+
+
+# Worker
+
+class WorkflowWorker:
+    """
+    Leases jobs and runs them as asyncio tasks.
+
+    At most `concurrency` jobs run at once per worker; lease_jobs() keeps
+    every workflow within its `max_concurrency` across all workers. Leases
+    are renewed while their jobs run, so long runs are not leased again.
+    """
+
+    def __init__(self, worker_id=None, concurrency=10, poll_interval=1.0, lease_seconds=None):
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds or settings.WORKFLOW_LEASE_SECONDS
+        self.step_timeout = settings.WORKFLOW_STEP_TIMEOUT
+        self.tasks = set()
+        # job id -> (lease token, task) for every job this worker holds
+        self.leases = {}
+        self.processed = 0
+        self.failed = 0
+        self.stopping = False
+
+    def stop(self):
+        self.stopping = True
+
+    async def renew(self):
+        held = await sync_to_async(renew_leases)(
+            [(job_id, token) for job_id, (token, _) in self.leases.items()], self.lease_seconds
+        )
+        for job_id, (_, task) in list(self.leases.items()):
+            if job_id not in held and not task.done():
+                logger.warning('Lost the lease on workflow job %s; abandoning it', job_id)
+                task.cancel()
+
+    async def run(self, once=False):
+        """
+        Process jobs until stopped. With once=True, return as soon as no due
+        jobs are left.
+        """
+        last_schedule_check = None
+        last_renewal = time.monotonic()
+        while not self.stopping:
+            if last_schedule_check is None or time.monotonic() - last_schedule_check >= self.poll_interval:
+                await sync_to_async(enqueue_due_workflows)()
+                last_schedule_check = time.monotonic()
+            if self.leases and time.monotonic() - last_renewal >= self.lease_seconds / 3:
+                await self.renew()
+                last_renewal = time.monotonic()
+
+            free = self.concurrency - len(self.tasks)
+            jobs = []
+            if free > 0:
+                jobs = await sync_to_async(lease_jobs)(self.worker_id, free, self.lease_seconds)
+            for job in jobs:
+                task = asyncio.create_task(self.execute(job))
+                self.tasks.add(task)
+                self.leases[job.pk] = (job.lease_token, task)
+                task.add_done_callback(self.tasks.discard)
+                task.add_done_callback(lambda _, job_id=job.pk: self.leases.pop(job_id, None))
+
+            if self.tasks:
+                await asyncio.wait(self.tasks, timeout=min(self.poll_interval, self.lease_seconds / 3),
+                                   return_when=asyncio.FIRST_COMPLETED)
+            elif once:
+                break
+            else:
+                await asyncio.sleep(self.poll_interval)
+
+        while self.tasks:
+            await asyncio.wait(self.tasks, timeout=self.lease_seconds / 3)
+            if self.leases:
+                await self.renew()
+
+    async def execute(self, job):
+        run = await sync_to_async(start_run)(job, self.worker_id)
+        context = {'workflow_id': job.workflow_id, 'run_id': run.pk, 'outputs': []}
+        step_runs = []
+        error = None
+        try:
+            steps = normalize_steps(job.workflow.steps)
+        except ValueError as e:
+            steps, error = [], f'Invalid workflow steps: {e}'
+
+        for position, step in enumerate(steps):
+            context['step'] = step
+            started_at = timezone.now()
+            started = time.perf_counter()
+            output, step_error = {}, ''
+            try:
+                output = await asyncio.wait_for(
+                    ACTIONS[step['action']](step['params'], context),
+                    timeout=self.step_timeout
+                )
+            except asyncio.TimeoutError:
+                step_error = f'Timed out after {self.step_timeout}s'
+            except asyncio.CancelledError:
+                # Cancelled by renew(): another worker holds the job now, so
+                # record this run as abandoned; finish_run leaves the job alone
+                step_error = 'Abandoned after losing the job lease'
+            except Exception as e:
+                step_error = f'{type(e).__name__}: {e}'
+            duration_ms = int((time.perf_counter() - started) * 1000)
+
+            step_runs.append(WorkflowStepRun(
+                run=run,
+                position=position,
+                name=step['name'][:255],
+                action=step['action'],
+                status=WorkflowRun.STATUS_FAILED if step_error else WorkflowRun.STATUS_SUCCEEDED,
+                started_at=started_at,
+                finished_at=started_at + timedelta(milliseconds=duration_ms),
+                duration_ms=duration_ms,
+                output=output if isinstance(output, dict) else {'result': output},
+                error=step_error
+            ))
+            if step_error:
+                error = f"Step '{step['name']}' failed: {step_error}"
+                break
+            context['outputs'].append(output)
+
+        outcome = await sync_to_async(finish_run)(job, run, step_runs, error)
+        self.processed += 1
+        if outcome == WorkflowJob.STATUS_FAILED:
+            self.failed += 1
+            logger.warning('Workflow %s job %s failed permanently: %s', job.workflow_id, job.pk, error)
@@ -3,6 +3,9 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Requests for /api/stream/ (Server-Sent Events) are handled by
+api.stream.EventStream directly; everything else goes to Django.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +16,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since it uses models and settings
+from api.stream import sse_application  # noqa: E402
+
+STREAM_PATH = '/api/stream/'
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        await sse_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
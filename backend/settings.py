@@ -196,3 +196,90 @@ EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.Em
 
 # For console backend, this will be printed
 DEFAULT_FROM_EMAIL = 'noreply@productai.com'
+
+# Idea Repository
+# Minimum estimated Jaccard similarity for two ideas to be reported as duplicates
+IDEA_DUPLICATE_THRESHOLD = float(os.getenv('IDEA_DUPLICATE_THRESHOLD', '0.5'))
+
+# Workflow automation
+# Seconds a worker holds a job lease before another worker may take it over
+WORKFLOW_LEASE_SECONDS = int(os.getenv('WORKFLOW_LEASE_SECONDS', '300'))
+# Retry backoff: base * 2^(attempt - 1) seconds, capped at the maximum
+WORKFLOW_RETRY_BACKOFF = float(os.getenv('WORKFLOW_RETRY_BACKOFF', '5'))
+WORKFLOW_RETRY_BACKOFF_MAX = float(os.getenv('WORKFLOW_RETRY_BACKOFF_MAX', '600'))
+# Per-step timeout in seconds
+WORKFLOW_STEP_TIMEOUT = float(os.getenv('WORKFLOW_STEP_TIMEOUT', '60'))
+
+# PM daily briefing
+# Maximum age in seconds of a served briefing before pending events are folded in on read
+BRIEFING_MAX_STALENESS = int(os.getenv('BRIEFING_MAX_STALENESS', '60'))
+# Number of most recent alerts kept in each briefing
+BRIEFING_MAX_ALERTS = int(os.getenv('BRIEFING_MAX_ALERTS', '50'))
+# Seconds a missing change event id is waited for before it is assumed rolled
+# back; transactions that record change events must commit within this time
+BRIEFING_GAP_TIMEOUT = int(os.getenv('BRIEFING_GAP_TIMEOUT', '10'))
+
+# Server-Sent Events stream (/api/stream/, served by backend/asgi.py)
+# 'api.pubsub.DatabaseBackend' relays through the database, so the briefing
+# materializer and workflow workers (separate processes) reach subscribers here;
+# 'api.pubsub.LocalBackend' only delivers within one process
+STREAM_BACKEND = os.getenv('STREAM_BACKEND', 'api.pubsub.DatabaseBackend')
+STREAM_TOPICS = ['briefing', 'workflows']
+STREAM_HEARTBEAT_SECONDS = float(os.getenv('STREAM_HEARTBEAT_SECONDS', '15'))
+# Messages buffered per connection before the client is told to resync
+STREAM_QUEUE_SIZE = int(os.getenv('STREAM_QUEUE_SIZE', '100'))
+# Resyncs tolerated before a persistently slow client is disconnected
+STREAM_MAX_OVERFLOWS = int(os.getenv('STREAM_MAX_OVERFLOWS', '3'))
+STREAM_POLL_INTERVAL = float(os.getenv('STREAM_POLL_INTERVAL', '0.5'))
+STREAM_MESSAGE_RETENTION = int(os.getenv('STREAM_MESSAGE_RETENTION', '300'))
+# Seconds between deletions of expired relay messages, by whichever process publishes or polls
+STREAM_PRUNE_INTERVAL = float(os.getenv('STREAM_PRUNE_INTERVAL', '60'))
+
+# Dataset exports
+# Rows fetched from the database per round trip while streaming an export
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+# Directory export job files are written to, rows per checkpointed batch, and job lease length
+EXPORT_ROOT = os.getenv('EXPORT_ROOT', str(BASE_DIR / 'exports'))
+EXPORT_JOB_BATCH_SIZE = int(os.getenv('EXPORT_JOB_BATCH_SIZE', '20000'))
+EXPORT_LEASE_SECONDS = int(os.getenv('EXPORT_LEASE_SECONDS', '300'))
+
+# Authentication audit log (write-behind; see api/audit.py)
+# Events buffered in memory before the oldest are dropped
+AUDIT_BUFFER_SIZE = int(os.getenv('AUDIT_BUFFER_SIZE', '10000'))
+# A flush is triggered once this many events are buffered, or every AUDIT_FLUSH_INTERVAL seconds
+AUDIT_FLUSH_SIZE = int(os.getenv('AUDIT_FLUSH_SIZE', '500'))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '2'))
+AUDIT_RETENTION_DAYS = int(os.getenv('AUDIT_RETENTION_DAYS', '90'))
+# Only enable behind a proxy that sets X-Forwarded-For, or clients can spoof their IP
+AUDIT_TRUST_X_FORWARDED_FOR = os.getenv('AUDIT_TRUST_X_FORWARDED_FOR', 'False') == 'True'
+# Further proxies (addresses or networks) that may appear in X-Forwarded-For, e.g. a load
+# balancer in front of the proxy; the client is the right-most hop not among them
+AUDIT_TRUSTED_PROXIES = [proxy for proxy in os.getenv('AUDIT_TRUSTED_PROXIES', '').split(',') if proxy]
+
+# Content Automation Studio batch generation
+# Dotted path to the text generator class; the stub renders templates locally
+CONTENT_GENERATOR = os.getenv('CONTENT_GENERATOR', 'api.content.StubGenerator')
+# Simulated per-variant latency of the stub generator, in seconds
+CONTENT_STUB_LATENCY = float(os.getenv('CONTENT_STUB_LATENCY', '0'))
+CONTENT_WORKERS = int(os.getenv('CONTENT_WORKERS', '16'))
+CONTENT_MAX_VARIANTS = int(os.getenv('CONTENT_MAX_VARIANTS', '2000'))
+# Compiled templates and generated outputs kept in the in-process LRU caches
+CONTENT_TEMPLATE_CACHE_SIZE = int(os.getenv('CONTENT_TEMPLATE_CACHE_SIZE', '256'))
+CONTENT_MEMO_SIZE = int(os.getenv('CONTENT_MEMO_SIZE', '10000'))
+# Limits on custom templates and the request data they render, so one batch
+# cannot keep the shared worker pool busy or build huge prompts
+CONTENT_TEMPLATE_MAX_LENGTH = int(os.getenv('CONTENT_TEMPLATE_MAX_LENGTH', '5000'))
+CONTENT_TEMPLATE_MAX_LOOP_DEPTH = int(os.getenv('CONTENT_TEMPLATE_MAX_LOOP_DEPTH', '2'))
+CONTENT_MAX_LIST_ITEMS = int(os.getenv('CONTENT_MAX_LIST_ITEMS', '20'))
+CONTENT_MAX_FIELD_LENGTH = int(os.getenv('CONTENT_MAX_FIELD_LENGTH', '500'))
+CONTENT_MAX_BRIEF_LENGTH = int(os.getenv('CONTENT_MAX_BRIEF_LENGTH', '2000'))
+CONTENT_MAX_PROMPT_LENGTH = int(os.getenv('CONTENT_MAX_PROMPT_LENGTH', '20000'))
+
+# PRD version history
+# Revisions between full keyframes; bounds the deltas replayed to rebuild a version
+PRD_KEYFRAME_INTERVAL = int(os.getenv('PRD_KEYFRAME_INTERVAL', '50'))
+# Autosaves by the same author within this many seconds of the last one are
+# folded into its revision, for at most PRD_AUTOSAVE_MAX_SPAN seconds
+PRD_AUTOSAVE_WINDOW = int(os.getenv('PRD_AUTOSAVE_WINDOW', '60'))
+PRD_AUTOSAVE_MAX_SPAN = int(os.getenv('PRD_AUTOSAVE_MAX_SPAN', '900'))
+PRD_MAX_BYTES = int(os.getenv('PRD_MAX_BYTES', str(2 * 1024 * 1024)))